@@ -0,0 +1,131 @@
+###########################################
+#
+# bench_andersen.py
+#
+# Scaling benchmark for the Andersen
+# points-to solver
+#
+# (C) 2016, Andreas Gaiser
+###########################################
+
+''' Times pointer_analysis.andersen.AndersenAnalysis on synthetic
+modules with growing numbers of constraints (10,000 and 100,000 by
+default) and prints the results as JSON.
+
+    python bench/bench_andersen.py
+    python bench/bench_andersen.py --baseline old.json
+
+The constraints come from functions of 30 variables: assignments
+mostly flow from earlier to later variables of a function, with a few
+copy cycles and copies between functions (calls). A module with n
+constraints has n / 3 variables. With --baseline, the solving times
+are compared to a stored run and the script exits with status 1 if
+some run got slower by more than --tolerance. '''
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src'))
+
+COUNTS = [10000, 100000]
+
+
+def module_constraints(rng, size, count):
+    ''' count constraints over the variables 0 to size - 1. '''
+    from pointer_analysis.andersen import ADDRESS, COPY, LOAD, STORE
+    constraints = []
+    for _ in xrange(count):
+        x = rng.randrange(size)
+        base = x - x % 30
+        earlier = base + rng.randrange(x - base + 1)
+        y = base + rng.randrange(30)
+        r = rng.random()
+        if r < 0.3:
+            constraints.append((ADDRESS, x, y))
+        elif r < 0.65:
+            constraints.append((COPY, x, earlier))
+        elif r < 0.67:
+            constraints.append((COPY, earlier, x))
+        elif r < 0.675:
+            constraints.append((COPY, base + rng.randrange(3),
+                                rng.randrange(size)))
+        elif r < 0.85:
+            constraints.append((LOAD, x, earlier))
+        else:
+            constraints.append((STORE, x, y))
+    return constraints
+
+
+def run(count, seed):
+    from pointer_analysis.andersen import AndersenAnalysis
+    constraints = module_constraints(random.Random(seed), count // 3, count)
+    analysis = AndersenAnalysis()
+    start = time.time()
+    for constraint in constraints:
+        analysis.add_constraint(*constraint)
+    setup = time.time() - start
+    start = time.time()
+    analysis.solve()
+    seconds = time.time() - start
+    points_to = analysis.points_to_map()
+    return {'setup_seconds': setup,
+            'solve_seconds': seconds,
+            'collapsed': analysis.collapsed,
+            'pointers': len(points_to),
+            'points_to_facts': sum(len(targets)
+                                   for targets in points_to.itervalues())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--counts', type=int, nargs='+', default=COUNTS,
+                        help='numbers of constraints')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline',
+                        help='JSON output of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--output', help='write JSON here (default: stdout)')
+    args = parser.parse_args()
+
+    results = {}
+    for count in args.counts:
+        results[str(count)] = run(count, args.seed)
+        print >> sys.stderr, '%d constraints done' % count
+    report = {'python': platform.python_version(),
+              'machine': platform.machine(),
+              'seed': args.seed,
+              'results': results}
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        comparison = []
+        for (count, result) in sorted(results.iteritems(),
+                                      key=lambda item: int(item[0])):
+            old = baseline.get(count, {}).get('solve_seconds')
+            if not old:
+                continue
+            ratio = result['solve_seconds'] / old
+            comparison.append({'constraints': count, 'ratio': ratio})
+            print >> sys.stderr, '%7s %.2fx baseline time' % (count, ratio)
+            if ratio > 1 + args.tolerance:
+                print >> sys.stderr, 'REGRESSION %s constraints' % count
+                status = 1
+        report['comparison'] = comparison
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print output
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+###########################################
+#
+# bench_decision_diagrams.py
+#
+# Apply benchmark for deep decision diagrams
+#
+# (C) 2016, Andreas Gaiser
+###########################################
+
+''' Times the apply operations of the decision diagram factory on
+diagrams with many levels and prints the results as JSON.
+
+    python bench/bench_decision_diagrams.py --levels 64 256 1024
+    python bench/bench_decision_diagrams.py --baseline old.json
+
+The diagrams are unions of random paths through all levels, so every
+operation visits nodes on all levels. The computed table is cleared
+before every call, so that no call is answered from the cache.
+Operations failing (for example by exceeding the recursion limit) are
+reported as errors. With --baseline, the ops/sec are compared to a
+stored run. '''
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src', 'domains'))
+
+LEVELS = [64, 256, 1024, 4096]
+OPERATIONS = ['union', 'intersect', 'is_subseteq', 'op_binary',
+              'cond_binary', 'project_var']
+
+
+def _paths(factory, names, count, rng):
+    ''' Union of count random paths through all variables. '''
+    result = factory.get_bot()
+    for _ in xrange(count):
+        path = factory.op_load_constant(factory.get_top(), 'x',
+                                        rng.randint(0, 3))
+        for name in reversed(names):
+            path = factory.op_load_constant(path, name, rng.randint(0, 1))
+        result = factory.union(result, path)
+    return result
+
+
+def workload(levels, paths):
+    import boxes
+    import decision_diagrams
+    factory = decision_diagrams.DecisionDiagramFactory(
+        boxes.BoxDomainFactory(-1024, 1024), reorder_threshold=None)
+    factory.add_integer_var('x', -1024, 1024)
+    names = ['b%d' % i for i in xrange(levels)]
+    for name in names:
+        factory.add_bool_var(name)
+    rng = random.Random(levels)
+    e1 = _paths(factory, names, paths, rng)
+    e2 = factory.union(e1, _paths(factory, names, paths, rng))
+    middle = names[levels // 2]
+    calls = {
+        'union': lambda: factory.union(e1, e2),
+        'intersect': lambda: factory.intersect(e1, e2),
+        'is_subseteq': lambda: factory.is_subseteq(e1, e2),
+        'op_binary': lambda: factory.op_binary(e1, '+', 'x', 'x', 1),
+        'cond_binary': lambda: factory.cond_binary(e2, '==', middle, 1),
+        'project_var': lambda: factory.project_var(e2, middle)}
+    return (factory, calls)
+
+
+def _time(factory, call, min_time):
+    ''' Return the number of calls per second. '''
+    calls = 0
+    elapsed = 0.0
+    while elapsed < min_time:
+        factory.computed_table.clear()
+        start = time.time()
+        call()
+        elapsed += time.time() - start
+        calls += 1
+    return calls / elapsed
+
+
+def run(levels, paths, min_time):
+    result = {}
+    start = time.time()
+    try:
+        (factory, calls) = workload(levels, paths)
+    except Exception, e:
+        result['error'] = '%s: %s' % (e.__class__.__name__, e)
+        return result
+    result['setup_seconds'] = time.time() - start
+    result['nodes'] = factory.node_count()
+    operations = {}
+    for operation in OPERATIONS:
+        try:
+            operations[operation] = {
+                'ops_per_sec': _time(factory, calls[operation], min_time)}
+        except Exception, e:
+            operations[operation] = {
+                'error': '%s: %s' % (e.__class__.__name__, e)}
+    result['operations'] = operations
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--levels', type=int, nargs='+', default=LEVELS)
+    parser.add_argument('--paths', type=int, default=8,
+                        help='random paths per diagram')
+    parser.add_argument('--min-time', type=float, default=0.5,
+                        help='seconds each operation is repeated')
+    parser.add_argument('--baseline',
+                        help='JSON output of an earlier run')
+    parser.add_argument('--output', help='write JSON here (default: stdout)')
+    args = parser.parse_args()
+
+    results = {}
+    for levels in args.levels:
+        results[str(levels)] = run(levels, args.paths, args.min_time)
+        print >> sys.stderr, '%d levels done' % levels
+    report = {'python': platform.python_version(),
+              'machine': platform.machine(),
+              'paths': args.paths,
+              'results': results}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        comparison = []
+        for (levels, result) in sorted(results.iteritems(),
+                                       key=lambda item: int(item[0])):
+            old_operations = baseline.get(levels, {}).get('operations', {})
+            for (operation, values) in sorted(
+                    result.get('operations', {}).iteritems()):
+                old = old_operations.get(operation, {}).get('ops_per_sec')
+                new = values.get('ops_per_sec')
+                if old and new is not None:
+                    comparison.append({'levels': levels,
+                                       'operation': operation,
+                                       'speedup': new / old})
+                    print >> sys.stderr, '%5s %-12s %.2fx' % (
+                        levels, operation, new / old)
+        report['comparison'] = comparison
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print output
+
+
+if __name__ == '__main__':
+    main()
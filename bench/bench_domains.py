@@ -0,0 +1,351 @@
+###########################################
+#
+# bench_domains.py
+#
+# Scaling benchmark for the domain factories
+#
+# (C) 2016, Andreas Gaiser
+###########################################
+
+''' Times the main operations of the domain factories for growing
+numbers of variables (10 to 5000 by default) and prints the results as
+JSON.
+
+    python bench/bench_domains.py > bench_output.txt
+    python bench/bench_domains.py --baseline bench/baseline.json
+
+Every factory/size configuration runs in a fresh process, so that its
+peak memory (maximum resident set size) can be reported. For n
+variables, the elements constrain n * --constrained-fraction of them
+(at least 2, at most --max-constrained if given); the factories know
+about all of them. The workloads of the slow factories (DBMs and
+decision diagrams) constrain at most 100 variables, so that their
+setup at 5000 variables stays within the timeout; each result reports
+the number of constrained variables. Every call gets a different
+first operand and the computed tables are cleared before it (neither
+is timed), so that the results are not those of cache hits.
+Operations taking longer than --timeout seconds are reported as
+timeouts. With
+--baseline, the results are compared to a stored run and the script
+exits with status 1 if some operation got slower by more than
+--tolerance. '''
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import signal
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src', 'domains'))
+
+SIZES = [10, 100, 1000, 5000]
+OPERATIONS = ['union', 'intersect', 'widen', 'is_subseteq',
+              'op_binary', 'cond_binary', 'project_var']
+MIN_VALUE = -1024
+MAX_VALUE = 1024
+
+
+class Timeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise Timeout()
+
+
+# Workloads: each returns the factory and two elements e1, e2 with
+# e1 <= e2 for n variables, constraining k of them, the operands of
+# op_binary, cond_binary and project_var, and vary(i), a variant of e1
+# for the i-th call (differing in one variable).
+
+def _value(i):
+    ''' Distinct constants for 2049 consecutive calls. '''
+    return MIN_VALUE + (i * 7919) % (MAX_VALUE - MIN_VALUE + 1)
+
+
+def _chain(factory, names, start, step):
+    ''' names[0] = start, names[i] = names[i-1] + step. '''
+    element = factory.op_load_constant(factory.get_top(), names[0], start)
+    for i in xrange(1, len(names)):
+        element = factory.op_binary(element, '+', names[i], names[i - 1],
+                                    step)
+    return element
+
+
+def _numeric_workload(factory, n, k, zero=None):
+    names = ['v%d' % i for i in xrange(n)]
+    if zero is not None:
+        factory.add_integer_var(zero, 0, 0)
+    for name in names:
+        factory.add_integer_var(name, MIN_VALUE, MAX_VALUE)
+    e1 = _chain(factory, names[:k], 0, 1)
+    e2 = factory.union(e1, _chain(factory, names[:k], 1, 1))
+    return {'factory': factory,
+            'e1': e1,
+            'e2': e2,
+            'vary': lambda i: factory.op_load_constant(e1, names[k - 1],
+                                                       _value(i)),
+            'op_binary': ('-', names[0], names[1], names[k - 1]),
+            'cond_binary': ('<=', names[k - 1], names[0]),
+            'project_var': names[k // 2]}
+
+
+def box_workload(n, k):
+    import boxes
+    return _numeric_workload(boxes.BoxDomainFactory(MIN_VALUE, MAX_VALUE),
+                             n, k)
+
+
+def array_box_workload(n, k):
+    import array_boxes
+    return _numeric_workload(
+        array_boxes.ArrayBoxDomainFactory(MIN_VALUE, MAX_VALUE), n, k)
+
+
+def dbm_workload(n, k):
+    import dbms
+    return _numeric_workload(dbms.DBMFactory(MAX_VALUE, MIN_VALUE), n, k,
+                             zero=0)
+
+
+def decision_diagram_workload(n, k):
+    import boxes
+    import decision_diagrams
+    factory = decision_diagrams.DecisionDiagramFactory(
+        boxes.BoxDomainFactory(MIN_VALUE, MAX_VALUE))
+    for name in ['x', 'y']:
+        factory.add_integer_var(name, MIN_VALUE, MAX_VALUE)
+    names = ['b%d' % i for i in xrange(n)]
+    for name in names:
+        factory.add_bool_var(name)
+    e1 = factory.get_top()
+    e2 = factory.get_top()
+    for i in xrange(k):
+        e1 = factory.op_load_constant(e1, names[i], i % 2)
+        e2 = factory.union(e2, factory.op_load_constant(e1, names[i],
+                                                          (i + 1) % 2))
+    e2 = factory.union(e1, e2)
+    return {'factory': factory,
+            'e1': e1,
+            'e2': e2,
+            'vary': lambda i: factory.op_load_constant(e1, 'x', _value(i)),
+            'op_binary': ('<', names[0], 'x', 'y'),
+            'cond_binary': ('==', names[k - 1], 1),
+            'project_var': names[k // 2]}
+
+
+def live_vars_workload(n, k):
+    import live_vars
+    factory = live_vars.LiveVarsDomainFactory()
+    names = ['v%d' % i for i in xrange(n)]
+    for name in names:
+        factory.add_integer_var(name, MIN_VALUE, MAX_VALUE)
+    e1 = factory.get_bot()
+    for i in xrange(k - 1):
+        e1 = factory.op_binary(e1, '+', names[i], names[i + 1], 1)
+    e2 = factory.union(e1, factory.cond_binary(factory.get_bot(), '<',
+                                               names[0], names[k - 1]))
+    return {'factory': factory,
+            'e1': e1,
+            'e2': e2,
+            'vary': lambda i: factory.op_load_constant(e1, names[i % n], 0),
+            'op_binary': ('+', names[0], names[1], names[k - 1]),
+            'cond_binary': ('<', names[0], names[k - 1]),
+            'project_var': names[k // 2]}
+
+
+# (name, workload, maximum number of constrained variables or None)
+WORKLOADS = [('BoxDomainFactory', box_workload, None),
+             ('ArrayBoxDomainFactory', array_box_workload, None),
+             ('DBMFactory', dbm_workload, 100),
+             ('DecisionDiagramFactory', decision_diagram_workload, 100),
+             ('LiveVarsDomainFactory', live_vars_workload, None)]
+
+
+def _operation(workload, name):
+    ''' The operation as a function of its first operand. '''
+    factory = workload['factory']
+    e2 = workload['e2']
+    if name in ('union', 'intersect', 'widen', 'is_subseteq'):
+        method = getattr(factory, name)
+        return lambda e1: method(e1, e2)
+    elif name == 'op_binary':
+        (operator, target, op1, op2) = workload['op_binary']
+        return lambda e1: factory.op_binary(e1, operator, target, op1, op2)
+    elif name == 'cond_binary':
+        (operator, op1, op2) = workload['cond_binary']
+        return lambda e1: factory.cond_binary(e1, operator, op1, op2)
+    variable = workload['project_var']
+    return lambda e1: factory.project_var(e1, variable)
+
+
+def _time(workload, operation, min_time, timeout):
+    ''' Return the number of calls of operation per second, timing
+    only the calls themselves. The calls stop after min_time seconds
+    of them, or after timeout / 2 seconds including the preparation
+    of their operands. '''
+    vary = workload['vary']
+    computed_table = getattr(workload['factory'], 'computed_table', None)
+    signal.alarm(timeout)
+    try:
+        calls = 0
+        elapsed = 0.0
+        begin = time.time()
+        while elapsed < min_time and (calls == 0
+                                      or time.time() - begin < timeout / 2.0):
+            e1 = vary(calls)
+            if computed_table is not None:
+                computed_table.clear()
+            start = time.time()
+            operation(e1)
+            elapsed += time.time() - start
+            calls += 1
+    finally:
+        signal.alarm(0)
+    return calls / elapsed
+
+
+def constrained(n, fraction, maximum):
+    ''' The number of variables constrained for n variables. '''
+    k = max(2, int(n * fraction))
+    if maximum is not None:
+        k = min(k, maximum)
+    return min(n, k)
+
+
+def run_configuration(args):
+    ''' Benchmark one factory for one size; runs in its own process. '''
+    (name, n, k, min_time, timeout) = args
+    make_workload = dict((name, workload)
+                         for (name, workload, _) in WORKLOADS)[name]
+    signal.signal(signal.SIGALRM, _on_alarm)
+    result = {'constrained': k}
+    start = time.time()
+    signal.alarm(timeout)
+    try:
+        workload = make_workload(n, k)
+    except Timeout:
+        result['error'] = 'setup timeout'
+        return result
+    except Exception, e:
+        result['error'] = '%s: %s' % (e.__class__.__name__, e)
+        return result
+    finally:
+        signal.alarm(0)
+    result['setup_seconds'] = time.time() - start
+    operations = {}
+    for operation in OPERATIONS:
+        try:
+            operations[operation] = {
+                'ops_per_sec': _time(workload,
+                                     _operation(workload, operation),
+                                     min_time, timeout)}
+        except Timeout:
+            operations[operation] = {'error': 'timeout'}
+        except Exception, e:
+            operations[operation] = {
+                'error': '%s: %s' % (e.__class__.__name__, e)}
+    result['operations'] = operations
+    result['peak_rss_kb'] = resource.getrusage(
+        resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def compare(results, baseline, tolerance):
+    ''' Return a list of (factory, size, operation, ratio) for all
+    operations whose ops/sec dropped below (1 - tolerance) times the
+    baseline, and a list of all comparisons. '''
+    regressions = []
+    comparisons = []
+    for (factory, sizes) in sorted(results.iteritems()):
+        for (size, result) in sorted(sizes.iteritems()):
+            try:
+                old_operations = baseline[factory][size]['operations']
+            except KeyError:
+                continue
+            for (operation, values) in sorted(
+                    result.get('operations', {}).iteritems()):
+                old = old_operations.get(operation, {}).get('ops_per_sec')
+                new = values.get('ops_per_sec')
+                if not old or new is None:
+                    continue
+                ratio = new / old
+                comparisons.append((factory, size, operation, ratio))
+                if ratio < 1 - tolerance:
+                    regressions.append((factory, size, operation, ratio))
+    return (regressions, comparisons)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--factories', nargs='+',
+                        default=[name for (name, _, _) in WORKLOADS])
+    parser.add_argument('--constrained-fraction', type=float, default=0.1,
+                        help='part of the variables the elements '
+                        'constrain')
+    parser.add_argument('--max-constrained', type=int, default=None)
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='seconds each operation is repeated')
+    parser.add_argument('--timeout', type=int, default=30,
+                        help='seconds per operation and setup')
+    parser.add_argument('--baseline',
+                        help='JSON output of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--output', help='write JSON here (default: stdout)')
+    args = parser.parse_args()
+
+    limits = dict((name, maximum) for (name, _, maximum) in WORKLOADS)
+    results = {}
+    for name in args.factories:
+        results[name] = {}
+        for n in args.sizes:
+            maximum = args.max_constrained
+            if limits[name] is not None:
+                maximum = min(maximum or limits[name], limits[name])
+            k = constrained(n, args.constrained_fraction, maximum)
+            # a fresh process per configuration, for peak memory
+            pool = multiprocessing.Pool(1)
+            try:
+                results[name][str(n)] = pool.apply(
+                    run_configuration,
+                    [(name, n, k, args.min_time, args.timeout)])
+            finally:
+                pool.terminate()
+            print >> sys.stderr, '%s %s done' % (name, n)
+    report = {'python': platform.python_version(),
+              'machine': platform.machine(),
+              'constrained_fraction': args.constrained_fraction,
+              'max_constrained': args.max_constrained,
+              'results': results}
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        (regressions, comparisons) = compare(results, baseline,
+                                             args.tolerance)
+        report['comparison'] = [
+            {'factory': factory, 'size': size, 'operation': operation,
+             'ratio': ratio}
+            for (factory, size, operation, ratio) in comparisons]
+        for (factory, size, operation, ratio) in regressions:
+            print >> sys.stderr, ('REGRESSION %s %s %s: %.2fx baseline' %
+                                  (factory, size, operation, ratio))
+        if regressions:
+            status = 1
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print output
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,385 @@
+##############################
+#
+# dataflow.py
+#
+# Bit-vector dataflow analyses
+# (gen/kill problems)
+#
+# (C) 2016, Andreas Gaiser
+##############################
+
+import heapq
+from code_rep.instr import *
+from code_rep.variable import Variable
+
+
+class GenKillProblem(object):
+    ''' A dataflow problem whose transfer functions remove a kill set
+    and add a gen set of facts. Sets of facts are integers, bit i
+    standing for the fact with id i. Subclasses enumerate the facts
+    of a method in collect() and define the gen and kill sets of
+    instructions and edges. '''
+
+    # direction of the analysis, and whether facts holding on some
+    # (may) or on all (must) incoming paths hold after a join
+    forward = True
+    may = True
+
+    def __init__(self):
+        self._facts = []
+        self._ids = {}
+
+    def fact_id(self, fact):
+        ''' Return the id of fact, adding it if necessary. '''
+        try:
+            return self._ids[fact]
+        except KeyError:
+            self._ids[fact] = len(self._facts)
+            self._facts.append(fact)
+            return self._ids[fact]
+
+    def mask(self, facts):
+        ''' Return the set of the given (known) facts. '''
+        mask = 0
+        for fact in facts:
+            if fact in self._ids:
+                mask |= 1 << self._ids[fact]
+        return mask
+
+    def facts(self, mask):
+        ''' Return the list of facts in the set mask. '''
+        result = []
+        index = 0
+        while mask:
+            if mask & 1:
+                result.append(self._facts[index])
+            mask >>= 1
+            index += 1
+        return result
+
+    def universe(self):
+        ''' The set of all facts. '''
+        return (1 << len(self._facts)) - 1
+
+    def collect(self, method):
+        ''' Enumerate the facts of method. '''
+        pass
+
+    def boundary(self, method):
+        ''' The facts at the entry of the analysis (the start of the
+        initial block, or the end of the final block if backward). '''
+        return 0
+
+    def gen_kill(self, instruction, site):
+        ''' Return the (gen, kill) sets of instruction, site being
+        its (block, index). '''
+        return (0, 0)
+
+    def edge_gen_kill(self, edge):
+        ''' Return the (gen, kill) sets of taking edge: the condition
+        is evaluated, then the invocation (if any) is performed. '''
+        return (0, 0)
+
+
+def _operands(values):
+    return [value for value in values if isinstance(value, Variable)]
+
+def _used_variables(instruction):
+    if isinstance(instruction, DirectVariableAssignment):
+        return [instruction.source]
+    elif isinstance(instruction, BinaryOpAssignment):
+        return _operands([instruction.operand1, instruction.operand2])
+    elif isinstance(instruction, UnaryOpAssignment):
+        return _operands([instruction.operand])
+    elif isinstance(instruction, (Alloc, Load)):
+        return _operands([instruction.rhs])
+    elif isinstance(instruction, Store):
+        return _operands([instruction.target, instruction.rhs])
+    return []
+
+def _defined_variable(instruction):
+    ''' The variable an instruction assigns directly, None for
+    stores through pointers. '''
+    if isinstance(instruction, Assignment) and not isinstance(instruction,
+                                                              Store):
+        return instruction.target
+    return None
+
+def _expression(instruction):
+    if isinstance(instruction, BinaryOpAssignment):
+        return (instruction.operator, instruction.operand1,
+                instruction.operand2)
+    elif isinstance(instruction, UnaryOpAssignment):
+        return (instruction.operator, instruction.operand)
+    return None
+
+
+class LiveVariables(GenKillProblem):
+    ''' Variables that may be read before being assigned. By default,
+    the return variable is live at the end of the method. '''
+
+    forward = False
+    may = True
+
+    def __init__(self, live_at_exit=None):
+        super(LiveVariables, self).__init__()
+        self._live_at_exit = live_at_exit
+
+    def collect(self, method):
+        for v in method.parameters() + method.local_variables():
+            self.fact_id(v)
+        if method.return_variable:
+            self.fact_id(method.return_variable)
+
+    def boundary(self, method):
+        if self._live_at_exit is not None:
+            return self.mask(self._live_at_exit)
+        return self.mask([method.return_variable])
+
+    def gen_kill(self, instruction, site):
+        # kill before gen: x := x + 1 reads x
+        return (self.mask(_used_variables(instruction)),
+                self.mask([_defined_variable(instruction)]))
+
+    def edge_gen_kill(self, edge):
+        gen = 0
+        if edge.condition is not None:
+            (operator, op1, op2) = edge.condition
+            gen = self.mask(_operands([op1, op2]))
+        if edge.invocation is not None:
+            # backward, the invocation comes first
+            return (gen | self.mask(_operands(edge.invocation.arguments)),
+                    self.mask([edge.invocation.target_var]))
+        return (gen, 0)
+
+
+class ReachingDefinitions(GenKillProblem):
+    ''' Assignments that may reach a point without the variable being
+    reassigned. Facts are (block, index) of assignments and the
+    invocations with a target variable. '''
+
+    forward = True
+    may = True
+
+    def __init__(self):
+        super(ReachingDefinitions, self).__init__()
+        # variable -> set of its definitions
+        self._definitions = {}
+
+    def _add_definition(self, fact, variable):
+        self._definitions[variable] = (self._definitions.get(variable, 0)
+                                       | 1 << self.fact_id(fact))
+
+    def collect(self, method):
+        for block in method.blocks():
+            for (index, instruction) in enumerate(block.instructions()):
+                variable = _defined_variable(instruction)
+                if variable is not None:
+                    self._add_definition((block, index), variable)
+            for successor in method.successors(block):
+                invocation = method.get_edge(block, successor).invocation
+                if invocation is not None and invocation.target_var:
+                    self._add_definition(invocation, invocation.target_var)
+
+    def _gen_kill(self, fact, variable):
+        gen = 1 << self.fact_id(fact)
+        return (gen, self._definitions[variable] & ~gen)
+
+    def gen_kill(self, instruction, site):
+        variable = _defined_variable(instruction)
+        if variable is None:
+            return (0, 0)
+        return self._gen_kill(site, variable)
+
+    def edge_gen_kill(self, edge):
+        invocation = edge.invocation
+        if invocation is None or not invocation.target_var:
+            return (0, 0)
+        return self._gen_kill(invocation, invocation.target_var)
+
+
+class AvailableExpressions(GenKillProblem):
+    ''' Expressions computed on all paths and not invalidated by an
+    assignment to one of their operands since. Facts are
+    (operator, operand1, operand2) and (operator, operand). '''
+
+    forward = True
+    may = False
+
+    def __init__(self):
+        super(AvailableExpressions, self).__init__()
+        # variable -> set of the expressions using it
+        self._uses = {}
+
+    def collect(self, method):
+        for block in method.blocks():
+            for instruction in block.instructions():
+                expression = _expression(instruction)
+                if expression is not None:
+                    bit = 1 << self.fact_id(expression)
+                    for v in _operands(expression[1:]):
+                        self._uses[v] = self._uses.get(v, 0) | bit
+
+    def _killed(self, variable):
+        return self._uses.get(variable, 0)
+
+    def gen_kill(self, instruction, site):
+        kill = self._killed(_defined_variable(instruction))
+        expression = _expression(instruction)
+        if expression is None:
+            return (0, kill)
+        # x := x + 1 does not make x + 1 available
+        return (self.mask([expression]) & ~kill, kill)
+
+    def edge_gen_kill(self, edge):
+        if edge.invocation is None:
+            return (0, 0)
+        return (0, self._killed(edge.invocation.target_var))
+
+
+def _compose(steps):
+    ''' Return the (gen, kill) sets of applying the (gen, kill) steps
+    in order. '''
+    (gen, kill) = (0, 0)
+    for (step_gen, step_kill) in steps:
+        gen = (gen & ~step_kill) | step_gen
+        kill |= step_kill
+    return (gen, kill)
+
+
+class BitVectorSolver(object):
+    ''' Solves a GenKillProblem on a method. The instructions of every
+    block are summarized by one gen and one kill set beforehand, so
+    visiting a block costs two bitwise operations plus the join. The
+    worklist is processed in reverse postorder (of the reversed
+    graph for backward problems). After solve(), in_values and
+    out_values hold the facts at the start and the end of every
+    block; facts(mask) decodes them. '''
+
+    def __init__(self, method, problem):
+        self._method = method
+        self._problem = problem
+        problem.collect(method)
+        self.in_values, self.out_values = {}, {}
+        self.visits = 0
+
+    def facts(self, mask):
+        return self._problem.facts(mask)
+
+    def _block_gen_kill(self, block):
+        sites = list(enumerate(block.instructions()))
+        if not self._problem.forward:
+            sites.reverse()
+        return _compose(self._problem.gen_kill(instruction, (block, index))
+                        for (index, instruction) in sites)
+
+    def _postorder(self, start, successors):
+        ''' Blocks reachable from start in postorder (iteratively, for
+        deep graphs). '''
+        result = []
+        visited = set([start])
+        stack = [(start, iter(successors[start]))]
+        while stack:
+            (block, children) = stack[-1]
+            for child in children:
+                if child not in visited:
+                    visited.add(child)
+                    stack.append((child, iter(successors[child])))
+                    break
+            else:
+                stack.pop()
+                result.append(block)
+        return result
+
+    def solve(self):
+        method = self._method
+        problem = self._problem
+        blocks = method.blocks()
+        successors = dict((block, method.successors(block))
+                          for block in blocks)
+        predecessors = dict((block, method.predecessors(block))
+                            for block in blocks)
+        # edge (from, to) in the direction of the analysis, its
+        # gen and kill
+        edge_gen_kill = {}
+        for block in blocks:
+            for successor in successors[block]:
+                (gen, kill) = problem.edge_gen_kill(
+                    method.get_edge(block, successor))
+                if gen or kill:
+                    if problem.forward:
+                        edge_gen_kill[(block, successor)] = (gen, ~kill)
+                    else:
+                        edge_gen_kill[(successor, block)] = (gen, ~kill)
+        if problem.forward:
+            (start, sources, targets) = (method.initial, predecessors,
+                                         successors)
+        else:
+            (start, sources, targets) = (method.final, successors,
+                                         predecessors)
+        gen, keep = {}, {}
+        for block in blocks:
+            (gen[block], kill) = self._block_gen_kill(block)
+            keep[block] = ~kill
+        initial = 0 if problem.may else problem.universe()
+        boundary = problem.boundary(method)
+        # entering: facts before a block, leaving: after it (in the
+        # direction of the analysis)
+        entering = dict((block, initial) for block in blocks)
+        leaving = dict((block, initial) for block in blocks)
+        order = list(reversed(self._postorder(start, targets)))
+        priority = dict((block, i) for (i, block) in enumerate(order))
+        # blocks behind the current one (reached by a back edge) wait
+        # for the next pass instead of restarting the current one
+        worklist = range(len(order))
+        pending = []
+        queued = set(order)
+        may = problem.may
+        while worklist or pending:
+            if not worklist:
+                (worklist, pending) = (pending, [])
+                heapq.heapify(worklist)
+            current = heapq.heappop(worklist)
+            block = order[current]
+            queued.discard(block)
+            self.visits += 1
+            value = None
+            for source in sources[block]:
+                if source not in priority:
+                    # unreachable
+                    continue
+                incoming = leaving[source]
+                edge = edge_gen_kill.get((source, block))
+                if edge is not None:
+                    incoming = (incoming & edge[1]) | edge[0]
+                if value is None:
+                    value = incoming
+                elif may:
+                    value |= incoming
+                else:
+                    value &= incoming
+            if block is start:
+                if value is None:
+                    value = boundary
+                elif may:
+                    value |= boundary
+                else:
+                    value &= boundary
+            elif value is None:
+                value = initial
+            entering[block] = value
+            value = (value & keep[block]) | gen[block]
+            if value != leaving[block]:
+                leaving[block] = value
+                for target in targets[block]:
+                    if target not in queued and target in priority:
+                        queued.add(target)
+                        if priority[target] > current:
+                            heapq.heappush(worklist, priority[target])
+                        else:
+                            pending.append(priority[target])
+        if problem.forward:
+            (self.in_values, self.out_values) = (entering, leaving)
+        else:
+            (self.in_values, self.out_values) = (leaving, entering)
+        return self
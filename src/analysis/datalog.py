@@ -0,0 +1,298 @@
+##############################
+#
+# datalog.py
+#
+# Embedded semi-naive
+# Datalog engine
+#
+# (C) 2016, Andreas Gaiser
+##############################
+
+
+class Var(object):
+    ''' A Datalog variable. Variables are local to a rule: the same
+    Var object may be used in several rules. '''
+
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+
+class Atom(object):
+    ''' relation(term, ...); terms are Vars or constants (any hashable
+    value, typically integer ids). '''
+
+    def __init__(self, relation, terms):
+        if len(terms) != relation.arity:
+            raise ValueError('%s has arity %d' % (relation.name,
+                                                  relation.arity))
+        self.relation = relation
+        self.terms = tuple(terms)
+
+    def variables(self):
+        return [term for term in self.terms if isinstance(term, Var)]
+
+    def __str__(self):
+        return '%s(%s)' % (self.relation.name,
+                           ', '.join('%s' % term for term in self.terms))
+
+
+class Relation(object):
+    ''' A set of tuples with hash indexes: for every combination of
+    positions a rule looks tuples up by, a dict maps the values at
+    these positions to the tuples having them. Indexes are built when
+    first needed and kept up to date when tuples are added. '''
+
+    def __init__(self, name, arity):
+        self.name = name
+        self.arity = arity
+        self._tuples = set()
+        self._indexes = {}
+
+    def __call__(self, *terms):
+        return Atom(self, terms)
+
+    def __len__(self):
+        return len(self._tuples)
+
+    def __contains__(self, values):
+        return values in self._tuples
+
+    def tuples(self):
+        return self._tuples
+
+    def _add(self, values):
+        ''' Add a tuple; return whether it is new. '''
+        if values in self._tuples:
+            return False
+        self._tuples.add(values)
+        for (positions, index) in self._indexes.iteritems():
+            key = tuple(values[i] for i in positions)
+            index.setdefault(key, []).append(values)
+        return True
+
+    def _index(self, positions):
+        try:
+            return self._indexes[positions]
+        except KeyError:
+            index = {}
+            for values in self._tuples:
+                key = tuple(values[i] for i in positions)
+                index.setdefault(key, []).append(values)
+            self._indexes[positions] = index
+            return index
+
+
+class _Step(object):
+    ''' One body atom of a compiled rule: which positions are known
+    (constants, or variables bound by earlier steps) and which
+    variables the atom binds. '''
+
+    def __init__(self, atom, slots, bound):
+        self.relation = atom.relation
+        # (position, constant or None, slot or None) of known positions
+        self.known = []
+        # (position, slot) of the variables bound here
+        self.binds = []
+        # (position, earlier position) of variables repeated in atom
+        self.repeats = []
+        first = {}
+        for (position, term) in enumerate(atom.terms):
+            if not isinstance(term, Var):
+                self.known.append((position, term, None))
+            elif slots[term] in bound:
+                self.known.append((position, None, slots[term]))
+            elif term in first:
+                self.repeats.append((position, first[term]))
+            else:
+                first[term] = position
+                self.binds.append((position, slots[term]))
+        bound.update(slot for (position, slot) in self.binds)
+        self.positions = tuple(position for (position, constant, slot)
+                               in self.known)
+
+    def key(self, binding):
+        return tuple(binding[slot] if slot is not None else constant
+                     for (position, constant, slot) in self.known)
+
+    def matches(self, values, binding):
+        ''' Whether values agree with the known positions (for steps
+        not looked up by index). '''
+        for (position, constant, slot) in self.known:
+            if values[position] != (binding[slot] if slot is not None
+                                    else constant):
+                return False
+        return True
+
+
+class _Rule(object):
+    ''' A rule compiled for semi-naive evaluation: for every body
+    atom, a join order starting with that atom (to be read from the
+    delta of its relation). '''
+
+    def __init__(self, head, body):
+        self.head = head
+        self.body = body
+        slots = {}
+        for atom in body:
+            for v in atom.variables():
+                slots.setdefault(v, len(slots))
+        for v in head.variables():
+            if v not in slots:
+                raise ValueError('Variable %s of %s does not occur in the '
+                                 'body' % (v, head))
+        self.size = len(slots)
+        self.head_terms = [(None, slots[term]) if isinstance(term, Var)
+                           else (term, None) for term in head.terms]
+        self.plans = []
+        for first in xrange(len(body)):
+            self.plans.append(self._plan(first, slots))
+
+    def _plan(self, first, slots):
+        ''' Join order for a delta of body[first]: next is always the
+        atom with the most known positions. '''
+        bound = set()
+        steps = [_Step(self.body[first], slots, bound)]
+        remaining = [atom for (i, atom) in enumerate(self.body)
+                     if i != first]
+        while remaining:
+            def known(atom):
+                return sum(1 for term in atom.terms
+                           if not isinstance(term, Var)
+                           or slots[term] in bound)
+            atom = max(remaining, key=known)
+            remaining.remove(atom)
+            steps.append(_Step(atom, slots, bound))
+        return steps
+
+    def evaluate(self, first, delta, result):
+        ''' Add the head tuples derived with the tuples of delta for
+        body[first] to result. '''
+        steps = self.plans[first]
+        binding = [None] * self.size
+        head_terms = self.head_terms
+
+        def join(depth, candidates):
+            step = steps[depth]
+            last = depth + 1 == len(steps)
+            for values in candidates:
+                if depth == 0 and not step.matches(values, binding):
+                    continue
+                for (position, slot) in step.binds:
+                    binding[slot] = values[position]
+                if step.repeats and any(values[position] != values[other]
+                                        for (position, other)
+                                        in step.repeats):
+                    continue
+                if last:
+                    result.add(tuple(binding[slot] if slot is not None
+                                     else constant
+                                     for (constant, slot) in head_terms))
+                else:
+                    following = steps[depth + 1]
+                    join(depth + 1, following.relation._index(
+                        following.positions).get(following.key(binding),
+                                                  ()))
+        join(0, delta)
+
+
+class Program(object):
+    ''' A positive Datalog program (no negation), evaluated bottom-up
+    and semi-naively: every round only joins with the tuples derived
+    in the previous round (the delta) for one body atom, the full
+    relations for the others.
+
+        program = Program()
+        edge = program.relation('Edge', 2)
+        path = program.relation('Path', 2)
+        (x, y, z) = (Var('x'), Var('y'), Var('z'))
+        program.fact(edge(1, 2))
+        program.rule(path(x, y), [edge(x, y)])
+        program.rule(path(x, z), [path(x, y), edge(y, z)])
+        program.solve()
+        program.query(path(1, x))
+
+    Facts and rules may be added after solve(); the next solve()
+    continues from the current relations. '''
+
+    def __init__(self):
+        self._relations = {}
+        self._rules = []
+        # rules not evaluated yet on the full relations
+        self._new_rules = []
+        # relation -> tuples not joined yet
+        self._delta = {}
+
+    def relation(self, name, arity):
+        ''' Declare (or get) the relation name. '''
+        try:
+            relation = self._relations[name]
+        except KeyError:
+            relation = self._relations[name] = Relation(name, arity)
+            return relation
+        if relation.arity != arity:
+            raise ValueError('%s has arity %d' % (name, relation.arity))
+        return relation
+
+    def relations(self):
+        return self._relations.values()
+
+    def fact(self, atom):
+        ''' Add a ground atom. '''
+        if atom.variables():
+            raise ValueError('Fact %s is not ground' % atom)
+        if atom.relation._add(atom.terms):
+            self._delta.setdefault(atom.relation, set()).add(atom.terms)
+
+    def rule(self, head, body):
+        ''' Add the rule head :- body[0], ..., body[n]. '''
+        if not body:
+            return self.fact(head)
+        rule = _Rule(head, list(body))
+        self._rules.append(rule)
+        self._new_rules.append(rule)
+
+    def solve(self):
+        ''' Derive all tuples; return the number of rounds. '''
+        rounds = 0
+        # new rules see all tuples once
+        delta = self._delta
+        derived = {}
+        for rule in self._new_rules:
+            rule.evaluate(0, list(rule.body[0].relation.tuples()),
+                          derived.setdefault(rule.head.relation, set()))
+        self._new_rules = []
+        while True:
+            for rule in self._rules:
+                for (first, atom) in enumerate(rule.body):
+                    if atom.relation in delta:
+                        rule.evaluate(first, delta[atom.relation],
+                                      derived.setdefault(rule.head.relation,
+                                                         set()))
+            delta = {}
+            for (relation, tuples) in derived.iteritems():
+                new = set(values for values in tuples
+                          if relation._add(values))
+                if new:
+                    delta[relation] = new
+            derived = {}
+            rounds += 1
+            if not delta:
+                break
+        self._delta = {}
+        return rounds
+
+    def query(self, atom):
+        ''' The tuples of atom.relation matching atom (constants
+        and repeated variables). '''
+        result = []
+        bound = set()
+        step = _Step(atom, dict((v, v) for v in atom.variables()), bound)
+        for values in atom.relation._index(step.positions).get(
+                step.key(None), ()):
+            if not any(values[position] != values[other]
+                       for (position, other) in step.repeats):
+                result.append(values)
+        return result
@@ -0,0 +1,119 @@
+##############################
+#
+# ordering.py
+#
+# Static variable order for
+# decision diagrams
+#
+# (C) 2016, Andreas Gaiser
+##############################
+
+from code_rep.instr import *
+from code_rep.variable import Variable
+from code_rep.type_system import Integer
+
+
+class VariableOrdering(object):
+    ''' Orders the boolean variables of a program so that variables
+    occuring together in conditions get neighbouring levels. Two
+    boolean variables are the closer related the more edge conditions
+    (or assignments) they share, directly or via common integer
+    operands. The order is built greedily: the next variable is the
+    one most related to the variables already placed, or the least
+    related one overall when starting a new group of variables (so
+    that chains are traversed from one end). '''
+
+    def __init__(self):
+        # number of shared conditions by pair of variables
+        self._weights = {}
+        # all variables, in order of first occurence
+        self._variables = []
+        self._seen = set()
+
+    def _relate(self, variables):
+        variables = [v for v in variables if isinstance(v, Variable)]
+        for v in variables:
+            if v not in self._seen:
+                self._seen.add(v)
+                self._variables.append(v)
+        for v1 in variables:
+            for v2 in variables:
+                if v1 is not v2:
+                    self._weights.setdefault(v1, {})
+                    self._weights[v1][v2] = self._weights[v1].get(v2, 0) + 1
+
+    def _is_bool(self, v):
+        v_type = v.get_type()
+        return isinstance(v_type, Integer) and v_type.is_bool_type()
+
+    # Collecting co-occurences
+
+    def add_instruction(self, instruction):
+        if isinstance(instruction, DirectVariableAssignment):
+            self._relate([instruction.target, instruction.source])
+
+    def add_condition(self, condition):
+        (operator, op1, op2) = condition
+        self._relate([op1, op2])
+
+    def add_method(self, method):
+        for block in method.blocks():
+            for instruction in block.instructions():
+                self.add_instruction(instruction)
+            for successor in method.successors(block):
+                edge = method.get_edge(block, successor)
+                if edge.condition is not None:
+                    self.add_condition(edge.condition)
+
+    def add_module(self, module):
+        for method in module.methods():
+            self.add_method(method)
+
+    def _affinities(self, booleans):
+        ''' Return the affinity of all pairs of boolean variables:
+        the number of shared conditions plus, for every integer
+        variable, the product of their conditions with it. '''
+        affinity = dict((v, {}) for v in booleans)
+        for v1 in booleans:
+            weights = self._weights.get(v1, {})
+            for (v, weight) in weights.iteritems():
+                if v in affinity:
+                    affinity[v1][v] = affinity[v1].get(v, 0) + weight
+                else:
+                    for (v2, weight2) in self._weights[v].iteritems():
+                        if v2 in affinity and v2 is not v1:
+                            affinity[v1][v2] = (affinity[v1].get(v2, 0)
+                                                + weight * weight2)
+        return affinity
+
+    def order(self):
+        ''' Return the list of boolean variables in the computed
+        order. '''
+        booleans = [v for v in self._variables if self._is_bool(v)]
+        affinity = self._affinities(booleans)
+        position = dict((v, i) for (i, v) in enumerate(booleans))
+        # relation of the unplaced variables to the placed ones
+        relation = dict((v, 0) for v in booleans)
+        result = []
+        total = dict((v, sum(affinity[v].itervalues())) for v in booleans)
+        while relation:
+            # most related, then least related overall, then first
+            v = max(relation,
+                    key=lambda v: (relation[v], -total[v], -position[v]))
+            del relation[v]
+            result.append(v)
+            for (v2, weight) in affinity[v].iteritems():
+                if v2 in relation:
+                    relation[v2] += weight
+        return result
+
+    @staticmethod
+    def compute_order(method_or_module):
+        ''' Compute the order of the boolean variables of a method or
+        a whole module. '''
+        ordering = VariableOrdering()
+        if hasattr(method_or_module, 'methods'):
+            ordering.add_module(method_or_module)
+        else:
+            ordering.add_method(method_or_module)
+        return ordering.order()
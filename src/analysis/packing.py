@@ -0,0 +1,103 @@
+##############################
+#
+# packing.py
+#
+# Variable packing for
+# relational domains
+#
+# (C) 2016, Andreas Gaiser
+##############################
+
+from code_rep.instr import *
+from code_rep.variable import Variable
+
+
+class VariablePacking(object):
+    ''' Groups variables into independent packs: two variables are
+    in the same pack iff they are (transitively) related by a
+    variable assignment, a binary operation or an edge condition.
+    Variables that never occur together with another variable are
+    not packed at all. '''
+
+    def __init__(self):
+        self._parent = {}
+        self._related = set()
+
+    # Union-find
+
+    def _find(self, v):
+        root = v
+        while self._parent[root] is not root:
+            root = self._parent[root]
+        # path compression
+        while self._parent[v] is not root:
+            (self._parent[v], v) = (root, self._parent[v])
+        return root
+
+    def _relate(self, variables):
+        variables = [v for v in variables if isinstance(v, Variable)]
+        for v in variables:
+            self._parent.setdefault(v, v)
+        if len(variables) < 2:
+            return
+        root = self._find(variables[0])
+        self._related.add(variables[0])
+        for v in variables[1:]:
+            self._parent[self._find(v)] = root
+            self._related.add(v)
+
+    # Collecting co-occurences
+
+    def add_instruction(self, instruction):
+        if isinstance(instruction, BinaryOpAssignment):
+            self._relate([instruction.target,
+                          instruction.operand1,
+                          instruction.operand2])
+        elif isinstance(instruction, DirectVariableAssignment):
+            self._relate([instruction.target, instruction.source])
+
+    def add_condition(self, condition):
+        (operator, op1, op2) = condition
+        self._relate([op1, op2])
+
+    def add_method(self, method):
+        for block in method.blocks():
+            for instruction in block.instructions():
+                self.add_instruction(instruction)
+            for successor in method.successors(block):
+                edge = method.get_edge(block, successor)
+                if edge.condition is not None:
+                    self.add_condition(edge.condition)
+                if edge.invocation is not None:
+                    self.add_invocation(edge.invocation)
+
+    def add_invocation(self, invocation):
+        ''' Arguments are assigned to parameters, the return variable
+        to the target variable. '''
+        invoked = invocation.invoked_method
+        for (arg, parameter) in zip(invocation.arguments,
+                                    invoked.parameters()):
+            self._relate([arg, parameter])
+        if invoked.return_variable and invocation.target_var:
+            self._relate([invocation.target_var, invoked.return_variable])
+
+    def add_module(self, module):
+        for method in module.methods():
+            self.add_method(method)
+
+    def packs(self):
+        ''' Return the list of packs (lists of variables). '''
+        result = {}
+        for v in self._related:
+            result.setdefault(self._find(v), []).append(v)
+        return result.values()
+
+    @staticmethod
+    def compute_packs(method_or_module):
+        ''' Compute the packs of a method or a whole module. '''
+        packing = VariablePacking()
+        if hasattr(method_or_module, 'methods'):
+            packing.add_module(method_or_module)
+        else:
+            packing.add_method(method_or_module)
+        return packing.packs()
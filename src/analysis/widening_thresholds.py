@@ -0,0 +1,59 @@
+##############################
+#
+# widening_thresholds.py
+#
+# Widening thresholds from
+# program constants
+#
+# (C) 2016, Andreas Gaiser
+##############################
+
+import numbers
+from code_rep.instr import *
+
+
+class WideningThresholds(object):
+    ''' Collects the constants of a program as widening thresholds:
+    the constants of constant assignments and, for each constant c
+    in an edge condition, c - 1, c and c + 1 (the bounds of x < c,
+    x <= c, x > c etc.). '''
+
+    def __init__(self):
+        self._constants = set()
+
+    def add_instruction(self, instruction):
+        if isinstance(instruction, ConstantAssignment):
+            self._constants.add(instruction.source)
+
+    def add_condition(self, condition):
+        (operator, op1, op2) = condition
+        for op in (op1, op2):
+            if isinstance(op, numbers.Number):
+                self._constants.update((op - 1, op, op + 1))
+
+    def add_method(self, method):
+        for block in method.blocks():
+            for instruction in block.instructions():
+                self.add_instruction(instruction)
+            for successor in method.successors(block):
+                edge = method.get_edge(block, successor)
+                if edge.condition is not None:
+                    self.add_condition(edge.condition)
+
+    def add_module(self, module):
+        for method in module.methods():
+            self.add_method(method)
+
+    def thresholds(self):
+        ''' Return the sorted list of thresholds. '''
+        return sorted(self._constants)
+
+    @staticmethod
+    def compute_thresholds(method_or_module):
+        ''' Compute the thresholds of a method or a whole module. '''
+        collector = WideningThresholds()
+        if hasattr(method_or_module, 'methods'):
+            collector.add_module(method_or_module)
+        else:
+            collector.add_method(method_or_module)
+        return collector.thresholds()
@@ -8,6 +8,8 @@
 ##############################
 
 from analysis.eval import *
+from analysis.widening_thresholds import WideningThresholds
+from analysis.ordering import VariableOrdering
 from code_rep.instr import *
 from code_rep.variable import *
 from code_rep.type_system import *
@@ -35,6 +37,9 @@ class MethodAnalyzer(object):
             method_or_module=method,
             reverse=True)
         self.in_values, self.out_values = {}, {}
+        # rounds of the stabilization of each component in the last
+        # analysis, by head
+        self.rounds = {}
         # add all variables
         for parameter in method.parameters():
             self._add_var(parameter)
@@ -42,6 +47,58 @@ class MethodAnalyzer(object):
             self._add_var(method.return_variable)
         for v in method.local_variables():
             self._add_var(v)
+        # widening thresholds (of the whole module if analyzed by
+        # a module analyzer)
+        self._thresholds = (module_analyzer.thresholds
+                            if module_analyzer
+                            else WideningThresholds.compute_thresholds(method))
+        for constant in self._thresholds:
+            self._dom.add_constant(constant)
+        # static order of the boolean variables (of the whole module
+        # if analyzed by a module analyzer)
+        self._dom.set_variable_order(
+            module_analyzer.variable_order
+            if module_analyzer
+            else VariableOrdering.compute_order(method))
+        # compiled transfer functions of the blocks, by (block, forward)
+        self._transfers = {}
+
+    def _operations(self, instructions):
+        ''' Translate instructions to domain operations (see
+        DomainFactory.compile_block). '''
+        operations = []
+        # TODO: make this more extensible!
+        for instruction in instructions:
+            if isinstance(instruction, DirectVariableAssignment):
+                operations.append(('op_load_variable',
+                                   instruction.target,
+                                   instruction.source))
+            elif isinstance(instruction, ConstantAssignment):
+                operations.append(('op_load_constant',
+                                   instruction.target,
+                                   instruction.source))
+            elif isinstance(instruction, BinaryOpAssignment):
+                operations.append(('op_binary',
+                                   instruction.operator,
+                                   instruction.target,
+                                   instruction.operand1,
+                                   instruction.operand2))
+            else:
+                pass #TODO: UnaryOpAssignment, Alloc, Load, Store, Address
+        return operations
+
+    def _transfer(self, block, forward):
+        ''' Return the compiled transfer function of block. '''
+        try:
+            return self._transfers[(block, forward)]
+        except KeyError:
+            instructions = block.instructions()
+            if not forward:
+                instructions = list(reversed(instructions))
+            transfer = self._dom.compile_block(
+                self._operations(instructions))
+            self._transfers[(block, forward)] = transfer
+            return transfer
 
     def get_final_out_value(self):
         return self.out_values[self._method.final]
@@ -50,7 +107,16 @@ class MethodAnalyzer(object):
                 head_init_element,
                 ordinary_init_element,
                 analyze_forward = True,
-                iterations_without_widening = 5):
+                iterations_without_widening = None):
+        ''' iterations_without_widening defaults to 0 if there are
+        widening thresholds and the domain widens to them, so that
+        loops with constant bounds stabilize right away, to 5
+        otherwise. '''
+        if iterations_without_widening is None:
+            iterations_without_widening = (
+                0 if self._thresholds and self._dom.threshold_widening
+                else 5)
+        self.rounds = {}
         ins, outs = {}, {}
         head = (self._method.initial
                 if analyze_forward
@@ -70,36 +136,6 @@ class MethodAnalyzer(object):
                              else ordinary_init_element)
                 ins[loc] = ordinary_init_element
                 
-        # TODO: make this more extensible!
-        def apply_instruction(instruction, value):
-            if isinstance(instruction, DirectVariableAssignment):
-                return self._dom.op_load_variable(value,
-                                                  instruction.target,
-                                                  instruction.source)
-            elif isinstance(instruction, ConstantAssignment):
-                return self._dom.op_load_constant(value,
-                                                  instruction.target,
-                                                  instruction.source)
-            elif isinstance(instruction, BinaryOpAssignment):
-                return self._dom.op_binary(value,
-                                           instruction.operator,
-                                           instruction.target,
-                                           instruction.operand1,
-                                           instruction.operand2)
-            elif isinstance(instruction, UnaryOpAssignment):
-                pass
-            elif isinstance(instruction, Alloc):
-                pass #TODO
-            elif isinstance(instruction, Load):
-                pass #TODO
-            elif isinstance(instruction, Store):
-                pass #TODO
-            elif isinstance(instruction, Address):
-                pass #TODO
-            else:
-                pass #TODO
-            return value
-                
         def _apply_condition(condition, value):
             (operator, op1, op2) = condition
             return self._dom.cond_binary(value,
@@ -115,8 +151,10 @@ class MethodAnalyzer(object):
                 and not isinstance(elements[0], EvalSequence)):
                 widen_loc = elements[0]
             decreasing = False
+            rounds = 0
             while not decreasing:
                 decreasing = True
+                rounds += 1
                 for element in elements:
                     print "Processing: %s" % element
                     if isinstance(element, EvalSequence):
@@ -134,8 +172,8 @@ class MethodAnalyzer(object):
                                 = (self._method.get_edge(neighbour,
                                                          element)
                                    if analyze_forward
-                                   else _method.get_edge(element,
-                                                         neighbour))
+                                   else self._method.get_edge(element,
+                                                              neighbour))
                                      # is there an invocation?
                             invocation = current_edge.invocation
                             neighbour_element = (outs[neighbour]
@@ -166,17 +204,8 @@ class MethodAnalyzer(object):
                                  if (condition is not None)
                                  else neighbour_element))
                         # new input computed, now: compute the output
-                        new_output = new_input
-                        if analyze_forward:
-                            for instruction in element.instructions():
-                                new_output = apply_instruction(
-                                    instruction,
-                                    new_output)
-                        else:
-                            for instruction in reversed(element.instructions()):
-                                new_output = apply_instruction(
-                                    instruction,
-                                    new_output)
+                        new_output = self._transfer(
+                            element, analyze_forward)(new_input)
                         old_element = (outs[element]
                                        if analyze_forward
                                        else ins[element])
@@ -195,6 +224,8 @@ class MethodAnalyzer(object):
                         else:
                             ins[element] = new_output
                             outs[element] = new_input
+            if widen_loc is not None:
+                self.rounds[widen_loc] = self.rounds.get(widen_loc, 0) + rounds
                             
         stabilize(sequence)
         self.in_values = ins
@@ -216,6 +247,8 @@ class Module0CFAForwardAnalyzer(object):
                 reverse=True)
         self.outs = {}
         self._invocation_ins, self._invocation_outs = {}, {}
+        self.thresholds = WideningThresholds.compute_thresholds(module)
+        self.variable_order = VariableOrdering.compute_order(module)
         
     def perform_return(self,
                        invocation):
@@ -233,15 +266,14 @@ class Module0CFAForwardAnalyzer(object):
                                                  invoked.return_variable)
         # remove vars of the invoked
         # TODO: seems strange, when we use *recursion*
-        for var in invoked.parameters():
-            element = self._dom.project_var(element, var)
-        for var in invoked.local_variables():
-            element = self._dom.project_var(element, var)
+        element = self._dom.project_vars(element,
+                                         list(invoked.parameters())
+                                         + list(invoked.local_variables()))
 
         # remove parameters from out
         before_invocation = self._invocation_ins[invocation]
-        for var in invoked.parameters():
-            before_invocation = self._dom.project_var(before_invocation, var)
+        before_invocation = self._dom.project_vars(before_invocation,
+                                                   invoked.parameters())
         composed_element = element # self._dom.intersect(element, before_invocation)
         self._invocation_outs[invocation] = composed_element
         return composed_element
@@ -267,7 +299,13 @@ class Module0CFAForwardAnalyzer(object):
     def analyze(self,
                 head_init_element,
                 ordinary_init_element,
-                iterations_without_widening = 5):
+                iterations_without_widening = None):
+        ''' iterations_without_widening defaults as in
+        MethodAnalyzer.analyze. '''
+        if iterations_without_widening is None:
+            iterations_without_widening = (
+                0 if self.thresholds and self._dom.threshold_widening
+                else 5)
         head = self._module.initial
         sequence = self._forward_sequence
         # create method analyzers
@@ -11,8 +11,7 @@
 
 from code_rep.instr import *
 from code_rep.type_system import Integer, Pointer
-import os
-import z3
+from analysis import datalog
 
 class AndersenAnalysis(object):
     
@@ -34,6 +33,7 @@ class AndersenAnalysis(object):
         self._module = module
 
     def create_z3_fp_program(self):
+        import z3
         fp = z3.Fixedpoint()
         fp.set(engine='datalog')
         
@@ -112,13 +112,12 @@ class AndersenAnalysis(object):
                                         inv_locations[p2])
         
         
-    def _create_datalog_file(self):
+    def _create_datalog_program(self):
         #
         # One relation PointsTo subseteq Locations X Locations
         #
         # Collect all locations
         #
-        result = ''
         locations = {}
         inv_locations = {}
         counter = 0
@@ -136,8 +135,10 @@ class AndersenAnalysis(object):
                 inv_locations[alloc] = counter
                 counter += 1
 
-        result += 'LOC %s\n' % len(locations)
-        result += 'PointsTo(x: LOC, y: LOC) printtuples\n'
+        program = datalog.Program()
+        points_to = program.relation('PointsTo', 2)
+        (x, z1, z2) = (datalog.Var('x'), datalog.Var('z1'),
+                       datalog.Var('z2'))
 
         for method in self._module.methods():
 
@@ -146,56 +147,45 @@ class AndersenAnalysis(object):
                     if isinstance(instruction, Address):
                         # X := &Y
                         # X -> Y 
-                        result += ('PointsTo("LOC%s", "LOC%s").\n' %
-                                   (inv_locations[instruction.target],
-                                    inv_locations[instruction.rhs]))
+                        program.fact(
+                            points_to(inv_locations[instruction.target],
+                                      inv_locations[instruction.rhs]))
                     elif isinstance(instruction, DirectVariableAssignment):
                         # X := Y
                         # All Z: Y -> Z => X -> Z
                         if isinstance(instruction.target.get_type(), Pointer):
-                            result += ('PointsTo("LOC%s", x) :- PointsTo("LOC%s", x).\n'
-                                       % (inv_locations[instruction.target],
-                                          inv_locations[instruction.source]))
+                            program.rule(
+                                points_to(inv_locations[instruction.target],
+                                          x),
+                                [points_to(inv_locations[instruction.source],
+                                           x)])
                     elif isinstance(instruction, Load):
                         # X := *Y
                         # ALL Z1, Z2: Y -> Z1 && Z1 -> Z2 => X -> Z2
-                        result += ('PointsTo("LOC%s", Z2) :- '
-                                   'PointsTo("LOC%s", Z1), PointsTo(Z1, Z2).\n'
-                                   % (inv_locations[instruction.target],
-                                      inv_locations[instruction.rhs]))
+                        program.rule(
+                            points_to(inv_locations[instruction.target], z2),
+                            [points_to(inv_locations[instruction.rhs], z1),
+                             points_to(z1, z2)])
                     elif isinstance(instruction, Store):
                         # *X := Y
                         # ALL Z1, Z2: X -> Z1 && Y -> Z2 => Z1 -> Z2
 
                         if isinstance(instruction.rhs.get_type(), Pointer):
-                            result += ('PointsTo(z1, z2) :- '
-                                       'PointsTo("LOC%s", z1), PointsTo("LOC%s", z2).\n'
-                                       % (inv_locations[instruction.target],
-                                          inv_locations[instruction.rhs]))          
-
-                            
-        def datalog_solve(program, filename, numberingtype="scc"):
-            java_cmd = '..\\bddbddb-full.jar'
-            print program
-            f = file (filename, "wt")
-            print>>f, program
-            f.close()
-            cmd = 'java -cp %s -mx600m -Dlearnbestorder=n -Dsingleignore=yes -Dbasedir=./results/ -Dbddcache=1500000 -Dbddnodes=40000000 -Dpa.clinit=no -Dpa.filternull=yes -Dpa.unknowntypes=no net.sf.bddbddb.Solver %s' % (java_cmd, filename)
-            w = ' net.sf.bddbddb.Solver'
-            print cmd
-            (in_p, out_p) = os.popen2(cmd)
-            result_str = out_p.read()
-            out_p.close()    
-            in_p.close()
-            #print result_str
-            result = ''
-            for line in result_str.splitlines():
-                line = line.strip()
-                print "**", line
-                if line.startswith('(x=LOC'):
-                    result += '%s\n' % line
-            return result
-
-        print datalog_solve(result, 'testle')
-        for el in inv_locations:
-            print "%s => %s" % (el, inv_locations[el])
+                            program.rule(
+                                points_to(z1, z2),
+                                [points_to(inv_locations[instruction.target],
+                                           z1),
+                                 points_to(inv_locations[instruction.rhs],
+                                           z2)])
+        return (program, points_to, locations)
+
+    def datalog_points_to(self):
+        ''' Solve the points-to rules with the embedded Datalog engine;
+        map every location to the set of locations it may point to. '''
+        (program, points_to, locations) = self._create_datalog_program()
+        program.solve()
+        result = {}
+        for (source, target) in points_to.tuples():
+            result.setdefault(locations[source], set()).add(
+                locations[target])
+        return result
@@ -49,8 +49,8 @@ class BinaryOpAssignment(Assignment):
     def __init__(self, target, operator, operand1, operand2):
         super(BinaryOpAssignment, self).__init__(target)
         assert operator in ['+', '-', '*', '%', '/']
-        assert (operand1 in variable.Variable)
-        assert (operand2 in variable.Variable)
+        assert isinstance(operand1, (variable.Variable, numbers.Number))
+        assert isinstance(operand2, (variable.Variable, numbers.Number))
         self.operand1 = operand1
         self.operand2 = operand2
         self.operator = operator 
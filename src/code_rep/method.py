@@ -160,12 +160,12 @@ class Method(object):
         
     def successors(self, block):
         ''' Return all direct successor blocks of block. '''
-        assert block in self._blocks
+        assert block in self._outs
         return self._outs[block]
 
     def predecessors(self, block):
         ''' Return all direct predecessor blocks of block. '''
-        assert block in self._blocks
+        assert block in self._ins
         return self._ins[block]
 
     def add_local_variable(self, v):
@@ -0,0 +1,351 @@
+##############################
+#
+# array_boxes.py
+#
+# Box (interval) domain on
+# NumPy bound vectors
+#
+# (C) 2016, Andreas Gaiser
+##############################
+
+import numbers
+import numpy
+import domain_factory
+import thresholds
+
+
+class ArrayBoxesElement(object):
+    ''' Lower and upper bounds of all variables as two float vectors
+    indexed by the variable ids of the factory. Both are None for the
+    bottom element. The vectors are never modified once the element
+    has been created, so elements can share them. They may be shorter
+    than the number of variables of the factory; equality and hash
+    values are those of the padded vectors (see
+    ArrayBoxDomainFactory._bounds). '''
+
+    def __init__(self, lower, upper, factory):
+        self.lower = lower
+        self.upper = upper
+        self.factory = factory
+
+    def __hash__(self):
+        if self.lower is None:
+            return 0
+        return hash(self.factory._key(self))
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self is other or self.factory.is_eq(self, other)
+        else:
+            return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+class ArrayBoxDomainFactory(domain_factory.DomainFactory):
+    ''' Same domain as boxes.BoxDomainFactory; the lattice operations
+    are single vectorized expressions over all variables. '''
+
+    threshold_widening = True
+
+    def __init__(self, DEFAULT_MIN_VALUE, DEFAULT_MAX_VALUE):
+        self.variables = {}
+        self.DEFAULT_MIN_VALUE = DEFAULT_MIN_VALUE
+        self.DEFAULT_MAX_VALUE = DEFAULT_MAX_VALUE
+        self.constants = []
+        self._bot = ArrayBoxesElement(None, None, self)
+        # dense variable ids
+        self._index = {}
+        self._names = []
+        self._min_values = []
+        self._max_values = []
+        # default bounds as vectors, None if not computed yet
+        self._defaults = None
+        self._thresholds = numpy.array([], dtype=float)
+
+    # Private methods
+
+    def _default_bounds(self):
+        if self._defaults is None:
+            self._defaults = (numpy.array(self._min_values, dtype=float),
+                              numpy.array(self._max_values, dtype=float))
+        return self._defaults
+
+    def _bounds(self, element):
+        ''' Return the bound vectors of element, extended by the
+        default bounds of variables added after its creation. '''
+        (lower, upper) = (element.lower, element.upper)
+        n = len(self._names)
+        if len(lower) < n:
+            (min_values, max_values) = self._default_bounds()
+            lower = numpy.concatenate((lower, min_values[len(lower):]))
+            upper = numpy.concatenate((upper, max_values[len(upper):]))
+        return (lower, upper)
+
+    def _key(self, element):
+        ''' Return a hashable form of the bounds of element that is
+        the same for all elements equal to it: the padded vectors
+        without the trailing variables at their default bounds, so
+        that it does not change when variables are added. '''
+        (lower, upper) = self._bounds(element)
+        (min_values, max_values) = self._default_bounds()
+        changed = numpy.nonzero((lower != min_values)
+                                | (upper != max_values))[0]
+        n = changed[-1] + 1 if len(changed) else 0
+        # + 0.0 turns -0.0 into 0.0, which compares equal to it
+        return ((lower[:n] + 0.0).tostring(), (upper[:n] + 0.0).tostring())
+
+    def _make(self, lower, upper):
+        if (lower > upper).any():
+            return self._bot
+        return ArrayBoxesElement(lower, upper, self)
+
+    def _to_value(self, value):
+        value = float(value)
+        if value.is_integer():
+            return int(value)
+        return value
+
+    def _is_literal(self, value):
+        return isinstance(value, numbers.Number)
+
+    def _interval(self, element, value):
+        if self._is_literal(value):
+            return (value, value)
+        i = self._index[value]
+        (lower, upper) = self._bounds(element)
+        return (self._to_value(lower[i]), self._to_value(upper[i]))
+
+    def _with_intervals(self, element, intervals):
+        ''' Return element with the intervals of the given (variable,
+        interval) pairs replaced, bottom if one of them is empty. '''
+        (lower, upper) = self._bounds(element)
+        lower = lower.copy()
+        upper = upper.copy()
+        for (variable, (l, r)) in intervals:
+            if r < l:
+                return self._bot
+            i = self._index[variable]
+            lower[i] = l
+            upper[i] = r
+        return ArrayBoxesElement(lower, upper, self)
+
+    def _op_binary_intervals(self, element, operator, target_var,
+                             interval1, interval2):
+        (l1, r1) = interval1
+        (l2, r2) = interval2
+        if operator == '*':
+            products = (l1*l2, r1*r2, l1*r2, l2*r1)
+            (cl, cr) = (min(products), max(products))
+        elif operator == '+':
+            (cl, cr) = (l1+l2, r1+r2)
+        elif operator == '-':
+            (cl, cr) = (l1-r2, r1-l2)
+        elif operator == '%':
+            if r2-l2 == 0 and r2 == 0:
+                return self._bot
+            elif r2-l2 == 0 and r1-l1 == 0:
+                (cl, cr) = (r1 % r2, r1 % r2)
+            else:
+                max_el = max(abs(l2), abs(r2))-1
+                if l1 >= 0:
+                    (cl, cr) = (0, max_el)
+                else:
+                    (cl, cr) = (-max_el, max_el)
+        else:
+            raise ValueError('Unknown operator: %s' % operator)
+        return self._with_intervals(element, [(target_var, (cl, cr))])
+
+    # Variable handling
+
+    def add_integer_var(self, variable, min_val, max_val):
+        self.variables[variable] = (min_val, max_val)
+        if variable in self._index:
+            i = self._index[variable]
+            self._min_values[i] = min_val
+            self._max_values[i] = max_val
+        else:
+            self._index[variable] = len(self._names)
+            self._names.append(variable)
+            self._min_values.append(min_val)
+            self._max_values.append(max_val)
+        self._defaults = None
+
+    def add_bool_var(self, variable):
+        self.add_integer_var(variable, 0, 1)
+
+    def add_constant(self, constant):
+        thresholds.add_threshold(self.constants, constant)
+        self._thresholds = numpy.array(self.constants, dtype=float)
+
+    # I/O
+
+    def to_string(self, element):
+        if element.lower is None:
+            return '<BOT>'
+        (lower, upper) = self._bounds(element)
+        (min_values, max_values) = self._default_bounds()
+        changed = numpy.nonzero((lower != min_values)
+                                | (upper != max_values))[0]
+        if len(changed) == 0:
+            return '<TOP>'
+        ranges = sorted((self._names[i],
+                         self._to_value(lower[i]),
+                         self._to_value(upper[i])) for i in changed)
+        return '[%s]' % ', '.join('%s in [%s, %s]' % r for r in ranges)
+
+    # Algebraic operations
+
+    def get_top(self):
+        return ArrayBoxesElement(*self._default_bounds(), factory=self)
+
+    def get_bot(self):
+        return self._bot
+
+    def is_subseteq(self, element1, element2):
+        if element1.lower is None:
+            return True
+        if element2.lower is None:
+            return False
+        (l1, r1) = self._bounds(element1)
+        (l2, r2) = self._bounds(element2)
+        return bool(((l2 <= l1) & (r1 <= r2)).all())
+
+    def is_eq(self, element1, element2):
+        if element1.lower is None or element2.lower is None:
+            return element1.lower is None and element2.lower is None
+        (l1, r1) = self._bounds(element1)
+        (l2, r2) = self._bounds(element2)
+        return numpy.array_equal(l1, l2) and numpy.array_equal(r1, r2)
+
+    def union(self, element1, element2):
+        if element1.lower is None:
+            return element2
+        if element2.lower is None:
+            return element1
+        (l1, r1) = self._bounds(element1)
+        (l2, r2) = self._bounds(element2)
+        return ArrayBoxesElement(numpy.minimum(l1, l2),
+                                 numpy.maximum(r1, r2), self)
+
+    def intersect(self, element1, element2):
+        if element1.lower is None or element2.lower is None:
+            return self._bot
+        (l1, r1) = self._bounds(element1)
+        (l2, r2) = self._bounds(element2)
+        return self._make(numpy.maximum(l1, l2), numpy.minimum(r1, r2))
+
+    def widen(self, element1, element2):
+        ''' Unstable bounds are widened to the nearest constant
+        beyond them, or to the default bound of the variable. '''
+        if element1.lower is None or element2.lower is None:
+            return element2
+        (l1, r1) = self._bounds(element1)
+        (l2, r2) = self._bounds(element2)
+        (min_values, max_values) = self._default_bounds()
+        constants = self._thresholds
+        count = len(constants)
+        # greatest constant <= l2 and least constant >= r2, but not
+        # beyond the default bounds
+        below = numpy.searchsorted(constants, l2, side='right') - 1
+        above = numpy.searchsorted(constants, r2, side='left')
+        if count:
+            lower_threshold = numpy.where(
+                below >= 0, constants[numpy.maximum(below, 0)], min_values)
+            upper_threshold = numpy.where(
+                above < count, constants[numpy.minimum(above, count - 1)],
+                max_values)
+        else:
+            (lower_threshold, upper_threshold) = (min_values, max_values)
+        lower_threshold = numpy.maximum(lower_threshold, min_values)
+        upper_threshold = numpy.minimum(upper_threshold, max_values)
+        return ArrayBoxesElement(numpy.where(l1 > l2, lower_threshold, l2),
+                                 numpy.where(r2 > r1, upper_threshold, r2),
+                                 self)
+
+    # Semantics of the abstract machine
+
+    def op_load_constant(self, element, target_var, constant):
+        if element.lower is None:
+            return self._bot
+        return self._with_intervals(element,
+                                    [(target_var, (constant, constant))])
+
+    def op_load_variable(self, element, target_var, source_var):
+        if element.lower is None:
+            return self._bot
+        return self._with_intervals(element,
+                                    [(target_var,
+                                      self._interval(element, source_var))])
+
+    def op_binary(self,
+                  element,
+                  operator,
+                  target_var,
+                  op1,
+                  op2):
+        if element.lower is None:
+            return self._bot
+        return self._op_binary_intervals(element,
+                                         operator,
+                                         target_var,
+                                         self._interval(element, op1),
+                                         self._interval(element, op2))
+
+    def cond_binary(self,
+                    element,
+                    operator,
+                    op1,
+                    op2):
+        if element.lower is None:
+            return self._bot
+        if operator == '>':
+            return self.cond_binary(element, '<', op2, op1)
+        elif operator == '>=':
+            return self.cond_binary(element, '<=', op2, op1)
+        element = ArrayBoxesElement(*self._bounds(element), factory=self)
+        (l1, r1) = self._interval(element, op1)
+        (l2, r2) = self._interval(element, op2)
+        if operator == '==':
+            (new_i1, new_i2) = ((max(l1, l2), min(r1, r2)),) * 2
+        elif operator == '!=':
+            if op1 == op2 or (l1 == r1 == l2 == r2):
+                return self._bot
+            return element
+        elif operator == '<=':
+            new_i1 = (l1, min(r1, r2))
+            new_i2 = (max(l1, l2), r2)
+        elif operator == '<':
+            if op1 == op2:
+                return self._bot
+            new_i1 = (l1, min(r1, r2-1))
+            new_i2 = (max(l1+1, l2), r2)
+        else:
+            raise ValueError('Unknown operator: %s' % operator)
+        if new_i1[1] < new_i1[0] or new_i2[1] < new_i2[0]:
+            return self._bot
+        intervals = []
+        if not self._is_literal(op1):
+            intervals.append((op1, new_i1))
+        if not self._is_literal(op2):
+            intervals.append((op2, new_i2))
+        return self._with_intervals(element, intervals)
+
+    def project_var(self, element, variable):
+        if element.lower is None:
+            return self._bot
+        return self._with_intervals(element,
+                                    [(variable, self.variables[variable])])
+
+    def project_vars(self, element, variables):
+        if element.lower is None:
+            return self._bot
+        (lower, upper) = self._bounds(element)
+        (min_values, max_values) = self._default_bounds()
+        ids = [self._index[v] for v in variables]
+        lower = lower.copy()
+        upper = upper.copy()
+        lower[ids] = min_values[ids]
+        upper[ids] = max_values[ids]
+        return ArrayBoxesElement(lower, upper, self)
@@ -9,50 +9,160 @@
 
 import domain_factory
 import numbers
+import weakref
+import persistent_map
+import thresholds
+
+class _VariableIds(object):
+    ''' Dense ids of the variables used in the boxes of one factory,
+    the keys of the ranges maps. '''
+
+    def __init__(self):
+        self.ids = {}
+        self.variables = []
+
+    def get(self, variable):
+        ''' The id of variable, None if it has none yet. '''
+        return self.ids.get(variable)
+
+    def id(self, variable):
+        ''' The id of variable, created if it has none yet. '''
+        try:
+            return self.ids[variable]
+        except KeyError:
+            self.ids[variable] = len(self.variables)
+            self.variables.append(variable)
+            return self.ids[variable]
+
+def _item_hash(key, interval):
+    return hash((key, interval))
+
+def _interned(operation):
+    ''' Pass the result of operation through BoxDomainFactory.intern. '''
+    def interned_operation(self, *args):
+        return self.intern(operation(self, *args))
+    interned_operation.__name__ = operation.__name__
+    interned_operation.__doc__ = operation.__doc__
+    return interned_operation
 
 class BoxesElement:
 
-    def __init__(self, init_ranges):
+    def __init__(self, init_ranges, variable_ids):
+        ''' init_ranges is None (bottom), a persistent_map.PersistentMap from
+        variable ids to intervals or a dict from variables to
+        intervals. variable_ids are the ids of the factory of the
+        element. '''
+        self._variable_ids = variable_ids
+        if isinstance(init_ranges, dict):
+            ranges = persistent_map.PersistentMap()
+            for (variable, interval) in init_ranges.iteritems():
+                ranges = ranges.set(variable_ids.id(variable), interval)
+            init_ranges = ranges
+        # persistent map: updates replace it by a new map sharing
+        # all untouched parts with the old one
         self.ranges = init_ranges
+        # XOR of the hashes of all (key, interval) items, maintained
+        # by the updates once known; None if not computed yet
+        self._hash = 0 if init_ranges is None else None
 
-    def __hash__(self):
-        p = 997
-        a = 123
-        if self.ranges is None:
-            return 0
-        result = 0
-        for v in sorted(self.ranges.keys()):
-            result = (result + self.ranges[v][0]*a) % p
-            result = (result + self.ranges[v][1]*a) % p
+    def with_ranges(self, ranges):
+        ''' Return an element with the given ranges, which should
+        share most of their nodes with self.ranges: if the hash of self
+        is known, the hash of the result is updated along the
+        differences. '''
+        result = BoxesElement(ranges, self._variable_ids)
+        if self._hash is not None and ranges is not None:
+            h = self._hash
+            for (key, interval1, interval2) in self.ranges.differences(ranges):
+                if interval1 is not None:
+                    h ^= _item_hash(key, interval1)
+                if interval2 is not None:
+                    h ^= _item_hash(key, interval2)
+            result._hash = h
         return result
 
+    def get_range(self, variable):
+        ''' Return the range of variable, None if it is unrestricted. '''
+        key = self._variable_ids.get(variable)
+        if key is None:
+            return None
+        return self.ranges.get(key)
+
+    def set_range(self, variable, interval):
+        ''' Set the range of variable in O(log n). '''
+        key = self._variable_ids.id(variable)
+        if self._hash is not None:
+            old = self.ranges.get(key)
+            if old is not None:
+                self._hash ^= _item_hash(key, old)
+            self._hash ^= _item_hash(key, interval)
+        self.ranges = self.ranges.set(key, interval)
+
+    def remove_range(self, variable):
+        ''' Remove the range of variable in O(log n). '''
+        key = self._variable_ids.get(variable)
+        if key is not None:
+            if self._hash is not None:
+                old = self.ranges.get(key)
+                if old is not None:
+                    self._hash ^= _item_hash(key, old)
+            self.ranges = self.ranges.remove(key)
+
+    def range_items(self):
+        ''' Iterate the (variable, interval) pairs. '''
+        for (key, interval) in self.ranges.items():
+            yield (self._variable_ids.variables[key], interval)
+
+    def __hash__(self):
+        if self._hash is None:
+            result = 0
+            for (key, interval) in self.ranges.items():
+                result ^= _item_hash(key, interval)
+            self._hash = result
+        return self._hash
+
     def __eq__(self, other):
         if isinstance(other, self.__class__):
+            if self is other:
+                return True
+            # the ids of different factories are not comparable
+            if self._variable_ids is not other._variable_ids:
+                return False
+            if (self._hash is not None and other._hash is not None
+                and self._hash != other._hash):
+                return False
             if self.ranges is None and other.ranges is None:
                 return True
             elif self.ranges is None or other.ranges is None:
                 return False
-            else:
-                if len(self.ranges) != len(other.ranges):
+            for (key, interval1, interval2) in \
+                    self.ranges.differences(other.ranges):
+                if interval1 != interval2:
                     return False
-                else:
-                    for v in self.ranges:
-                        if v not in other.ranges:
-                            return False
-                        if other.ranges[v] != self.ranges[v]:
-                            return False
             return True
         else:
             return False
 
+class _Empty(Exception):
+    pass
+
 class BoxDomainFactory(domain_factory.DomainFactory):
 
-    def __init__(self, DEFAULT_MIN_VALUE, DEFAULT_MAX_VALUE):
+    threshold_widening = True
+
+    def __init__(self, DEFAULT_MIN_VALUE, DEFAULT_MAX_VALUE, intern=False):
+        ''' If intern is True, the results of the transfer functions
+        are hash-consed: equal boxes are represented by one shared
+        element as long as it is in use. '''
         self.variables = {}
         self.DEFAULT_MIN_VALUE = DEFAULT_MIN_VALUE
         self.DEFAULT_MAX_VALUE = DEFAULT_MAX_VALUE
         self.constants = []
-        self._bot = BoxesElement(None)
+        self._variable_ids = _VariableIds()
+        self._bot = BoxesElement(None, self._variable_ids)
+        # copies of the interned elements (see intern) to the elements
+        self._intern_table = (weakref.WeakValueDictionary() if intern
+                              else None)
     # Private methods
         
     def _union(self, tuple1, tuple2):
@@ -63,48 +173,56 @@ class BoxDomainFactory(domain_factory.DomainFactory):
     def _intersect(self, tuple1, tuple2):
         (l1, r1) = tuple1
         (l2, r2) = tuple2
-        if r1 < l1 or r2 < l2:
+        (l, r) = (max(l1, l2), min(r1, r2))
+        if r < l:
             return None
-        return (max(l1, l2), min(r1, r2))
+        return (l, r)
         
     def _interval(self, element, variable):
         if element.ranges is None:
             return None
-        if variable in element.ranges:
-            return element.ranges[variable]
-        else:
+        interval = element.get_range(variable)
+        if interval is None:
             return self.variables[variable]
+        return interval
+
+    def _set_range(self, element, variable, interval):
+        ''' Set the range of variable in element, removing it if it is
+        the full range of variable. '''
+        if interval == self.variables[variable]:
+            element.remove_range(variable)
+        else:
+            element.set_range(variable, interval)
 
     def _normalize(self, element):
+        ''' Elements never store full ranges (see _set_range), so only
+        the bottom element needs to be replaced. '''
         if element.ranges is None:
             return self._bot
-        result = self._copy(element)
-        for variable in element.ranges:
-            if element.ranges[variable] == self.variables[variable]:
-                del result.ranges[variable]
-        return result
+        return element
 
     def _copy(self, element):
+        ''' Return a copy of element. The ranges are persistent, so
+        they are shared with element. '''
         if element.ranges is None:
             return self._bot
-        result = BoxesElement({})
-        for variable in element.ranges:
-            result.ranges[variable] = element.ranges[variable]
+        result = BoxesElement(element.ranges, self._variable_ids)
+        result._hash = element._hash
         return result
 
+    def _key_range(self, key, interval):
+        ''' interval, or None if it is the full range of the variable
+        with the given id. '''
+        if interval == self.variables[self._variable_ids.variables[key]]:
+            return None
+        return interval
+
     def _is_literal(self, value):
         return isinstance(value, numbers.Number) 
 
-    def _op_binary_intervals(self,
-                            element,
-                            operator,
-                            target_var,
-                            interval1,
-                            interval2):
-        if element.ranges is None:
-            return self._bot
-        result = self._copy(element)
-        # todo: what if result not in range?
+    def _binary_interval(self, operator, interval1, interval2):
+        ''' Interval of "i1 (+) i2", None if it is empty (division
+        by zero), (None, None) if unknown. '''
         (l1, r1) = interval1
         (l2, r2) = interval2
         cl = None
@@ -121,7 +239,7 @@ class BoxDomainFactory(domain_factory.DomainFactory):
             # i2 contains 1 integer
             if r2-l2 == 0 and r2 == 0:
                 print "Division by zero!"
-                return self._bot
+                return None
             elif r2-l2 == 0 and r1-l1 == 0:
                 (cl, cr) = (r1 % r2, r1 % r2)
             else:
@@ -134,10 +252,26 @@ class BoxDomainFactory(domain_factory.DomainFactory):
                 print "Possible Division by zero!"
         else:
             print 'Wrong operator!'
+        return (cl, cr)
+
+    def _op_binary_intervals(self,
+                            element,
+                            operator,
+                            target_var,
+                            interval1,
+                            interval2):
+        if element.ranges is None:
+            return self._bot
+        result = self._copy(element)
+        # todo: what if result not in range?
+        interval = self._binary_interval(operator, interval1, interval2)
+        if interval is None:
+            return self._bot
+        (cl, cr) = interval
         if cl is not None or cr is not None:
-            result.ranges[target_var] = (cl, cr)
+            self._set_range(result, target_var, (cl, cr))
         else:
-            result.ranges[target_var] = self.variables[target_var]
+            result.remove_range(target_var)
         return self._normalize(result)
         
     # Variable handling
@@ -156,12 +290,8 @@ class BoxDomainFactory(domain_factory.DomainFactory):
         elif len(element.ranges) == 0:
             return '<TOP>'
         result = '['
-        keys_sorted = sorted(element.ranges.keys())
-        for variable in keys_sorted:
-            result += ('%s in [%s, %s], '
-                       % (variable,
-                          element.ranges[variable][0],
-                          element.ranges[variable][1]))
+        for (variable, (l, r)) in sorted(element.range_items()):
+            result += ('%s in [%s, %s], ' % (variable, l, r))
         if result.endswith(', '):
             result = result[:-2]
         result += ']'
@@ -169,123 +299,145 @@ class BoxDomainFactory(domain_factory.DomainFactory):
 
     # Algebraic operations
     
+    @_interned
     def get_top(self):
-        return BoxesElement({})
+        return BoxesElement(persistent_map.PersistentMap(),
+                            self._variable_ids)
 
     def get_bot(self):
         return self._bot
 
     def add_constant(self, constant):
-        self.constants.append(constant)
-        self.constants = sorted(self.constants)
+        thresholds.add_threshold(self.constants, constant)
+
+    def intern(self, element):
+        ''' Return the canonical representative of element if
+        interning is enabled, element itself otherwise. '''
+        if self._intern_table is None:
+            return element
+        if element.ranges is None:
+            return self._bot
+        result = self._intern_table.get(element)
+        if result is None:
+            # the key is a copy, so that the entry does not keep
+            # element alive
+            result = element
+            self._intern_table[self._copy(element)] = element
+        return result
     
     def is_subseteq(self, element1, element2):
+        if element1 is element2:
+            return True
         if element1.ranges is None:
             return True
         if element2.ranges is None:
             return False
-        for variable in element2.ranges:
-            (l2, r2) = element2.ranges[variable]
-            if variable in element1.ranges:
-                (l1, r1) = element1.ranges[variable]
-                if not (l2 <= l1 and r2 >= r1):
-                    return False
+        # only the ranges that are not shared by both elements
+        for (key, interval1, interval2) in \
+                element1.ranges.differences(element2.ranges):
+            if interval2 is None:
+                continue
+            if interval1 is None:
+                interval1 = self.variables[self._variable_ids.variables[key]]
+            (l1, r1) = interval1
+            (l2, r2) = interval2
+            if not (l2 <= l1 and r2 >= r1):
+                return False
         return True
 
     def is_eq(self, element1, element2):
         return (self.is_subseteq(element1, element2)
                 and self.is_subseteq(element2, element1))
 
+    @_interned
     def union(self, element1, element2):
-        result = BoxesElement({})
         if element1.ranges is None:
             return self._copy(element2)
         elif element2.ranges is None:
             return self._copy(element1)
-        for variable in element1.ranges:
-            if variable in element2.ranges:
-                result.ranges[variable] \
-                    = self._union(self._interval(element1, variable),
-                                  self._interval(element2, variable))
-        # if a variable is set in element2, it'll be
-        # full range anyway in element2
-        return self._normalize(result)
+        # a variable set in one element only has full range
+        # in the other one
+        return element1.with_ranges(element1.ranges.merge(
+            element2.ranges,
+            lambda key, i1, i2: self._key_range(key, self._union(i1, i2)),
+            persistent_map.DROP, persistent_map.DROP))
 
+    @_interned
     def intersect(self, element1, element2):
         if element1.ranges is None:
             return self._bot
         elif element2.ranges is None:
             return self._bot
-        result = BoxesElement({})
-        for variable in element1.ranges:
-            result.ranges[variable] = element1.ranges[variable]
-        for variable in element2.ranges:
-            result.ranges[variable] \
-                = self._intersect(self._interval(result, variable),
-                                  self._interval(element2, variable))
-            if result.ranges[variable] is None:
-                return self._bot
-        return result
+        def intersect(key, interval1, interval2):
+            interval = self._intersect(interval1, interval2)
+            if interval is None:
+                raise _Empty()
+            return interval
+        try:
+            return element1.with_ranges(
+                element1.ranges.merge(element2.ranges, intersect))
+        except _Empty:
+            return self._bot
+
+    def _widen_interval(self, variable, interval1, interval2):
+        ''' Widen unstable bounds to the nearest constant beyond
+        them, or to the bounds of the variable. '''
+        (l1, r1) = interval1
+        (l2, r2) = interval2
+        l = l2
+        r = r2
+        v_min, v_max = self.variables[variable]
+        if (l1 > l2):
+            l = thresholds.threshold_below(self.constants, l2)
+            if l is None or l < v_min:
+                l = v_min
+        if (r2 > r1):
+            r = thresholds.threshold_above(self.constants, r2)
+            if r is None or r > v_max:
+                r = v_max
+        return (l, r)
 
+    @_interned
     def widen(self, element1, element2):
-        result = self._copy(element2)
         if element1.ranges is None or element2.ranges is None:
             return self._copy(element2)
-        for variable in element1.ranges:
-            (l1, r1) = self._interval(element1, variable)
-            (l2, r2) = self._interval(element2, variable)
-            l = l2
-            r = r2
-            v_min, v_max = self.variables[variable]
-            
-            if (l1 > l2):
-                matching_constant = None
-                for constant in self.constants:
-                    if constant <= l2:
-                        if (matching_constant is None or
-                            matching_constant < constant):
-                            matching_constant = constant
-                    # TODO: int ranges
-                if matching_constant:
-                    l = matching_constant
-                else: 
-                    l = v_min
-            if (r2 > r1):
-                matching_constant = None
-                for constant in self.constants:
-                    if constant >= r2:
-                        if (matching_constant is None or
-                            matching_constant > constant):
-                            matching_constant = constant
-                    # TODO: ranges
-                if matching_constant:
-                    r = matching_constant
-                else: 
-                    r = v_max
-            result.ranges[variable] = (l, r)
-        return self._normalize(result)
+        # variables set in element1 only have full range in element2,
+        # which stays the full range when widened
+        variables = self._variable_ids.variables
+        def widen(key, interval1, interval2):
+            return self._key_range(key,
+                                   self._widen_interval(variables[key],
+                                                        interval1,
+                                                        interval2))
+        return element1.with_ranges(
+            element1.ranges.merge(element2.ranges, widen,
+                                  persistent_map.DROP, persistent_map.KEEP))
 
     # Semantics of the abstract machine
     
+    @_interned
     def op_load_constant(self, element, target_var, constant):
         if element.ranges is None:
             return self._bot
         result = self._copy(element)
         # TODO: what if constant not in range(variable)?
-        result.ranges[target_var] = (constant, constant)
+        self._set_range(result, target_var, (constant, constant))
         return self._normalize(result)
 
+    @_interned
     def op_load_variable(self, element, target_var, source_var):
         if element.ranges is None:
             return self._bot
         result = self._copy(element)
         # TODO: what if constant not in range(variable)?
-        if source_var in result.ranges:
-            result.ranges[target_var] = element.ranges[source_var]
+        interval = element.get_range(source_var)
+        if interval is not None:
+            self._set_range(result, target_var, interval)
         else:
-            del result.ranges[target_var] # no info for source_var
+            result.remove_range(target_var) # no info for source_var
         return self._normalize(result)
     
+    @_interned
     def op_binary(self,
                   element,
                   operator,
@@ -308,6 +460,7 @@ class BoxDomainFactory(domain_factory.DomainFactory):
                                          i1,
                                          i2)
     
+    @_interned
     def cond_binary(self,
                     element,
                     operator,
@@ -344,7 +497,7 @@ class BoxDomainFactory(domain_factory.DomainFactory):
             if op1 == op2:
                 return self._bot
             if (l1 - r1) == 0 and (l2-r2) == 0 and (l1 == l2):
-                return None
+                return self._bot
         new_i1 = None
         new_i2 = None
         if operator == '<=':
@@ -362,16 +515,120 @@ class BoxDomainFactory(domain_factory.DomainFactory):
         else:
             print 'Unknown operator: %s ' % operator
         if new_i1 and left_var:
-            result.ranges[left_var] = new_i1
+            self._set_range(result, left_var, new_i1)
         if new_i2 and right_var:
-            result.ranges[right_var] = new_i2
+            self._set_range(result, right_var, new_i2)
         return self._normalize(result)
 
+    @_interned
     def project_var(self, element, variable):
         result = self._copy(element)
         if result.ranges is None:
             return self._bot
-        if variable in result.ranges:
-            del result.ranges[variable]
+        result.remove_range(variable)
         return result
+
+    def compile_block(self, operations):
+        return CompiledBlock(self, operations)
+
+
+class CompiledBlock(object):
+    ''' The operations of a block fused into one transfer function.
+    All variables of the block get a scratch register; a call loads the
+    registers from the element, runs the operations on the registers
+    and writes the assigned variables back into a single new element.
+    Registers hold intervals, None for the full range. The variables
+    of the block must have been added to the factory before. '''
+
+    LOAD_CONSTANT = 0
+    LOAD_VARIABLE = 1
+    BINARY = 2
+
+    def __init__(self, factory, operations):
+        self._factory = factory
+        self._registers = {}
+        # ids of the variables in the registers
+        self._keys = []
+        # full ranges of the variables in the registers
+        self._full = []
+        self._steps = []
+        assigned = []
+        for operation in operations:
+            name = operation[0]
+            if name == 'op_load_constant':
+                (target, constant) = operation[1:]
+                target = self._register(target)
+                interval = (constant, constant)
+                if interval == self._full[target]:
+                    interval = None
+                self._steps.append((self.LOAD_CONSTANT, target, interval))
+            elif name == 'op_load_variable':
+                (target, source) = operation[1:]
+                source = self._register(source)
+                target = self._register(target)
+                self._steps.append((self.LOAD_VARIABLE, target, source))
+            elif name == 'op_binary':
+                (operator, target, op1, op2) = operation[1:]
+                op1 = self._operand(op1)
+                op2 = self._operand(op2)
+                target = self._register(target)
+                self._steps.append((self.BINARY, target, operator,
+                                    op1, op2))
+            else:
+                print 'Unknown operation: %s' % name
+                continue
+            if target not in assigned:
+                assigned.append(target)
+        self._assigned = [(register, self._keys[register])
+                          for register in assigned]
+
+    def _register(self, variable):
+        try:
+            return self._registers[variable]
+        except KeyError:
+            self._registers[variable] = len(self._keys)
+            self._keys.append(self._factory._variable_ids.id(variable))
+            self._full.append(self._factory.variables[variable])
+            return self._registers[variable]
+
+    def _operand(self, value):
+        ''' (register, interval if the register is None): None and the
+        interval for literals, the register and the full range for
+        variables. '''
+        if self._factory._is_literal(value):
+            return (None, (value, value))
+        register = self._register(value)
+        return (register, self._full[register])
+
+    def __call__(self, element):
+        ranges = element.ranges
+        if ranges is None:
+            return self._factory.get_bot()
+        registers = [ranges.get(key) for key in self._keys]
+        full = self._full
+        for step in self._steps:
+            kind = step[0]
+            target = step[1]
+            if kind == self.LOAD_CONSTANT:
+                registers[target] = step[2]
+                continue
+            if kind == self.LOAD_VARIABLE:
+                interval = registers[step[2]]
+            else:
+                (operator, (r1, i1), (r2, i2)) = step[2:]
+                if r1 is not None and registers[r1] is not None:
+                    i1 = registers[r1]
+                if r2 is not None and registers[r2] is not None:
+                    i2 = registers[r2]
+                interval = self._factory._binary_interval(operator, i1, i2)
+                if interval is None:
+                    return self._factory.get_bot()
+                if interval == (None, None):
+                    interval = None
+            if interval == full[target]:
+                interval = None
+            registers[target] = interval
+        return self._factory.intern(element.with_ranges(ranges.update(
+            [(key, registers[register])
+             for (register, key) in self._assigned])))
     
@@ -0,0 +1,49 @@
+###########################################
+#
+# computed_table.py
+#
+# Bounded cache of operation results
+# for decision diagrams
+#
+# (C) 2016, Andreas Gaiser
+###########################################
+
+
+class ComputedTable(object):
+    ''' Direct-mapped cache: every key has exactly one slot, given by
+    its hash, and storing a result evicts the entry in its slot. The
+    table never holds more than size entries. Results must not be
+    None. '''
+
+    def __init__(self, size=1 << 16):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.clear()
+
+    def clear(self):
+        ''' Remove all entries (the counters are kept). '''
+        self._keys = [None] * self.size
+        self._values = [None] * self.size
+
+    def get(self, key):
+        ''' Return the result stored for key, None if there is none. '''
+        if self.size:
+            slot = hash(key) % self.size
+            if self._keys[slot] == key:
+                self.hits += 1
+                return self._values[slot]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if self.size:
+            slot = hash(key) % self.size
+            self._keys[slot] = key
+            self._values[slot] = value
+
+    def statistics(self):
+        ''' Return (hits, misses, hit ratio). '''
+        lookups = self.hits + self.misses
+        return (self.hits, self.misses,
+                float(self.hits) / lookups if lookups else 0.0)
@@ -15,49 +15,75 @@ from weighted_graph import WeightedGraph
 class DBM(WeightedGraph):
 
     def __init__(self):
+        # rows and columns: outgoings[source][target] and
+        # incomings[target][source] are the weight of the edge
         self.outgoings = {}
         self.incomings = {}
+        # True if the DBM is known to be closed (shortest path form)
+        self.closed = True
+        # cached closed form and emptiness, None if not computed yet
+        self._closure = None
+        self._empty = False
+        # cached canonical key, False if not computed yet
+        self._key = False
+        # copy-on-write: True if the dicts are shared with other DBMs,
+        # and the nodes whose rows and columns are not shared
+        self._shared = False
+        self._owned_outgoings = set()
+        self._owned_incomings = set()
+
+    def _own(self, source, target):
+        ''' Unshare the storage modified by setting the weight
+        between source and target. '''
+        if self._shared:
+            self.outgoings = dict(self.outgoings)
+            self.incomings = dict(self.incomings)
+            self._shared = False
+        if (source in self.outgoings
+            and source not in self._owned_outgoings):
+            self.outgoings[source] = dict(self.outgoings[source])
+            self._owned_outgoings.add(source)
+        if (target in self.incomings
+            and target not in self._owned_incomings):
+            self.incomings[target] = dict(self.incomings[target])
+            self._owned_incomings.add(target)
 
     def copy(self):
-        ''' Return a copy of the DBM. '''
+        ''' Return a copy of the DBM. The copy shares its storage with
+        self until one of them is modified. '''
         result = DBM()
-        result.outgoings = {}
-        for node in self.outgoings:
-            result.outgoings[node] = set(self.outgoings[node])
-        result.incomings = {}
-        for node in self.incomings:
-            result.incomings[node] = set(self.incomings[node])
+        result.outgoings = self.outgoings
+        result.incomings = self.incomings
+        result._shared = True
+        self._shared = True
+        self._owned_outgoings = set()
+        self._owned_incomings = set()
+        result.closed = self.closed
+        result._closure = self._closure
+        result._empty = self._empty
+        result._key = self._key
         return result
 
     def set_weight(self, source, weight, target):
         ''' Set the weight between source and target to weight. Can also
         be None (= infinite weight). '''
-        if source not in self.outgoings:
-            self.outgoings[source] = set()
-            self.incomings[source] = set()
-        if target not in self.outgoings:
-            self.outgoings[target] = set()
-            self.incomings[target] = set()
-        found = False
-        for (existing_weight, existing_target) in self.outgoings[source]:
-            if existing_target == target:
-                self.outgoings[source].remove((existing_weight, existing_target))
-                if weight is not None:
-                    self.outgoings[source].add((weight, target))
-                found = True
-                break
-        if not found and weight is not None:
-            self.outgoings[source].add((weight, target))
-        found = False
-        for (existing_source, existing_weight) in self.incomings[target]:
-            if existing_source == source:
-                self.incomings[target].remove((existing_source, existing_weight))
-                if weight is not None:
-                    self.incomings[target].add((source, weight))
-                found = True
-                break
-        if not found and weight is not None:
-            self.incomings[target].add((source, weight))
+        self.closed = False
+        self._closure = None
+        self._empty = None
+        self._key = False
+        self._own(source, target)
+        for node in (source, target):
+            if node not in self.outgoings:
+                self.outgoings[node] = {}
+                self.incomings[node] = {}
+                self._owned_outgoings.add(node)
+                self._owned_incomings.add(node)
+        if weight is None:
+            self.outgoings[source].pop(target, None)
+            self.incomings[target].pop(source, None)
+        else:
+            self.outgoings[source][target] = weight
+            self.incomings[target][source] = weight
     
     def all_nodes(self):
         ''' Get a copy of the list of all occuring nodes. '''
@@ -65,25 +91,25 @@ class DBM(WeightedGraph):
 
     def incomings(self, node):
         ''' Get all incoming edges from node. '''
-        return self.incomings[node]
+        return set(self.incomings[node].iteritems())
     
     def outgoings(self, node):
         ''' Get all outgoing edges from node. '''
-        return self.outgoings[node]
+        return set((weight, target) for (target, weight)
+                   in self.outgoings[node].iteritems())
 
     def get_weight(self, source, target):
         ''' Get the weight of the edge between source and target,
         None for infinite weight. '''
-        if source not in self.outgoings or target not in self.outgoings:
+        if source not in self.outgoings:
             return None
-        for (weight, existing_target) in self.outgoings[source]:
-            if existing_target == target:
-                return weight
-        return None
+        return self.outgoings[source].get(target)
     
     def exists_negative_cycle(self):
         ''' Return true if a negative cycle exists in the DBM. '''
         # add an artificial node None
+        (closed, closure, empty, key) = (self.closed, self._closure,
+                                         self._empty, self._key)
         distance = {}
         predecessor = {}
         # Apply Bellman-Ford algorithm
@@ -100,7 +126,7 @@ class DBM(WeightedGraph):
         while(i > 0):
             # iterate all edges
             for source in self.outgoings:
-                for (weight, target) in self.outgoings[source]:
+                for (target, weight) in self.outgoings[source].iteritems():
                     if weight is None:
                         continue # to be sure...
                     source_distance = distance[source]
@@ -115,7 +141,7 @@ class DBM(WeightedGraph):
         # check for cycles
         negative_cycle = False
         for source in self.outgoings:
-            for (weight, target) in self.outgoings[source]:
+            for (target, weight) in self.outgoings[source].iteritems():
                 source_distance = distance[source]
                 target_distance = distance[target]
                 if source_distance is None:
@@ -127,12 +153,16 @@ class DBM(WeightedGraph):
         for node in self.outgoings:
             if node is not None:
                 self.set_weight(None, None, node)
+        (self.closed, self._closure, self._empty, self._key) = (closed,
+                                                                closure,
+                                                                empty,
+                                                                key)
         return negative_cycle
                 
-    def find_shortest_paths(self):
-        ''' Return a DBM with shortest path weights as entries. '''
+    def _floyd_warshall(self):
+        ''' Return a copy of the DBM with shortest path weights as
+        entries; diagonal entries are the shortest cycle weights. '''
         sp = self.copy()
-        i = 1
 
         def add_weights(w1, w2):
             if w1 is None or w2 is None:
@@ -157,11 +187,101 @@ class DBM(WeightedGraph):
                     sp.set_weight(source,
                                   distance,
                                   target)
+        return sp
+
+    def find_shortest_paths(self):
+        ''' Return a DBM with shortest path weights as entries. '''
+        sp = self._floyd_warshall()
         # adjust diagonals
         for node in self.outgoings:
             sp.set_weight(node, 0, node)
-        return sp           
-        
+        sp.closed = True
+        sp._empty = False
+        return sp
+
+    def closure(self):
+        ''' Return the closed form of the DBM, None if the DBM is
+        empty. Emptiness is read off the diagonal of the same
+        Floyd-Warshall pass; both results are cached until the next
+        set_weight. '''
+        if self.closed:
+            return self
+        if self._empty is None:
+            sp = self._floyd_warshall()
+            self._empty = False
+            for node in sp.outgoings:
+                weight = sp.get_weight(node, node)
+                if weight is not None and weight < 0:
+                    self._empty = True
+                    break
+            if not self._empty:
+                for node in sp.outgoings:
+                    sp.set_weight(node, 0, node)
+                sp.closed = True
+                sp._empty = False
+                self._closure = sp
+        if self._empty:
+            return None
+        return self._closure
+
+    def tighten(self, source, weight, target):
+        ''' Add the constraint source - target <= weight to a closed
+        DBM and restore closure incrementally in O(n^2) (weights are
+        looked up and set in constant time). Returns False iff the
+        DBM becomes inconsistent (negative cycle). '''
+        for node in (source, target):
+            if self.get_weight(node, node) is None:
+                self.set_weight(node, 0, node)
+        back = self.get_weight(target, source)
+        if back is not None and back + weight < 0:
+            return False
+        current = self.get_weight(source, target)
+        if current is None or weight < current:
+            to_source = self.incomings[source].items()
+            from_target = self.outgoings[target].items()
+            for (i, w1) in to_source:
+                for (j, w2) in from_target:
+                    distance = w1 + weight + w2
+                    existing = self.get_weight(i, j)
+                    if existing is None or distance < existing:
+                        self.set_weight(i, distance, j)
+        self.closed = True
+        self._closure = None
+        self._empty = False
+        self._key = False
+        return True
+
+    def remove_nodes(self, nodes):
+        ''' Remove nodes together with all their incoming and outgoing
+        edges, i.e. drop their rows and columns. Only the edge sets of
+        their neighbours are touched; a closed DBM stays closed. '''
+        nodes = set(node for node in nodes if node in self.outgoings)
+        if not nodes:
+            return
+        # the rows of the removed nodes are deleted even if no edge
+        # set is touched: never delete from dicts shared with a copy
+        if self._shared:
+            self.outgoings = dict(self.outgoings)
+            self.incomings = dict(self.incomings)
+            self._shared = False
+        for node in nodes:
+            for target in self.outgoings[node]:
+                if target not in nodes:
+                    self._own(node, target)
+                    del self.incomings[target][node]
+            for source in self.incomings[node]:
+                if source not in nodes:
+                    self._own(source, node)
+                    del self.outgoings[source][node]
+        for node in nodes:
+            del self.outgoings[node]
+            del self.incomings[node]
+            self._owned_outgoings.discard(node)
+            self._owned_incomings.discard(node)
+        self._closure = None
+        self._empty = False if self.closed else None
+        self._key = False
+
     def to_string(self):
         ''' Get a textual representation of the DBM graph. '''
         result = ''
@@ -169,28 +289,40 @@ class DBM(WeightedGraph):
             if node is None:
                 continue # private node
             result += 'node: %s\n' % node
-            for (weight, target) in self.outgoings[node]:
+            for (target, weight) in self.outgoings[node].iteritems():
                 result += '%s -(%s)-> %s\n' % (node, weight, target)
-            for (source, weight) in self.incomings[node]:
+            for (source, weight) in self.incomings[node].iteritems():
                 result += '%s <=(%s)= %s\n' % (node, weight, source)
         return result
     
+    def key(self):
+        ''' Return a canonical, hashable representation of the DBM
+        state: the finite off-diagonal entries of its closed form as
+        (source, weight, target) triples, None if the DBM is empty.
+        The key is cached until the next set_weight. '''
+        if self._key is False:
+            closed = self.closure()
+            if closed is None:
+                self._key = None
+            else:
+                self._key = frozenset(
+                    (source, weight, target)
+                    for source in closed.outgoings
+                    for (target, weight)
+                    in closed.outgoings[source].iteritems()
+                    if source != target)
+        return self._key
+
     def __hash__(self):
         ''' Return a hash value for DBM. '''
-        p = 997
-        a = 123
-        hash = 0
-        for source in self.outgoings:
-            hash = (hash + a) % p
-            for (weight, target) in self.outgoings[source]:
-                if weight:
-                    hash = (hash + weight*a) %  p
-                    # hash = (hash + hash(target)*a) % p
-        return hash
+        return hash(self.key())
 
     def __eq__(self, other):
-        ''' Return True iff other is self. '''
+        ''' Return True iff other represents the same zone. '''
         if isinstance(other, self.__class__):
-            return self.outgoings == other.outgoings
+            return self is other or self.key() == other.key()
         else:
             return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
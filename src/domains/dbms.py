@@ -8,12 +8,43 @@
 ###########################################
 
 import numbers
+import weakref
 import domain_factory
+import thresholds
 import dbm
 
+
+def _interned(operation):
+    ''' Pass the result of operation through DBMFactory.intern. '''
+    def interned_operation(self, *args):
+        return self.intern(operation(self, *args))
+    interned_operation.__name__ = operation.__name__
+    interned_operation.__doc__ = operation.__doc__
+    return interned_operation
+
+
 class DBMFactory(domain_factory.DomainFactory):
 
-    def __init__(self, DEFAULT_MAX_VALUE, DEFAULT_MIN_VALUE):
+    threshold_widening = True
+
+    def __init__(self, DEFAULT_MAX_VALUE, DEFAULT_MIN_VALUE,
+                 dbm_class=dbm.DBM, intern=False,
+                 closure_strategy=None):
+        ''' dbm_class is the DBM representation used for the
+        elements, e.g. dbm.DBM or dense_dbm.DenseDBM. If intern is
+        True, the results of the transfer functions are hash-consed:
+        equal zones are represented by one shared closed DBM as long
+        as it is in use. closure_strategy replaces the function used to close the
+        matrices of matrix-based DBMs, e.g.
+        dense_dbm.BlockedClosure(tile_size) for very large DBMs; it
+        is ignored for DBM classes without a closure_strategy. '''
+        self._dbm_class = dbm_class
+        self._closure_strategy = None
+        if hasattr(dbm_class, 'closure_strategy'):
+            self._closure_strategy = closure_strategy
+        # canonical keys (see dbm.DBM.key) to the interned DBMs
+        self._intern_table = (weakref.WeakValueDictionary() if intern
+                              else None)
         self.variables = {}
         self.DEFAULT_MAX_VALUE = DEFAULT_MAX_VALUE
         self.DEFAULT_MIN_VALUE = DEFAULT_MIN_VALUE
@@ -43,12 +74,19 @@ class DBMFactory(domain_factory.DomainFactory):
             left = -left
         return (left, right)
             
+    def _new_dbm(self):
+        result = self._dbm_class()
+        if self._closure_strategy is not None:
+            result.closure_strategy = self._closure_strategy
+        return result
+
     def _normalize(self, element):
+        ''' Return the closed form of element, None if it is empty.
+        Closed elements are returned as they are; the closed form of
+        other elements is cached by the element itself. '''
         if element is None:
             return None
-        if element.exists_negative_cycle():
-            return None
-        return element.find_shortest_paths()
+        return element.closure()
  
     def _copy(self, element):
         if element is None:
@@ -61,36 +99,51 @@ class DBMFactory(domain_factory.DomainFactory):
         (l, r) = element
         return (l <= scalar and r >= scalar)
 
+    def _threshold(self, source, weight, target):
+        ''' Widened weight of the unstable constraint source - target
+        <= weight: the nearest constant beyond the bound for variable
+        bounds, None (no constraint) otherwise. '''
+        if target == 0 and source != 0:
+            # source <= weight
+            bound = thresholds.threshold_above(self.constants, weight)
+            if bound is not None and bound <= self.variables[source][1]:
+                return bound
+        elif source == 0 and target != 0:
+            # target >= -weight
+            bound = thresholds.threshold_below(self.constants, -weight)
+            if bound is not None and bound >= self.variables[target][0]:
+                return -bound
+        return None
+
     def _is_literal(self, value):
         return isinstance(value, numbers.Number) 
     
     def _forget_destructive(self, value, variable):
-        result = value
+        return self._forget_all_destructive(value, [variable])
 
-        def min_extended(m1, m2):
-            if m1 is None:
-                return m2
-            elif m2 is None:
-                return m1
-            return min(m1, m2)
-        
-        for i in value.all_nodes():
-            for j in value.all_nodes():
-                if i == j and j == variable:
-                    result.set_weight(i, 0, j)
-                elif i != variable and j != variable:
-                    w1 = value.get_weight(i, variable)
-                    w2 = value.get_weight(variable, j)
-                    w3 = value.get_weight(i, j)
-                    if w1 is None or w2 is None:
-                        result.set_weight(i, value.get_weight(i, j), j)
-                    else:
-                        result.set_weight(i,
-                                          min_extended(w1+w2, w3),
-                                          j)
-                else:
-                    result.set_weight(i, None, j)
-        return result
+    def _forget_all_destructive(self, value, variables):
+        ''' Remove all constraints on variables from value. On a closed
+        DBM this just drops their rows and columns; otherwise each
+        variable is eliminated first by combining its incoming and
+        outgoing edges. '''
+        if not value.closed:
+            for variable in variables:
+                self._eliminate(value, variable)
+        value.remove_nodes(variables)
+        return value
+
+    def _eliminate(self, value, variable):
+        ''' Add the constraints implied by paths through variable. '''
+        nodes = [v for v in value.all_nodes() if v != variable]
+        ins = [(i, value.get_weight(i, variable)) for i in nodes]
+        outs = [(value.get_weight(variable, j), j) for j in nodes]
+        ins = [(i, w1) for (i, w1) in ins if w1 is not None]
+        outs = [(w2, j) for (w2, j) in outs if w2 is not None]
+        for (i, w1) in ins:
+            for (w2, j) in outs:
+                w3 = value.get_weight(i, j)
+                if w3 is None or w1 + w2 < w3:
+                    value.set_weight(i, w1 + w2, j)
 
     def _op_binary_intervals(self,
                             element,
@@ -141,23 +194,33 @@ class DBMFactory(domain_factory.DomainFactory):
         result = self._forget_destructive(element.copy(), target_var)
             
         if cl is not None:
-            result.set_weight(0, -cl, target_var)
+            result = self._guard(result, 0, target_var, -cl)
         if cr is not None:
-            result.set_weight(target_var, cr, 0)
+            result = self._guard(result, target_var, 0, cr)
             
-        return self._normalize(result)
+        return result
 
 
     def _guard(self, element, x, y, c):
-        ''' Effect x - y <= c on element. '''
-        result = self._copy(element)
+        ''' Effect x - y <= c on element. The result is closed;
+        closure is restored incrementally. '''
+        element = self._normalize(element)
+        if element is None:
+            return None
         weight = element.get_weight(x, y)
-        if weight is None or c < weight:
-            result.set_weight(x, c, y)
+        if weight is not None and weight <= c:
+            return element
+        result = element.copy()
+        if not result.tighten(x, c, y):
+            return None
         return result
 
     def _translate(self, element, x, c):
-        ''' Effect x = x + c on element. '''
+        ''' Effect x = x + c on element. Translation keeps
+        a closed element closed. '''
+        element = self._normalize(element)
+        if element is None:
+            return None
         result = self._copy(element)
         for v in self.variables:
             if x == v:
@@ -170,13 +233,19 @@ class DBMFactory(domain_factory.DomainFactory):
             if d2 is not None:
                 # v - x + c <= d1 + c
                 result.set_weight(x, d2 + c, v)
+        result.closed = True
         return result
     
     # Public methods
 
     def add_constant(self, constant):
-        self.constants.append(constant)
-        self.constants = sorted(self.constants)
+        thresholds.add_threshold(self.constants, constant)
+
+    def close(self):
+        ''' Release the resources of the closure strategy (e.g. the
+        threads of a dense_dbm.BlockedClosure). '''
+        if hasattr(self._closure_strategy, 'close'):
+            self._closure_strategy.close()
 
     # Variable handling
             
@@ -212,15 +281,29 @@ class DBMFactory(domain_factory.DomainFactory):
             result = '<TOP>'
         return result
 
+    # Hash-consing
+
+    def intern(self, element):
+        ''' Return the canonical representative of element's zone if
+        interning is enabled, element itself otherwise. '''
+        if self._intern_table is None or element is None:
+            return element
+        closed = element.closure()
+        if closed is None:
+            return None
+        return self._intern_table.setdefault(closed.key(), closed)
+
     # Algebraic operations
         
     def get_top(self):
-        return dbm.DBM()
+        return self._new_dbm()
 
     def get_bot(self):
         return None
     
     def is_subseteq(self, element1, element2):
+        if element1 is element2:
+            return True
         s1 = self._normalize(element1)
         s2 = self._normalize(element2)
         if s1 is None:
@@ -233,6 +316,9 @@ class DBMFactory(domain_factory.DomainFactory):
                 common_vars.append(v)
         for v1 in common_vars:
             for v2 in common_vars:
+                if v1 == v2:
+                    # diagonals of non-empty closed DBMs are 0
+                    continue
                 w2 = s2.get_weight(v1, v2)
                 if w2 is None:
                     continue
@@ -244,22 +330,29 @@ class DBMFactory(domain_factory.DomainFactory):
         return True
                 
     def is_eq(self, element1, element2):
+        if element1 is element2:
+            return True
         s1 = self._normalize(element1)
         s2 = self._normalize(element2)
         if s1 is None:
             return s2 is None
         if s2 is None:
             return False
+        if s1.key() == s2.key():
+            return True
         common_vars = []
         for v in self.variables:
             if v in s1.all_nodes() or v in s2.all_nodes():
                 common_vars.append(v)
         for v1 in common_vars:
             for v2 in common_vars:
+                if v1 == v2:
+                    continue
                 if s1.get_weight(v1, v2) != s2.get_weight(v1, v2):
                     return False
         return True
         
+    @_interned
     def union(self, element1, element2):
         def max_extended(m1, m2):
             if m1 is None or m2 is None:
@@ -274,7 +367,7 @@ class DBMFactory(domain_factory.DomainFactory):
         elif element2 is None:
             result = element1.copy()
         else:
-            result = dbm.DBM()
+            result = self._new_dbm()
             common_vars = []
             for v in self.variables:
                 if v in element1.all_nodes() or v in element2.all_nodes():
@@ -286,10 +379,13 @@ class DBMFactory(domain_factory.DomainFactory):
                         max_extended(element1.get_weight(v1, v2),
                                      element2.get_weight(v1, v2)),
                         v2)
+            # the join of two closed DBMs is closed
+            result.closed = element1.closed and element2.closed
         return result
 
+    @_interned
     def intersect(self, element1, element2):
-        result = dbm.DBM()
+        result = self._new_dbm()
         if element1 is None:
             return element2.copy()
         elif element2 is None:
@@ -314,7 +410,7 @@ class DBMFactory(domain_factory.DomainFactory):
         return result
 
     def widen(self, element1, element2):
-        result = dbm.DBM()
+        result = self._new_dbm()
         if element1 is None:
             if element2 is None:
                 return None
@@ -331,15 +427,21 @@ class DBMFactory(domain_factory.DomainFactory):
             for v2 in common_vars:
                 val1 = element1.get_weight(v1, v2)
                 val2 = element2.get_weight(v1, v2)
-                if val1 is None or val2 is None or val2 > val1:
+                if val1 is None or val2 is None:
                     result.set_weight(v1, None, v2)
+                elif val2 > val1:
+                    result.set_weight(v1, self._threshold(v1, val2, v2), v2)
                 else:
                     result.set_weight(v1, val2, v2)
         return result
 
     # Semantics of the abstract machine
     
+    @_interned
     def op_load_constant(self, element, target_var, constant):
+        element = self._normalize(element)
+        if element is None:
+            return None
         result = self._forget_destructive(element.copy(), target_var)
         return self._guard(self._guard(result, target_var, 0, constant),
                            0, target_var, -constant)
@@ -347,12 +449,14 @@ class DBMFactory(domain_factory.DomainFactory):
     def op_load_variable(self, element, target_var, source_var):
         return self.op_binary(element, '+', target_var, source_var, 0)
         
+    @_interned
     def op_binary(self,
                   element,
                   operator,
                   target_var,
                   op1,
                   op2):
+        element = self._normalize(element)
         if element is None:
             return None
         if operator == '-' and self._is_literal(op2) and target_var == op1:
@@ -363,7 +467,7 @@ class DBMFactory(domain_factory.DomainFactory):
             # is x the same as y? 
             if target_var == op1:
                 return self._translate(element, target_var, op2)
-            forget_element = self._forget_destructive(element,
+            forget_element = self._forget_destructive(element.copy(),
                                                       target_var)
             result = None
             if self._is_literal(op1):
@@ -397,6 +501,7 @@ class DBMFactory(domain_factory.DomainFactory):
                                          i1,
                                          i2)
     
+    @_interned
     def cond_binary(self,
                     element,
                     operator,
@@ -434,13 +539,13 @@ class DBMFactory(domain_factory.DomainFactory):
         else:
             return self._guard(element, op1, op2, offset)
 
+    @_interned
     def project_var(self, element, variable):
-        # remove entries related to variable  
+        return self.project_vars(element, [variable])
+
+    @_interned
+    def project_vars(self, element, variables):
+        ''' Remove information about all variables in one pass. '''
         if element is None:
             return None
-        buffer = self._copy(element)
-        for v in self.variables:
-            if v != variable:
-                buffer.set_weight(v, None, variable)
-                buffer.set_weight(variable, None, v)
-        return buffer
+        return self._forget_all_destructive(element.copy(), variables)
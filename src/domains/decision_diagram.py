@@ -1,52 +1,59 @@
 ###########################################
 #
 # decision_diagram.py
-# 
-# Decision Diagram Element 
+#
+# Decision Diagram Element
 #
 #
 # (C) 2016, Andreas Gaiser
 ###########################################
 
 
-import numbers
-import domain_factory
-
 class DecisionDiagram(object):
-    
-    def __init__(self, inner_element, hi, lo):
+    ''' Handle of a node in the node store of a DecisionDiagramFactory.
+    The factory creates one handle per node it hands out, so handles
+    can be compared by identity; nodes not reachable from a handle are
+    reclaimed by the garbage collection of the factory. '''
+
+    __slots__ = ['factory', 'node', '__weakref__']
+
+    def __init__(self, factory, node):
         ''' Do not use the constructor explicitly; it
-        is only used by the factory to allocate node instances.'''
-        self.value = inner_element
-        self.hi = hi
-        self.lo = lo
-        
+        is only used by the factory to allocate handles.'''
+        self.factory = factory
+        self.node = node
+
     # Instance methods
 
     def is_leaf(self):
-        return (self.hi is None
-                and self.lo is None)
+        return self.node < 0
 
     def is_inner(self):
         return not self.is_leaf()
 
     def get_hi(self):
-        return self.hi
+        if self.is_leaf():
+            return None
+        return self.factory._handle(self.factory._hi[self.node])
 
     def get_lo(self):
-        return self.lo
+        if self.is_leaf():
+            return None
+        return self.factory._handle(self.factory._lo[self.node])
 
     def get_inner_value(self):
-        return self.value
-    
+        if self.is_leaf():
+            return self.get_value()
+        return self.get_variable()
+
     def get_variable(self):
         if self.is_leaf():
             return None
         else:
-            return self.value
+            return self.factory._var_names[self.factory._var[self.node]]
 
     def get_value(self):
         if self.is_leaf():
-            return self.value
+            return self.factory._values[-1 - self.node]
         else:
             return None
@@ -8,201 +8,383 @@
 ###########################################
 
 import weakref
-import numbers
+from array import array
 from domain_factory import DomainFactory
 from decision_diagram import DecisionDiagram
+from computed_table import ComputedTable
+
+# Nodes are integer ids: leaves have negative ids, inner nodes
+# non-negative ones. These are the ids of the bottom and top leaves.
+BOT = -1
+TOP = -2
+# empty slot of the unique table, variable of a free node
+EMPTY = -1
+
 
 class DecisionDiagramFactory(DomainFactory):
+    ''' Inner node n is row n of the parallel arrays _var, _hi and _lo
+    (variable id and children), leaf -1 - i holds the inner element
+    _values[i]. The unique table is an open addressing hash table of
+    inner node ids. Elements are DecisionDiagram handles; the nodes
+    not reachable from a live handle are reclaimed by
+    collect_garbage. '''
 
     def _init_tables(self):
         # Leaf values are stored separately with NEGATIVE indices
-        self._LEAVES = {} # >>> weakref.WeakValueDictionary()
-        self._LEAVES[-1] = self._bot
-        self._LEAVES[-2] = self._top
-        self._DOMAIN_ELEMENTS = {} # >>> weakref.WeakValueDictionary()
-        self._DOMAIN_ELEMENTS[self._bot.get_value()] = self._bot
-        self._DOMAIN_ELEMENTS[self._top.get_value()] = self._top
-        # _H_TABLE: (VARIABLE, LEFT, RIGHT) -->  DecisionDiagram
-        # _T_TABLE: DecisionDiagram --> (VARIABLE, LEFT, RIGHT):
-        # DONE VIA elements in the DecisionDiagram element
-        self._H_TABLE = {} # >>> weakref.WeakValueDictionary()
-        self._H_TABLE[(-1, None, None)] = self._bot
-        self._H_TABLE[(-2, None, None)] = self._top
-        self._free_leaf_pos = -3
-                      
-    def _lookup(self, inner_value, left, right):
-        # is the element a domain element?
-        if (left is None and right is None):
-                # check for the inner_value in the domain element hash
-                try:
-                    return self._DOMAIN_ELEMENTS[inner_value]
-                except KeyError:
-                    pass
-        else:
-            try:
-                return self._H_TABLE[(inner_value, left, right)]
-            except KeyError:
-                pass
-        return None
-
-    def _add_or_get(self, inner_value, left, right):
-        result = self._lookup(inner_value, left, right)  
-        if result is None:
-            result = DecisionDiagram(inner_value, left, right)
-            self._H_TABLE[(inner_value, left, right)] = result
-            if left is None and right is None:
-                self._DOMAIN_ELEMENTS[inner_value] = result
-        return result
-
-    def _is_in(self, inner_value, left, right):
-        return _lookup(inner_value, left, right) is not None
-                          
-    def _mk(self, inner_value, left, right):
-        if (left == right) and left is not None:
-            return left
+        self._values = [self.inner_factory.get_bot(),
+                        self.inner_factory.get_top()]
+        self._leaf_ids = {self._values[0]: BOT, self._values[1]: TOP}
+        self._free_leaves = []
+        # free inner nodes have variable EMPTY and are chained by _hi
+        self._var = array('i')
+        self._hi = array('i')
+        self._lo = array('i')
+        self._free = EMPTY
+        self._node_count = 0
+        # unique table with linear probing; slots of rewritten or
+        # freed nodes stay occupied (their node does not match the
+        # key any more) until the table is rebuilt
+        self._slots = array('i', [EMPTY]) * 1024
+        self._used_slots = 0
+        # node -> its handle; the handles returned recently are also
+        # kept alive by _recent_handles, which is bounded like the
+        # computed table
+        self._handles = weakref.WeakValueDictionary()
+        self._recent_handles = {}
+
+    def _handle(self, node):
+        handle = self._recent_handles.get(node)
+        if handle is None:
+            handle = self._handles.get(node)
+            if handle is None:
+                handle = DecisionDiagram(self, node)
+                self._handles[node] = handle
+            if len(self._recent_handles) >= self.computed_table.size:
+                self._recent_handles.clear()
+            self._recent_handles[node] = handle
+        return handle
+
+    def _leaf(self, value):
+        leaf = self._leaf_ids.get(value)
+        if leaf is None:
+            if self._free_leaves:
+                leaf = self._free_leaves.pop()
+                self._values[-1 - leaf] = value
+            else:
+                leaf = -1 - len(self._values)
+                self._values.append(value)
+            self._leaf_ids[value] = leaf
+            self._grown()
+        return leaf
+
+    def _mk(self, var, hi, lo):
+        if hi == lo:
+            return hi
+        slots = self._slots
+        mask = len(slots) - 1
+        i = hash((var, hi, lo)) & mask
+        node = slots[i]
+        while node != EMPTY:
+            if (self._hi[node] == hi and self._lo[node] == lo
+                and self._var[node] == var):
+                return node
+            i = (i + 1) & mask
+            node = slots[i]
+        node = self._new_node(var, hi, lo)
+        slots[i] = node
+        self._used_slots += 1
+        if 2 * self._used_slots > len(slots):
+            self._rehash()
+        return node
+
+    def _new_node(self, var, hi, lo):
+        node = self._free
+        if node != EMPTY:
+            self._free = self._hi[node]
+            self._var[node] = var
+            self._hi[node] = hi
+            self._lo[node] = lo
         else:
-            return self._add_or_get(inner_value, left, right)
-                          
-    def __init__(self, inner_factory):
+            node = len(self._var)
+            self._var.append(var)
+            self._hi.append(hi)
+            self._lo.append(lo)
+        self._node_count += 1
+        if self._refs is not None:
+            # reordering: count the references to inner nodes
+            if node == len(self._refs):
+                self._refs.append(0)
+            else:
+                self._refs[node] = 0
+            self._ref(hi)
+            self._ref(lo)
+            self._level_nodes[var].add(node)
+        self._grown()
+        return node
+
+    def _free_node(self, node):
+        self._var[node] = EMPTY
+        self._hi[node] = self._free
+        self._free = node
+        self._node_count -= 1
+
+    def _insert(self, node):
+        slots = self._slots
+        mask = len(slots) - 1
+        i = hash((self._var[node], self._hi[node], self._lo[node])) & mask
+        while slots[i] != EMPTY:
+            i = (i + 1) & mask
+        slots[i] = node
+        self._used_slots += 1
+        if 2 * self._used_slots > len(slots):
+            self._rehash()
+
+    def _rehash(self):
+        ''' Rebuild the unique table from the live nodes, growing it
+        so that it is at most a quarter full. '''
+        size = 1024
+        while size < 4 * self._node_count:
+            size *= 2
+        self._slots = array('i', [EMPTY]) * size
+        self._used_slots = 0
+        var = self._var
+        for node in xrange(len(var)):
+            if var[node] != EMPTY:
+                self._insert(node)
+
+    def _grown(self):
+        count = self.node_count()
+        if count > self.gc_threshold:
+            self._gc_pending = True
+            self._pending = True
+        if (self.reorder_threshold is not None
+            and count > self.reorder_threshold):
+            self._reorder_pending = True
+            self._pending = True
+
+    def _maintain(self):
+        ''' Collect garbage and reorder the variables if due. Nodes are
+        only held by handles between operations, so this is done at
+        the start of the public operations. '''
+        if self._reorder_pending:
+            self.reorder()
+        elif self._gc_pending:
+            self.collect_garbage()
+            # avoid collecting again and again if most nodes are alive
+            if self.node_count() > self.gc_threshold // 2:
+                self.gc_threshold *= 2
+        self._pending = False
+
+    def __init__(self, inner_factory, cache_size=1 << 16,
+                 gc_threshold=1 << 17, reorder_threshold=1 << 12,
+                 max_growth=1.2):
+        ''' cache_size bounds the number of entries of the computed
+        table, which caches the results of the apply operations.
+        Garbage is collected when the node store grows beyond
+        gc_threshold nodes. The variables are reordered by sifting
+        when it grows beyond reorder_threshold nodes (None: never),
+        the threshold being doubled by every reordering; sifting a
+        variable stops in a direction once the diagrams grow by more
+        than max_growth. '''
         self.inner_factory = inner_factory
+        self.computed_table = ComputedTable(cache_size)
+        self.gc_threshold = gc_threshold
+        # number of collections and of nodes reclaimed by them
+        self.gc_runs = 0
+        self.reclaimed_nodes = 0
+        self.reorder_threshold = reorder_threshold
+        self.max_growth = max_growth
+        self.reorderings = 0
+        # variable -> level; variable ids (by name and by id), the
+        # level of every variable id and the variable ids by level
         self.variables = {}
-        self._var_index = 0
-        self._bot = DecisionDiagram(inner_factory.get_bot(), None, None)
-        self._top = DecisionDiagram(inner_factory.get_top(), None, None)
+        self._var_ids = {}
+        self._var_names = []
+        self._levels = []
+        self._order = []
+        # only while reordering: references to every inner node, and
+        # the set of nodes of every variable id
+        self._refs = None
+        self._level_nodes = None
+        # garbage collection or reordering are due
+        self._gc_pending = False
+        self._reorder_pending = False
+        self._pending = False
         self._init_tables()
-                          
+        self._bot = self._handle(BOT)
+        self._top = self._handle(TOP)
+
     def _var_predecessor(self, var1, var2):
-        return self.variables[var1] < self.variables[var2]
-                          
-    def _compare_diagrams(self, first, second, relation):
-        if first.is_leaf() and second.is_leaf():
-            return relation(first.get_value(), second.get_value())
-        elif first.is_leaf():
-            return (self._compare_diagrams(first,
-                                           second.get_hi(),
-                                           relation)
-                    and
-                    self._compare_diagrams(first,
-                                           second.get_lo(),
-                                           relation))
-        elif second.is_leaf():
-            return (self._compare_diagrams(first.get_hi(),
-                                           second,
-                                           relation)
-                    and
-                    self._compare_diagrams(first.get_lo(),
-                                           second,
-                                           relation))
-        # first and second are inner nodes of a diagram
-        first_var = first.get_variable()
-        second_var = second.get_variable()
+        return self._levels[var1] < self._levels[var2]
+
+    # Apply operations. They walk the diagrams with an explicit stack
+    # instead of recursion, so that the depth of diagrams is not
+    # bounded by the recursion limit. Results of sub-diagrams are
+    # cached in the computed table under (key, node(s)), where key
+    # identifies the operation and all functions it applies.
+
+    def _split(self, first, second):
+        ''' Return the top variable of first and second (not both
+        leaves) and the pairs of their hi and lo children with
+        respect to it. '''
+        (var, hi, lo) = (self._var, self._hi, self._lo)
+        if first < 0:
+            return (var[second], (first, hi[second]), (first, lo[second]))
+        elif second < 0:
+            return (var[first], (hi[first], second), (lo[first], second))
+        (first_var, second_var) = (var[first], var[second])
         if first_var == second_var:
-            true_cond = self._compare_diagrams(first.get_hi(),
-                                               second.get_hi(),
-                                               relation)
-            if not true_cond:
-                return False
-            return self._compare_diagrams(first.get_lo(),
-                                          second.get_lo(),
-                                          relation)
-        elif self._var_predecessor(first_var, second_var):
+            return (first_var, (hi[first], hi[second]),
+                    (lo[first], lo[second]))
+        elif self._levels[first_var] < self._levels[second_var]:
             # first_var comes before second_var
-            true_cond = self._compare_diagrams(first.get_hi(),
-                                               second,
-                                               relation)
-            if not true_cond:
-                return False
-            return self._compare_diagrams(first.get_lo(),
-                                          second,
-                                          relation)
+            return (first_var, (hi[first], second), (lo[first], second))
         else:
             # second_var comes before first_var
-            true_cond = self._compare_diagrams(first,
-                                               second.get_hi(),
-                                               relation)
-            if not true_cond:
+            return (second_var, (first, hi[second]), (first, lo[second]))
+
+    def _compare_diagrams(self, key, first, second, relation):
+        ''' Return whether relation holds for all pairs of leaves
+        reached by the same assignment. '''
+        (get, put) = (self.computed_table.get, self.computed_table.put)
+        values = self._values
+        # pairs to compare, and markers (None, first, second) of pairs
+        # whose children are being compared
+        stack = [(first, second)]
+        (pop, extend) = (stack.pop, stack.extend)
+        while stack:
+            item = pop()
+            if item[0] is None:
+                # all children hold
+                put((key, item[1], item[2]), True)
+                continue
+            (first, second) = item
+            result = get((key, first, second))
+            if result is None:
+                if first >= 0 or second >= 0:
+                    (_, hi, lo) = self._split(first, second)
+                    extend(((None, first, second), lo, hi))
+                    continue
+                result = bool(relation(values[-1 - first],
+                                       values[-1 - second]))
+                put((key, first, second), result)
+            if not result:
+                # the marked pairs are the ancestors of this one
+                for item in stack:
+                    if item[0] is None:
+                        put((key, item[1], item[2]), False)
                 return False
-            return self._compare_diagrams(first.get_lo(),
-                                          second.get_lo(),
-                                          relation)
+        return True
+
+    def _mk_op_binary(self, key, first, second, op):
+        ''' Combine the leaves reached by the same assignment by op. '''
+        (get, put) = (self.computed_table.get, self.computed_table.put)
+        (mk, values) = (self._mk, self._values)
+        results = []
+        (push, pop_result) = (results.append, results.pop)
+        # pairs to combine, and markers (None, var, first, second) of
+        # pairs whose children are being combined
+        stack = [(first, second)]
+        (pop, extend) = (stack.pop, stack.extend)
+        while stack:
+            item = pop()
+            if item[0] is None:
+                (_, var, first, second) = item
+                lo = pop_result()
+                result = mk(var, pop_result(), lo)
+                put((key, first, second), result)
+                push(result)
+                continue
+            (first, second) = item
+            result = get((key, first, second))
+            if result is None:
+                if first >= 0 or second >= 0:
+                    (var, hi, lo) = self._split(first, second)
+                    extend(((None, var, first, second), lo, hi))
+                    continue
+                result = self._leaf(op(values[-1 - first],
+                                       values[-1 - second]))
+                put((key, first, second), result)
+            push(result)
+        return results[0]
+
+    def _map(self, key, element, terminal):
+        ''' Rebuild element top-down, replacing every node for which
+        terminal(node) is not None (leaves must be among them) by the
+        result. '''
+        (get, put) = (self.computed_table.get, self.computed_table.put)
+        (mk, var, hi, lo) = (self._mk, self._var, self._hi, self._lo)
+        results = []
+        (push, pop_result) = (results.append, results.pop)
+        # nodes to map, and markers (node,) of nodes whose children
+        # are being mapped
+        stack = [element]
+        (pop, extend) = (stack.pop, stack.extend)
+        while stack:
+            node = pop()
+            if node.__class__ is tuple:
+                node = node[0]
+                lo_result = pop_result()
+                result = mk(var[node], pop_result(), lo_result)
+                put((key, node), result)
+                push(result)
+                continue
+            result = get((key, node))
+            if result is None:
+                result = terminal(node)
+                if result is None:
+                    extend(((node,), lo[node], hi[node]))
+                    continue
+                put((key, node), result)
+            push(result)
+        return results[0]
+
+    def _below(self, node, variable):
+        ''' Whether node does not depend on variable and the variables
+        above it. '''
+        return node < 0 or self._levels[variable] < self._levels[
+            self._var[node]]
 
     def _set_to(self, element, variable, value):
         assert value in (0, 1)
-        if (element.is_leaf() or
-            self._var_predecessor(variable, element.get_variable())):
-            if value == 0:
-                return self._mk(variable, self._bot, element)
-            else:
-                return self._mk(variable, element, self._bot)
-        else:
-            element_var = element.get_variable()
-            if element_var == variable:
+        def terminal(node):
+            if self._below(node, variable):
                 if value == 0:
-                    return self._mk(variable,
-                                    self._bot,
-                                    self.union(element.get_hi(),
-                                               element.get_lo()))
+                    return self._mk(variable, BOT, node)
                 else:
-                    return self._mk(variable,
-                                    self.union(element.get_hi(),
-                                               element.get_lo()),
-                                    self._bot)
-            else:
-                # variable < element_var
-                return self._mk(element_var,
-                                self._set_to(element.get_hi(),
-                                              variable,
-                                              value),
-                                self._set_to(element.get_lo(),
-                                              variable,
-                                              value))
+                    return self._mk(variable, node, BOT)
+            elif self._var[node] == variable:
+                either = self._union(self._hi[node], self._lo[node])
+                if value == 0:
+                    return self._mk(variable, BOT, either)
+                else:
+                    return self._mk(variable, either, BOT)
+        return self._map(('set_to', variable, value), element, terminal)
 
     def _keep_one_branch(self, element, variable, value):
         assert value in (0, 1)
-        if (element.is_leaf() or
-            self._var_predecessor(variable, element.get_variable())):
-            if value == 0:
-                return self._mk(variable, self._bot, element)
-            else:
-                return self._mk(variable, element, self._bot)
-        else:
-            element_var = element.get_variable()
-            if element_var == variable:
+        def terminal(node):
+            if self._below(node, variable):
                 if value == 0:
-                    return self._mk(variable,
-                                    self._bot,
-                                    element.get_lo())
+                    return self._mk(variable, BOT, node)
                 else:
-                    return self._mk(variable,
-                                    element.get_hi(),
-                                    self._bot)
-            else:
-                # variable < element_var
-                return self._mk(element_var,
-                                self._keep_one_branch(element.get_hi(),
-                                                      variable,
-                                                      value),
-                                self._keep_one_branch(element.get_lo(),
-                                                      variable,
-                                                      value))
+                    return self._mk(variable, node, BOT)
+            elif self._var[node] == variable:
+                if value == 0:
+                    return self._mk(variable, BOT, self._lo[node])
+                else:
+                    return self._mk(variable, self._hi[node], BOT)
+        return self._map(('keep_one_branch', variable, value), element,
+                         terminal)
 
     def _project_variable(self, element, variable):
-        if (element.is_leaf() or
-            self._var_predecessor(variable, element.get_variable())):
-            return element
-        else:
-            element_var = element.get_variable()
-            if element_var == variable:
-                return self.union(element.get_lo(),
-                                  element.get_hi())
-            else:
-                # variable < element_var
-                return self._mk(element_var,
-                                self._project_variable(element.get_hi(),
-                                                       variable),
-                                self._project_variable(element.get_lo(),
-                                                       variable))
-            
+        def terminal(node):
+            if self._below(node, variable):
+                return node
+            elif self._var[node] == variable:
+                return self._union(self._lo[node], self._hi[node])
+        return self._map(('project_variable', variable), element, terminal)
+
     def _negate_operator(self, op):
         if (op == '=='):
             return '!='
@@ -218,181 +400,348 @@ class DecisionDiagramFactory(DomainFactory):
             return '<='
         return op
 
-    def _transform_leaves(self, element, transformer):
-        if element.is_leaf():
-            return self._mk(transformer(element.get_value()), None, None)
-        else:
-            return self._mk(element.get_variable(),
-                            self._transform_leaves(element.get_hi(), transformer),
-                            self._transform_leaves(element.get_lo(), transformer))
-        
-    def _propagate(self, element, variable, pos_transformer, neg_transformer):
-        if element.is_leaf():
-            value = element.get_value()
-            hi = self._mk(pos_transformer(value), None, None)
-            lo = self._mk(neg_transformer(value), None, None)
-            return self._mk(variable, hi, lo)
-        elif (element.get_variable() == variable
-              or self._var_predecessor(variable, element.get_variable())):
-            hi = self._transform_leaves(element.get_hi(), pos_transformer)
-            lo = self._transform_leaves(element.get_lo(), neg_transformer)
-            return self._mk(variable, hi, lo)
-        else:
-            # propagate to the leaves
-            hi = self._propagate(element.get_hi(), variable, pos_transformer, neg_transformer)
-            lo = self._propagate(element.get_lo(), variable, pos_transformer, neg_transformer)
-            return self._mk(element.get_variable(), hi, lo)
-    
-    def _mk_op_leaves(self, element, op):
-        if element.is_leaf():
-            return self._mk(op(element.get_value()), None, None)
-        else:
-            return self._mk(element.get_variable(),
-                            self._mk_op_leaves(element.get_hi(), op),
-                            self._mk_op_leaves(element.get_lo(), op))
-                            
-    def _mk_op_binary(self, first, second, op):
-        if first.is_leaf() and second.is_leaf():
-            return self._mk(op(first.get_value(), second.get_value()),
-                            None,
-                            None)
-        elif first.is_leaf():
-            return self._mk(second.get_variable(),
-                            self._mk_op_binary(first,
-                                        second.get_hi(),
-                                        op),
-                            self._mk_op_binary(first,
-                                        second.get_lo(),
-                                        op))
-        elif second.is_leaf():
-            return (self._mk(first.get_variable(),
-                             self._mk_op_binary(first.get_hi(),
-                                         second,
-                                         op),
-                            self._mk_op_binary(first.get_lo(),
-                                        second,
-                                        op)))
-        # else: first and second are inner nodes of a diagram
-        first_var = first.get_variable()
-        second_var = second.get_variable()
-        if first_var == second_var:
-            return (self._mk(first_var,
-                             self._mk_op_binary(first.get_hi(),
-                                         second.get_hi(),
-                                         op),
-                             self._mk_op_binary(first.get_lo(),
-                                         second.get_lo(),
-                                         op)))
-        elif self._var_predecessor(first_var, second_var):
-            # first_var comes before second_var
-            return (self._mk(first_var,
-                             self._mk_op_binary(first.get_hi(),
-                                         second,
-                                         op),
-                             self._mk_op_binary(first.get_lo(),
-                                         second,
-                                         op)))
-        else:
-            return (self._mk(first_var,
-                             self._mk_op_binary(first,
-                                         second.get_hi(),
-                                         op),
-                             self._mk_op_binary(first,
-                                         second.get_lo(),
-                                         op)))
-        
+    def _transform_leaves(self, key, element, transformer):
+        ''' key identifies transformer. '''
+        def terminal(node):
+            if node < 0:
+                return self._leaf(transformer(self._values[-1 - node]))
+        return self._map(key, element, terminal)
+
+    def _propagate(self, key, element, variable, pos_transformer,
+                   neg_transformer):
+        ''' key identifies variable and both transformers. '''
+        def terminal(node):
+            if node < 0:
+                value = self._values[-1 - node]
+                hi = self._leaf(pos_transformer(value))
+                lo = self._leaf(neg_transformer(value))
+                return self._mk(variable, hi, lo)
+            elif self._var[node] == variable:
+                hi = self._transform_leaves((key, True), self._hi[node],
+                                            pos_transformer)
+                lo = self._transform_leaves((key, False), self._lo[node],
+                                            neg_transformer)
+                return self._mk(variable, hi, lo)
+            elif self._below(node, variable):
+                hi = self._transform_leaves((key, True), node,
+                                            pos_transformer)
+                lo = self._transform_leaves((key, False), node,
+                                            neg_transformer)
+                return self._mk(variable, hi, lo)
+        return self._map(('propagate', key), element, terminal)
+
+    def _union(self, first, second):
+        return self._mk_op_binary('union', first, second,
+                                  self.inner_factory.union)
+
+    def _intersect(self, first, second):
+        return self._mk_op_binary('intersect', first, second,
+                                  self.inner_factory.intersect)
+
+    # Variable reordering
+
+    def _ref(self, node):
+        if node >= 0:
+            self._refs[node] += 1
+
+    def _deref(self, node):
+        ''' Drop a reference to node, freeing the nodes that are not
+        referenced any more. '''
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                continue
+            self._refs[node] -= 1
+            if self._refs[node] == 0:
+                self._level_nodes[self._var[node]].discard(node)
+                stack.append(self._hi[node])
+                stack.append(self._lo[node])
+                self._free_node(node)
+
+    def _start_reordering(self):
+        ''' Count the references to all (live) nodes and collect the
+        nodes of every variable. '''
+        self.collect_garbage()
+        (var, hi, lo) = (self._var, self._hi, self._lo)
+        self._refs = array('i', [0]) * len(var)
+        self._level_nodes = [set() for _ in self._var_names]
+        for node in self._handles.keys():
+            self._ref(node)
+        for node in xrange(len(var)):
+            if var[node] != EMPTY:
+                self._ref(hi[node])
+                self._ref(lo[node])
+                self._level_nodes[var[node]].add(node)
+
+    def _stop_reordering(self):
+        self._refs = None
+        self._level_nodes = None
+        self._rehash()
+
+    def _swap(self, level):
+        ''' Swap the variables at level and level + 1, rewriting the
+        nodes of the upper variable in place so that every node keeps
+        representing the same function. '''
+        (x, y) = (self._order[level], self._order[level + 1])
+        (var, hi_, lo_) = (self._var, self._hi, self._lo)
+        nodes_x = self._level_nodes[x]
+        nodes_y = self._level_nodes[y]
+        for f in list(nodes_x):
+            (hi, lo) = (hi_[f], lo_[f])
+            hi_y = hi >= 0 and var[hi] == y
+            lo_y = lo >= 0 and var[lo] == y
+            if not (hi_y or lo_y):
+                # independent of y, stays a node of x
+                continue
+            (f11, f10) = (hi_[hi], lo_[hi]) if hi_y else (hi, hi)
+            (f01, f00) = (hi_[lo], lo_[lo]) if lo_y else (lo, lo)
+            # f = y ? (x ? f11 : f01) : (x ? f10 : f00)
+            new_hi = self._mk(x, f11, f01)
+            self._ref(new_hi)
+            new_lo = self._mk(x, f10, f00)
+            self._ref(new_lo)
+            (var[f], hi_[f], lo_[f]) = (y, new_hi, new_lo)
+            self._insert(f)
+            nodes_x.discard(f)
+            nodes_y.add(f)
+            self._deref(hi)
+            self._deref(lo)
+        (self._order[level], self._order[level + 1]) = (y, x)
+        self._levels[x] = level + 1
+        self._levels[y] = level
+        self.variables[self._var_names[x]] = level + 1
+        self.variables[self._var_names[y]] = level
+
+    def _sift(self, variable):
+        ''' Move variable through all levels and leave it at the level
+        with the fewest nodes. '''
+        level = self._levels[variable]
+        (best_size, best_level) = (self._node_count, level)
+        for (step, end) in ((1, len(self._order) - 1), (-1, 0)):
+            while level != end:
+                self._swap(min(level, level + step))
+                level += step
+                size = self._node_count
+                if size < best_size:
+                    (best_size, best_level) = (size, level)
+                elif size > self.max_growth * best_size:
+                    break
+        while level < best_level:
+            self._swap(level)
+            level += 1
+        while level > best_level:
+            self._swap(level - 1)
+            level -= 1
+
+    def reorder(self):
+        ''' Reorder the variables by Rudell's sifting: each variable
+        (those with the most nodes first) is moved to the level
+        minimizing the number of nodes. Diagrams are rewritten in
+        place, so existing elements stay valid. Return the number of
+        nodes before and after. '''
+        self._start_reordering()
+        before = self.node_count()
+        variables = sorted((variable for variable in self._order
+                            if self._level_nodes[variable]),
+                           key=lambda v: -len(self._level_nodes[v]))
+        for variable in variables:
+            self._sift(variable)
+        self._stop_reordering()
+        self._reorder_pending = False
+        after = self.node_count()
+        self.reorderings += 1
+        if self.reorder_threshold is not None:
+            self.reorder_threshold = max(self.reorder_threshold,
+                                         2 * after)
+        return (before, after)
+
     # Public methods
+
+    def set_variable_order(self, variables):
+        ''' Move the given boolean variables to the first levels, in
+        the given order; the other variables keep their relative order
+        below them. Existing elements stay valid. '''
+        variables = [self._var_ids[v] for v in variables
+                     if v in self._var_ids]
+        self._start_reordering()
+        for (target_level, variable) in enumerate(variables):
+            level = self._levels[variable]
+            while level > target_level:
+                self._swap(level - 1)
+                level -= 1
+        self._stop_reordering()
+
+    def collect_garbage(self):
+        ''' Reclaim the nodes not reachable from an element (the
+        computed table is cleared) and return their number. '''
+        self._recent_handles.clear()
+        (var, hi, lo) = (self._var, self._hi, self._lo)
+        marked = bytearray(len(var))
+        leaves = set([BOT, TOP])
+        stack = self._handles.keys()
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                leaves.add(node)
+            elif not marked[node]:
+                marked[node] = 1
+                stack.append(hi[node])
+                stack.append(lo[node])
+        size = self.node_count()
+        for node in xrange(len(var)):
+            if var[node] != EMPTY and not marked[node]:
+                self._free_node(node)
+        for (value, leaf) in self._leaf_ids.items():
+            if leaf not in leaves:
+                del self._leaf_ids[value]
+                self._values[-1 - leaf] = None
+                self._free_leaves.append(leaf)
+        self._rehash()
+        self.computed_table.clear()
+        self._gc_pending = False
+        reclaimed = size - self.node_count()
+        self.gc_runs += 1
+        self.reclaimed_nodes += reclaimed
+        return reclaimed
+
+    def node_count(self):
+        ''' Return the number of nodes (inner nodes and leaves). '''
+        return self._node_count + len(self._leaf_ids)
+
     # Variable handling
-            
+
     def add_integer_var(self, variable, min_val, max_val):
         self.inner_factory.add_integer_var(variable, min_val, max_val)
-        
+        # the results of the inner operations may change
+        self.computed_table.clear()
+
     def add_bool_var(self, variable):
-        self.variables[variable] = self._var_index
-        self._var_index += 1
+        if variable not in self.variables:
+            self._var_ids[variable] = len(self._var_names)
+            self._levels.append(len(self._order))
+            self._order.append(len(self._var_names))
+            self._var_names.append(variable)
+            self.variables[variable] = self._levels[-1]
 
     def add_constant(self, constant):
         self.inner_factory.add_constant(constant)
-        
+        self.computed_table.clear()
+
+    @property
+    def threshold_widening(self):
+        return self.inner_factory.threshold_widening
+
     # I/O
-    def to_string(self, element):
-        if element.is_leaf():
-            return 'LEAF: %s' % self.inner_factory.to_string(element.get_value())
+
+    def _node_to_string(self, node):
+        if node < 0:
+            return 'LEAF: %s' % self.inner_factory.to_string(
+                self._values[-1 - node])
         else:
-            return 'IF %s THEN %s else %s' % (element.get_variable(),
-                                              self.to_string(element.get_hi()),
-                                              self.to_string(element.get_lo()))
+            return 'IF %s THEN %s else %s' % (
+                self._var_names[self._var[node]],
+                self._node_to_string(self._hi[node]),
+                self._node_to_string(self._lo[node]))
+
+    def to_string(self, element):
+        return self._node_to_string(element.node)
 
     # Algebraic operations
-        
+
     def get_top(self):
         return self._top
-        
+
     def get_bot(self):
         return self._bot
-            
+
     def is_subseteq(self, element1, element2):
-        return self._compare_diagrams(element1, element2,
-                                      lambda x, y: self.inner_factory.is_subseteq(x, y))
-                
+        return self._compare_diagrams('is_subseteq', element1.node,
+                                      element2.node,
+                                      self.inner_factory.is_subseteq)
+
     def is_eq(self, element1, element2):
-        return self._compare_diagrams(element1, element2,
-                                      lambda x, y: self.inner_factory.is_eq(x, y))
-    
+        return self._compare_diagrams('is_eq', element1.node,
+                                      element2.node,
+                                      self.inner_factory.is_eq)
+
+    # The public operations below collect garbage and reorder the
+    # variables first if due; nodes are only held by handles between
+    # them. They are never called by the recursive operations.
+
     def union(self, element1, element2):
-        return self._mk_op_binary(element1, element2,
-                                  lambda x, y: self.inner_factory.union(x, y))
+        if self._pending:
+            self._maintain()
+        return self._handle(self._union(element1.node, element2.node))
 
     def intersect(self, element1, element2):
-        return self._mk_op_binary(element1, element2,
-                                  lambda x, y: self.inner_factory.intersect(x, y))
-    
+        if self._pending:
+            self._maintain()
+        return self._handle(self._intersect(element1.node, element2.node))
+
     def widen(self, element1, element2):
-        return self._mk_op_binary(element1, element2,
-                                  lambda x, y: self.inner_factory.widen(x, y))
+        if self._pending:
+            self._maintain()
+        return self._handle(self._mk_op_binary('widen', element1.node,
+                                               element2.node,
+                                               self.inner_factory.widen))
 
     # Semantics of the abstract machine
-    
+
     def op_load_constant(self, element, target_var, constant):
+        if self._pending:
+            self._maintain()
         if target_var in self.variables:
             # target_var is a (boolean) decision var
             # this means: constant is either 0 or 1
             assert constant in (0, 1)
-            return self._set_to(element, target_var, constant)
+            return self._handle(self._set_to(element.node,
+                                             self._var_ids[target_var],
+                                             constant))
         else:
-            return self._mk_op_leaves(element,
-                                      lambda x: \
-                                      self.inner_factory.load_constant\
-                                      (x, target_var, constant))
+            return self._handle(self._transform_leaves(
+                ('op_load_constant', target_var, constant),
+                element.node,
+                lambda x: self.inner_factory.op_load_constant(x,
+                                                              target_var,
+                                                              constant)))
 
     def _is_boolean_operator(self, op):
         return op in [ "==", "!=", "<", "<=", ">", ">=" ]
 
     def op_load_variable(self, element, target_var, source_var):
+        if self._pending:
+            self._maintain()
         if target_var in self.variables:
+            target = self._var_ids[target_var]
+            source = self._var_ids[source_var]
             # first: project
-            buffer = self._project_variable(element, target_var)
+            buffer = self._project_variable(element.node, target)
             # now: add constraint "target_var <=> source_var"
-            constraint_diagram = None
-            if self._var_predecessor(target_var, source_var):
-                var_a, var_b = target_var, source_var
+            if self._var_predecessor(target, source):
+                var_a, var_b = target, source
             else:
-                var_a, var_b = source_var, target_var
+                var_a, var_b = source, target
             constraint_diagram = self._mk(var_a,
-                                          self._mk(var_b, self._top, self._bot),
-                                          self._mk(var_b, self._bot, self._top))
-            return self.intersect(buffer, constraint_diagram)
+                                          self._mk(var_b, TOP, BOT),
+                                          self._mk(var_b, BOT, TOP))
+            return self._handle(self._intersect(buffer, constraint_diagram))
         else:
-            return self._transform_leaves\
-                (element, lambda v: \
-                 self.inner_factory.op_load_variable(v, target_var, source_var))
-        
+            return self._handle(self._transform_leaves(
+                ('op_load_variable', target_var, source_var),
+                element.node,
+                lambda v: self.inner_factory.op_load_variable(v,
+                                                              target_var,
+                                                              source_var)))
+
     def op_binary(self,
                   element,
                   operator,
                   target_var,
                   op1,
                   op2):
+        if self._pending:
+            self._maintain()
         if (self._is_boolean_operator(operator)
             and target_var in self.variables):
             # decision variable
@@ -409,10 +758,12 @@ class DecisionDiagramFactory(DomainFactory):
                                                               self._negate_operator(operator),
                                                               op1,
                                                               op2))
-            return self._propagate(element,
-                                   target_var,
-                                   pos_transformer,
-                                   neg_transformer)
+            return self._handle(self._propagate(
+                ('op_binary', operator, target_var, op1, op2),
+                element.node,
+                self._var_ids[target_var],
+                pos_transformer,
+                neg_transformer))
         else:
             transformer = (lambda x:
                            self.inner_factory.op_binary(x,
@@ -421,32 +772,44 @@ class DecisionDiagramFactory(DomainFactory):
                                                         op1,
                                                         op2))
             # just transform the leaves
-            return self._transform_leaves(element, transformer)
-                                          
+            return self._handle(self._transform_leaves(
+                ('op_binary', operator, target_var, op1, op2),
+                element.node, transformer))
+
     def cond_binary(self,
                     element,
                     operator,
                     op1,
                     op2):
+        if self._pending:
+            self._maintain()
         # most important special case: comparison for 1 / 0 of
         # boolean variable
         if op1 in self.variables:
             if (operator == '==' and op2 in (0, 1)):
-                return self._keep_one_branch(element, op1, op2)
+                return self._handle(self._keep_one_branch(
+                    element.node, self._var_ids[op1], op2))
             elif (operator == '!=' and op2 in (0, 1)):
-                return self._keep_one_branch(element, op1, 1-op2)
+                return self._handle(self._keep_one_branch(
+                    element.node, self._var_ids[op1], 1-op2))
         transformer = (lambda x:
                        self.inner_factory.cond_binary(x,
                                                       operator,
                                                       op1,
                                                       op2))
-        return self._transform_leaves(element, transformer)                      
+        return self._handle(self._transform_leaves(
+            ('cond_binary', operator, op1, op2), element.node, transformer))
 
     def project_var(self,
                     element,
                     variable):
+        if self._pending:
+            self._maintain()
         if variable in self.variables:
-            return self._project_variable(element, variable)
+            return self._handle(self._project_variable(
+                element.node, self._var_ids[variable]))
         else:
-            return self._transform_leaves\
-                (element, lambda v: self.inner_factory.project_var(v, variable))
+            return self._handle(self._transform_leaves(
+                ('project_var', variable),
+                element.node,
+                lambda v: self.inner_factory.project_var(v, variable)))
@@ -0,0 +1,338 @@
+######################################
+#
+# dense_dbm.py
+#
+# Difference bound matrices ADT,
+# dense NumPy representation
+#
+# (C) 2016, Andreas Gaiser
+######################################
+
+import numpy
+from weighted_graph import WeightedGraph
+
+
+def close_matrix(m):
+    ''' Floyd-Warshall closure of the square matrix m (in place),
+    using one broadcasted min-plus step per pivot. '''
+    n = m.shape[0]
+    for k in xrange(n):
+        numpy.minimum(m, m[:, k, None] + m[None, k, :], out=m)
+    return m
+
+
+def _min_plus(a, b):
+    ''' Min-plus product of the matrices a and b. The reduction runs
+    over the last (contiguous) axis. '''
+    return numpy.min(a[:, None, :] + b.T[None, :, :], axis=2)
+
+
+def close_matrix_blocked(m, tile_size=64, pool=None):
+    ''' Floyd-Warshall closure of the square matrix m (in place),
+    computed on tiles of tile_size x tile_size entries so that each
+    step works on cache-sized blocks. For every diagonal tile, the
+    tile itself is closed first, then the tiles in its row and
+    column, then all remaining tiles. The tiles of the last two
+    phases are independent; if pool (e.g. a
+    multiprocessing.pool.ThreadPool) is given, they are updated on
+    it. '''
+    n = m.shape[0]
+    tiles = [slice(start, min(start + tile_size, n))
+             for start in xrange(0, n, tile_size)]
+    run = pool.map if pool is not None else map
+
+    def update(task):
+        (target, left, right) = task
+        numpy.minimum(m[target], _min_plus(m[left], m[right]),
+                      out=m[target])
+
+    for k in tiles:
+        close_matrix(m[k, k])
+        others = [t for t in tiles if t != k]
+        run(update,
+            [((k, j), (k, k), (k, j)) for j in others]
+            + [((i, k), (i, k), (k, k)) for i in others])
+        run(update,
+            [((i, j), (i, k), (k, j)) for i in others for j in others])
+    return m
+
+
+class BlockedClosure(object):
+    ''' Closure strategy for DenseDBM using close_matrix_blocked with
+    the given tile size, on a pool of threads if threads > 1 (NumPy
+    releases the GIL in its inner loops). The pool is started by the
+    first closure; close() stops it. '''
+
+    def __init__(self, tile_size=64, threads=1):
+        self.tile_size = tile_size
+        self.threads = threads
+        self._pool = None
+
+    def __call__(self, m):
+        if self._pool is None and self.threads > 1:
+            from multiprocessing.pool import ThreadPool
+            self._pool = ThreadPool(self.threads)
+        return close_matrix_blocked(m, self.tile_size, self._pool)
+
+    def close(self):
+        ''' Stop the threads of the pool, if any. The strategy can
+        still be used afterwards; a new pool is then started. '''
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+class DenseDBM(WeightedGraph):
+    ''' DBM storing all weights in a dense float matrix. Nodes are
+    mapped to integer indices in order of appearance; missing
+    edges are represented by +inf. '''
+
+    # function closing a square matrix in place, inherited by copies
+    closure_strategy = staticmethod(close_matrix)
+
+    def __init__(self):
+        self._index = {}
+        self._nodes = []
+        self._matrix = numpy.empty((0, 0))
+        # True if the DBM is known to be closed (shortest path form)
+        self.closed = True
+        # cached closed form and emptiness, None if not computed yet
+        self._closure = None
+        self._empty = False
+        # cached canonical key, False if not computed yet
+        self._key = False
+        # copy-on-write: True if the storage is shared with other DBMs
+        self._shared = False
+
+    # Private methods
+
+    def _own(self):
+        ''' Unshare the storage before modifying it. '''
+        if self._shared:
+            self._index = dict(self._index)
+            self._nodes = list(self._nodes)
+            self._matrix = self._matrix.copy()
+            self._shared = False
+
+    def _size(self):
+        return len(self._nodes)
+
+    def _grow(self, size):
+        ''' Make room for at least size nodes, doubling the capacity. '''
+        capacity = self._matrix.shape[0]
+        if size <= capacity:
+            return
+        new_capacity = max(size, 2 * capacity, 8)
+        matrix = numpy.empty((new_capacity, new_capacity))
+        matrix.fill(numpy.inf)
+        matrix[:capacity, :capacity] = self._matrix
+        self._matrix = matrix
+
+    def _add_node(self, node):
+        try:
+            return self._index[node]
+        except KeyError:
+            self._own()
+            index = len(self._nodes)
+            self._grow(index + 1)
+            self._index[node] = index
+            self._nodes.append(node)
+            return index
+
+    def _to_weight(self, value):
+        if value == numpy.inf:
+            return None
+        value = float(value)
+        if value.is_integer():
+            return int(value)
+        return value
+
+    def _edges(self):
+        ''' Iterate all (source, weight, target) triples. '''
+        n = self._size()
+        m = self._matrix[:n, :n]
+        for (i, j) in zip(*numpy.nonzero(m != numpy.inf)):
+            yield (self._nodes[i], self._to_weight(m[i, j]), self._nodes[j])
+
+    # Public methods
+
+    def matrix(self):
+        ''' Return the (n x n) weight matrix, rows and columns
+        ordered as in all_nodes(). The matrix may be shared with
+        copies of the DBM and must not be modified. '''
+        n = self._size()
+        return self._matrix[:n, :n]
+
+    def index_of(self, node):
+        ''' Return the matrix index of node, None if unknown. '''
+        return self._index.get(node)
+
+    def copy(self):
+        ''' Return a copy of the DBM. The copy shares its storage with
+        self until one of them is modified. '''
+        result = DenseDBM()
+        result._index = self._index
+        result._nodes = self._nodes
+        result._matrix = self._matrix
+        result._shared = True
+        self._shared = True
+        result.closure_strategy = self.closure_strategy
+        result.closed = self.closed
+        result._closure = self._closure
+        result._empty = self._empty
+        result._key = self._key
+        return result
+
+    def set_weight(self, source, weight, target):
+        ''' Set the weight between source and target to weight. Can also
+        be None (= infinite weight). '''
+        i = self._add_node(source)
+        j = self._add_node(target)
+        self._own()
+        self._matrix[i, j] = numpy.inf if weight is None else weight
+        self.closed = False
+        self._closure = None
+        self._empty = None
+        self._key = False
+
+    def get_weight(self, source, target):
+        ''' Get the weight of the edge between source and target,
+        None for infinite weight. '''
+        i = self._index.get(source)
+        j = self._index.get(target)
+        if i is None or j is None:
+            return None
+        return self._to_weight(self._matrix[i, j])
+
+    def all_nodes(self):
+        ''' Get a copy of the list of all occuring nodes. '''
+        return self._nodes[:]
+
+    def incomings(self, node):
+        ''' Get all incoming edges from node. '''
+        j = self._index[node]
+        column = self.matrix()[:, j]
+        return set((self._nodes[i], self._to_weight(column[i]))
+                   for i in numpy.nonzero(column != numpy.inf)[0])
+
+    def outgoings(self, node):
+        ''' Get all outgoing edges from node. '''
+        i = self._index[node]
+        row = self.matrix()[i, :]
+        return set((self._to_weight(row[j]), self._nodes[j])
+                   for j in numpy.nonzero(row != numpy.inf)[0])
+
+    def exists_negative_cycle(self):
+        ''' Return true if a negative cycle exists in the DBM. '''
+        return self.closure() is None
+
+    def find_shortest_paths(self):
+        ''' Return a DBM with shortest path weights as entries. '''
+        sp = self.copy()
+        sp._own()
+        m = sp.closure_strategy(sp.matrix())
+        # adjust diagonals
+        numpy.fill_diagonal(m, 0)
+        sp.closed = True
+        sp._empty = False
+        return sp
+
+    def closure(self):
+        ''' Return the closed form of the DBM, None if the DBM is
+        empty. Emptiness is read off the diagonal of the same closure
+        pass; both results are cached until the next set_weight. '''
+        if self.closed:
+            return self
+        if self._empty is None:
+            sp = self.copy()
+            sp._own()
+            m = sp.closure_strategy(sp.matrix())
+            self._empty = bool((numpy.diagonal(m) < 0).any())
+            if not self._empty:
+                numpy.fill_diagonal(m, 0)
+                sp.closed = True
+                sp._empty = False
+                self._closure = sp
+        if self._empty:
+            return None
+        return self._closure
+
+    def tighten(self, source, weight, target):
+        ''' Add the constraint source - target <= weight to a closed
+        DBM and restore closure incrementally in O(n^2). Returns False
+        iff the DBM becomes inconsistent (negative cycle). '''
+        i = self._add_node(source)
+        j = self._add_node(target)
+        self._own()
+        m = self.matrix()
+        m[i, i] = min(m[i, i], 0)
+        m[j, j] = min(m[j, j], 0)
+        if m[j, i] + weight < 0:
+            return False
+        if weight < m[i, j]:
+            numpy.minimum(m, m[:, i, None] + weight + m[None, j, :], out=m)
+        self.closed = True
+        self._closure = None
+        self._empty = False
+        self._key = False
+        return True
+
+    def remove_nodes(self, nodes):
+        ''' Remove nodes together with all their incoming and outgoing
+        edges, i.e. drop their rows and columns. A closed DBM stays
+        closed. '''
+        nodes = set(nodes)
+        keep = [i for (i, node) in enumerate(self._nodes)
+                if node not in nodes]
+        if len(keep) == len(self._nodes):
+            return
+        # fancy indexing copies, so the storage is no longer shared
+        self._matrix = self.matrix()[numpy.ix_(keep, keep)]
+        self._nodes = [self._nodes[i] for i in keep]
+        self._index = dict((node, i) for (i, node) in enumerate(self._nodes))
+        self._shared = False
+        self._closure = None
+        self._empty = False if self.closed else None
+        self._key = False
+
+    def to_string(self):
+        ''' Get a textual representation of the DBM graph. '''
+        result = ''
+        for node in self._nodes:
+            result += 'node: %s\n' % node
+            for (weight, target) in sorted(self.outgoings(node)):
+                result += '%s -(%s)-> %s\n' % (node, weight, target)
+            for (source, weight) in sorted(self.incomings(node)):
+                result += '%s <=(%s)= %s\n' % (node, weight, source)
+        return result
+
+    def key(self):
+        ''' Return a canonical, hashable representation of the DBM
+        state: the finite off-diagonal entries of its closed form as
+        (source, weight, target) triples, None if the DBM is empty.
+        The key is cached until the next set_weight. '''
+        if self._key is False:
+            closed = self.closure()
+            if closed is None:
+                self._key = None
+            else:
+                self._key = frozenset(
+                    (source, weight, target)
+                    for (source, weight, target) in closed._edges()
+                    if source != target)
+        return self._key
+
+    def __hash__(self):
+        ''' Return a hash value for DBM. '''
+        return hash(self.key())
+
+    def __eq__(self, other):
+        ''' Return True iff other represents the same zone. '''
+        if isinstance(other, self.__class__):
+            return self is other or self.key() == other.key()
+        else:
+            return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
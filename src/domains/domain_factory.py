@@ -13,6 +13,10 @@ class DomainFactory(object):
 
     __metaclass__ = abc.ABCMeta
 
+    # True if widen jumps to the constants added by add_constant
+    # instead of the variable bounds; analyzers then widen right away
+    threshold_widening = False
+
     # Variable handling
     
     @abc.abstractmethod
@@ -26,6 +30,16 @@ class DomainFactory(object):
         ''' Add a boolean variable to the factory, 
         variable being its unique identifier. '''
         return
+
+    def add_constant(self, constant):
+        ''' Add a program constant, used as widening threshold.
+        Domains without thresholds ignore it. '''
+        return
+
+    def set_variable_order(self, variables):
+        ''' Suggest an order of the boolean variables. Domains whose
+        representation does not depend on an order ignore it. '''
+        return
     
     # I/O
 
@@ -103,3 +117,24 @@ class DomainFactory(object):
     def project_var(self, element, variable):
         ''' Remove information about variable. '''
         return
+
+    def compile_block(self, operations):
+        ''' Return a function mapping an element to the result of
+        applying operations in order. Operations are tuples of the name
+        of an op_* method and its arguments after element, e.g.
+        ('op_binary', '+', 'x', 'x', 1). Domains can override this to
+        fuse the operations of a block. '''
+        operations = [(getattr(self, operation[0]), operation[1:])
+                      for operation in operations]
+        def transfer(element):
+            for (method, arguments) in operations:
+                element = method(element, *arguments)
+            return element
+        return transfer
+
+    def project_vars(self, element, variables):
+        ''' Remove information about all variables. Domains that can
+        forget several variables at once should override this. '''
+        for variable in variables:
+            element = self.project_var(element, variable)
+        return element
@@ -1,6 +1,6 @@
 ##############################
 #
-# live_vars.py 
+# live_vars.py
 #
 # live variables domain
 #
@@ -8,77 +8,100 @@
 ##############################
 
 import domain_factory
-import numbers
-from BitVector import *
+
 
 class LiveVarsDomainFactory(domain_factory.DomainFactory):
-    
+    ''' Sets of live variables as Python integers: bit i is set iff
+    the variable with id i is live. All operations remove the
+    variables of a kill mask and add those of a gen mask, so the
+    lattice operations are single bitwise operations on integers of
+    arbitrary width. '''
+
     def __init__(self):
         self._variables_to_id = {}
         self._id_to_variables = {}
         self._var_index = 0
 
     # Private methods
-    
+
     def _add_var(self, variable):
+        if variable in self._variables_to_id:
+            return
         self._variables_to_id[variable] = self._var_index
         self._id_to_variables[self._var_index] = variable
         self._var_index += 1
 
+    def _mask(self, variables):
+        ''' Return the set of the given operands that are variables. '''
+        mask = 0
+        for variable in variables:
+            if variable in self._variables_to_id:
+                mask |= 1 << self._variables_to_id[variable]
+        return mask
+
+    def _gen_kill(self, operation, arguments):
+        ''' Return the (gen, kill) masks of an op_* method applied to
+        arguments (those after element). '''
+        if operation == 'op_load_constant':
+            (target_var, constant) = arguments
+            return (0, self._mask([target_var]))
+        elif operation == 'op_load_variable':
+            (target_var, source_var) = arguments
+            return (self._mask([source_var]), self._mask([target_var]))
+        elif operation == 'op_binary':
+            (operator, target_var, op1, op2) = arguments
+            return (self._mask([op1, op2]), self._mask([target_var]))
+        elif operation == 'cond_binary':
+            (operator, op1, op2) = arguments
+            return (self._mask([op1, op2]), 0)
+        elif operation == 'project_var':
+            (variable,) = arguments
+            return (self._mask([variable]), 0)
+        raise ValueError('Unknown operation: %s' % operation)
+
     # Variable handling
-    
+
     def add_integer_var(self, variable, min_val, max_val):
         self._add_var(variable)
 
     def add_bool_var(self, variable):
         self._add_var(variable)
-        
+
     # I/O
-      
+
     def to_string(self, element):
-        result = '{'
+        variables = []
         index = 0
-        first = True
-        for bit in element:
-            if bit == 1:
-                if first:
-                    result += '%s' % self._id_to_variables[index]
-                    first = False
-                else:
-                    result += ', %s' % self._id_to_variables[index]
+        while element:
+            if element & 1:
+                variables.append('%s' % self._id_to_variables[index])
+            element >>= 1
             index += 1
-        result += '}'
-        return result
-    
+        return '{%s}' % ', '.join(variables)
+
     # Algebraic operations
-    
+
     def get_top(self):
-        result = BitVector(size=self._var_index)
-        result.reset(1)
-        print result
-        print self._id_to_variables
-        return result
-    
+        return (1 << self._var_index) - 1
+
     def get_bot(self):
-        result = BitVector(size=self._var_index)
-        result.reset(0)
-        return result
+        return 0
 
     def is_subseteq(self, element1, element2):
-        return element1 <= element2
-    
+        return element1 & ~element2 == 0
+
     def is_eq(self, element1, element2):
         return element1 == element2
-        
+
     def union(self, element1, element2):
         return element1 | element2
-    
+
     def intersect(self, element1, element2):
         return element1 & element2
-    
+
     def widen(self, element1, element2):
         return element1 | element2
-    
+
     # Semantics of the abstract machine
 
     def op_load_constant(self, element, target_var, constant):
@@ -86,33 +109,48 @@ class LiveVarsDomainFactory(domain_factory.DomainFactory):
         # <START> \ { target_var }
         # target_var = constant
         # <START>
-        result = element.deep_copy()
-        result[self._variables_to_id[target_var]] = 0
-        return result
-        
+        return element & ~self._mask([target_var])
+
+    def op_load_variable(self, element, target_var, source_var):
+        # effect:
+        # (<START> \ { target_var }) U { source_var }
+        # target_var = source_var
+        # <START>
+        return ((element & ~self._mask([target_var]))
+                | self._mask([source_var]))
+
     def op_binary(self, element, operator, target_var, op1, op2):
         # effect:
-        # (<START> U {op1, op2}) \ { target_var }
+        # (<START> \ { target_var }) U {op1, op2}
         # target_var = op1 * op2
         # <START>
-        result = element.deep_copy()
-        result[self._variables_to_id[target_var]] = 0
-        for op in (op1, op2):
-            if op in self._variables_to_id:
-                result[self._variables_to_id[op]] = 1
-        return result
-        
+        return ((element & ~self._mask([target_var]))
+                | self._mask([op1, op2]))
+
     def cond_binary(self, element, operator, op1, op2):
         # effect:
-        # (<START> U {op1, op2}) 
+        # (<START> U {op1, op2})
         # condition: op1 * op2
         # <START>
-        result = element.deep_copy()
-        for op in (op1, op2):
-            if op in self._variables_to_id:
-                result[self._variables_to_id[op]] = 1
-        return result
-      
+        return element | self._mask([op1, op2])
+
+    def project_var(self, element, variable):
+        # nothing known: variable may be live
+        return element | self._mask([variable])
+
+    def compile_block(self, operations):
+        ''' The operations of a block are folded into a single pair of
+        gen and kill masks. '''
+        (gen, kill) = (0, 0)
+        for operation in operations:
+            (op_gen, op_kill) = self._gen_kill(operation[0], operation[1:])
+            gen = (gen & ~op_kill) | op_gen
+            kill |= op_kill
+        keep = ~kill
+        def transfer(element):
+            return (element & keep) | gen
+        return transfer
+
 
 if __name__ == '__main__':
     dom = LiveVarsDomainFactory()
@@ -0,0 +1,361 @@
+###########################################
+#
+# packed_dbms.py
+#
+# Difference bound matrices on variable
+# packs, intervals for all other variables
+#
+# (C) 2016, Andreas Gaiser
+###########################################
+
+import numbers
+import domain_factory
+import thresholds
+import boxes
+import dbm
+import dbms
+
+
+class PackedElement(object):
+    ''' One DBM element per pack plus a box element for the
+    variables not contained in any pack. '''
+
+    def __init__(self, box, packs):
+        self.box = box
+        self.packs = packs
+
+
+class PackedDBMFactory(domain_factory.DomainFactory):
+
+    threshold_widening = True
+
+    def __init__(self, DEFAULT_MAX_VALUE, DEFAULT_MIN_VALUE, packs,
+                 dbm_class=dbm.DBM, closure_strategy=None):
+        ''' packs is a list of variable lists, e.g. computed by
+        analysis.packing.VariablePacking. dbm_class and
+        closure_strategy are passed on to the DBMFactory of each
+        pack. '''
+        self.variables = {}
+        self.DEFAULT_MAX_VALUE = DEFAULT_MAX_VALUE
+        self.DEFAULT_MIN_VALUE = DEFAULT_MIN_VALUE
+        self.constants = []
+        self._box_factory = boxes.BoxDomainFactory(DEFAULT_MIN_VALUE,
+                                                   DEFAULT_MAX_VALUE)
+        self._pack_factories = []
+        self._pack_of = {}
+        for pack in packs:
+            factory = dbms.DBMFactory(DEFAULT_MAX_VALUE,
+                                      DEFAULT_MIN_VALUE,
+                                      dbm_class,
+                                      closure_strategy=closure_strategy)
+            for v in pack:
+                self._pack_of[v] = len(self._pack_factories)
+            self._pack_factories.append(factory)
+
+    # Private methods
+
+    def _is_literal(self, value):
+        return isinstance(value, numbers.Number)
+
+    def _normalize(self, element):
+        ''' Return None if some component of element is empty. '''
+        if element is None or element.box.ranges is None:
+            return None
+        packs = []
+        for (factory, pack_element) in zip(self._pack_factories,
+                                           element.packs):
+            pack_element = factory._normalize(pack_element)
+            if pack_element is None:
+                return None
+            packs.append(pack_element)
+        return PackedElement(element.box, packs)
+
+    def _with_box(self, element, box):
+        if box.ranges is None:
+            return None
+        return PackedElement(box, element.packs)
+
+    def _with_pack(self, element, index, pack_element):
+        if pack_element is None:
+            return None
+        packs = list(element.packs)
+        packs[index] = pack_element
+        return PackedElement(element.box, packs)
+
+    def _domain_of(self, value):
+        ''' Pack index of value, None for unpacked variables and -1
+        for literals. '''
+        if self._is_literal(value):
+            return -1
+        return self._pack_of.get(value)
+
+    def _common_domain(self, *values):
+        ''' The domain all variables in values belong to, -2 if
+        they belong to different ones. '''
+        domains = set(self._domain_of(v) for v in values)
+        domains.discard(-1)
+        if len(domains) == 0:
+            return None
+        if len(domains) > 1:
+            return -2
+        return domains.pop()
+
+    def _interval(self, element, value):
+        if self._is_literal(value):
+            return (value, value)
+        index = self._domain_of(value)
+        if index is None:
+            return self._box_factory._interval(element.box, value)
+        pack_element = self._pack_factories[index]._normalize(
+            element.packs[index])
+        # variables not added to the factory have the default bounds
+        (left, right) = self.variables.get(
+            value, (self._box_factory.DEFAULT_MIN_VALUE,
+                    self._box_factory.DEFAULT_MAX_VALUE))
+        upper = pack_element.get_weight(value, 0)
+        lower = pack_element.get_weight(0, value)
+        if upper is not None:
+            right = upper
+        if lower is not None:
+            left = -lower
+        return (left, right)
+
+    def _assign_interval(self, element, target_var, operator, i1, i2):
+        ''' Assign "i1 operator i2" to target_var, i1 and i2 being
+        the intervals of operands from different domains. '''
+        index = self._domain_of(target_var)
+        if index is None:
+            return self._with_box(element,
+                                  self._box_factory._op_binary_intervals(
+                                      element.box, operator, target_var,
+                                      i1, i2))
+        factory = self._pack_factories[index]
+        return self._with_pack(element, index,
+                               factory._op_binary_intervals(
+                                   element.packs[index], operator,
+                                   target_var, i1, i2))
+
+    def _cond_on(self, element, operator, variable, constant):
+        ''' Apply "variable operator constant" to the domain of
+        variable. '''
+        index = self._domain_of(variable)
+        if index is None:
+            return self._with_box(element,
+                                  self._box_factory.cond_binary(
+                                      element.box, operator,
+                                      variable, constant))
+        factory = self._pack_factories[index]
+        return self._with_pack(element, index,
+                               factory.cond_binary(element.packs[index],
+                                                   operator,
+                                                   variable,
+                                                   constant))
+
+    # Public methods
+
+    def add_constant(self, constant):
+        thresholds.add_threshold(self.constants, constant)
+        self._box_factory.add_constant(constant)
+        for factory in self._pack_factories:
+            factory.add_constant(constant)
+
+    def close(self):
+        ''' Release the resources of the closure strategy of the
+        packs. '''
+        for factory in self._pack_factories:
+            factory.close()
+
+    # Variable handling
+
+    def add_integer_var(self, variable, min_val, max_val):
+        self.variables[variable] = (min_val, max_val)
+        index = self._pack_of.get(variable)
+        if index is None:
+            self._box_factory.add_integer_var(variable, min_val, max_val)
+        else:
+            factory = self._pack_factories[index]
+            factory.add_integer_var(variable, min_val, max_val)
+
+    def add_bool_var(self, variable):
+        self.add_integer_var(variable, 0, 1)
+
+    # I/O
+
+    def to_string(self, element):
+        element = self._normalize(element)
+        if element is None:
+            return '<BOT>'
+        result = self._box_factory.to_string(element.box)
+        for (factory, pack_element) in zip(self._pack_factories,
+                                           element.packs):
+            result += ' ' + factory.to_string(pack_element)
+        return result
+
+    # Algebraic operations
+
+    def get_top(self):
+        return PackedElement(self._box_factory.get_top(),
+                             [factory.get_top()
+                              for factory in self._pack_factories])
+
+    def get_bot(self):
+        return None
+
+    def is_subseteq(self, element1, element2):
+        s1 = self._normalize(element1)
+        s2 = self._normalize(element2)
+        if s1 is None:
+            return True
+        if s2 is None:
+            return False
+        if not self._box_factory.is_subseteq(s1.box, s2.box):
+            return False
+        for (factory, p1, p2) in zip(self._pack_factories,
+                                     s1.packs, s2.packs):
+            if not factory.is_subseteq(p1, p2):
+                return False
+        return True
+
+    def is_eq(self, element1, element2):
+        return (self.is_subseteq(element1, element2)
+                and self.is_subseteq(element2, element1))
+
+    def union(self, element1, element2):
+        s1 = self._normalize(element1)
+        s2 = self._normalize(element2)
+        if s1 is None:
+            return s2
+        if s2 is None:
+            return s1
+        return PackedElement(self._box_factory.union(s1.box, s2.box),
+                             [factory.union(p1, p2)
+                              for (factory, p1, p2)
+                              in zip(self._pack_factories,
+                                     s1.packs, s2.packs)])
+
+    def intersect(self, element1, element2):
+        if element1 is None or element2 is None:
+            return None
+        return self._normalize(
+            PackedElement(self._box_factory.intersect(element1.box,
+                                                      element2.box),
+                          [factory.intersect(p1, p2)
+                           for (factory, p1, p2)
+                           in zip(self._pack_factories,
+                                  element1.packs, element2.packs)]))
+
+    def widen(self, element1, element2):
+        if element1 is None:
+            return element2
+        if self._normalize(element2) is None:
+            return element1
+        return PackedElement(self._box_factory.widen(element1.box,
+                                                     element2.box),
+                             [factory.widen(p1, p2)
+                              for (factory, p1, p2)
+                              in zip(self._pack_factories,
+                                     element1.packs, element2.packs)])
+
+    # Semantics of the abstract machine
+
+    def op_load_constant(self, element, target_var, constant):
+        element = self._normalize(element)
+        if element is None:
+            return None
+        index = self._domain_of(target_var)
+        if index is None:
+            return self._with_box(element,
+                                  self._box_factory.op_load_constant(
+                                      element.box, target_var, constant))
+        factory = self._pack_factories[index]
+        return self._with_pack(element, index,
+                               factory.op_load_constant(
+                                   element.packs[index],
+                                   target_var, constant))
+
+    def op_load_variable(self, element, target_var, source_var):
+        return self.op_binary(element, '+', target_var, source_var, 0)
+
+    def op_binary(self,
+                  element,
+                  operator,
+                  target_var,
+                  op1,
+                  op2):
+        element = self._normalize(element)
+        if element is None:
+            return None
+        index = self._common_domain(target_var, op1, op2)
+        if index is None:
+            return self._with_box(element,
+                                  self._box_factory.op_binary(
+                                      element.box, operator,
+                                      target_var, op1, op2))
+        elif index >= 0:
+            factory = self._pack_factories[index]
+            return self._with_pack(element, index,
+                                   factory.op_binary(element.packs[index],
+                                                     operator,
+                                                     target_var,
+                                                     op1,
+                                                     op2))
+        # operands from different domains: use their intervals
+        return self._assign_interval(element,
+                                     target_var,
+                                     operator,
+                                     self._interval(element, op1),
+                                     self._interval(element, op2))
+
+    def cond_binary(self,
+                    element,
+                    operator,
+                    op1,
+                    op2):
+        element = self._normalize(element)
+        if element is None:
+            return None
+        index = self._common_domain(op1, op2)
+        if index is None:
+            return self._with_box(element,
+                                  self._box_factory.cond_binary(
+                                      element.box, operator, op1, op2))
+        elif index >= 0:
+            factory = self._pack_factories[index]
+            return self._with_pack(element, index,
+                                   factory.cond_binary(element.packs[index],
+                                                       operator,
+                                                       op1,
+                                                       op2))
+        # variables from different domains: bound each of them
+        # by the interval of the other one
+        if operator == '>':
+            return self.cond_binary(element, '<', op2, op1)
+        elif operator == '>=':
+            return self.cond_binary(element, '<=', op2, op1)
+        elif operator == '==':
+            return self.cond_binary(self.cond_binary(element, '<=', op1, op2),
+                                    '>=', op1, op2)
+        elif operator == '!=':
+            return element
+        (l1, r1) = self._interval(element, op1)
+        (l2, r2) = self._interval(element, op2)
+        element = self._cond_on(element, operator, op1, r2)
+        if element is None:
+            return None
+        return self._cond_on(element,
+                             '>' if operator == '<' else '>=',
+                             op2, l1)
+
+    def project_var(self, element, variable):
+        element = self._normalize(element)
+        if element is None:
+            return None
+        index = self._domain_of(variable)
+        if index is None:
+            return self._with_box(element,
+                                  self._box_factory.project_var(
+                                      element.box, variable))
+        factory = self._pack_factories[index]
+        return self._with_pack(element, index,
+                               factory.project_var(element.packs[index],
+                                                   variable))
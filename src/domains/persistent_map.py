@@ -0,0 +1,272 @@
+##############################
+#
+# persistent_map.py
+#
+# Persistent maps on array
+# mapped tries
+#
+# (C) 2016, Andreas Gaiser
+##############################
+
+''' Maps from non-negative integers (dense ids) to values,
+represented by tries with 32 children per node. Tries are never
+modified: an update copies the nodes on the path to the key and
+shares all other nodes with the old trie, and merges skip nodes that
+are shared by both operands. Inner nodes are tuples, leaves are
+dicts holding the entries of up to 32 consecutive keys. '''
+
+BITS = 5
+WIDTH = 1 << BITS
+_EMPTY_NODE = (None,) * WIDTH
+
+# only1 / only2 arguments of merge: keep or drop the keys that occur
+# in one of the maps only
+KEEP = 'keep'
+DROP = 'drop'
+
+
+def _lookup(node, shift, key, default):
+    while shift:
+        node = node[(key >> shift) & (WIDTH - 1)]
+        if node is None:
+            return default
+        shift -= BITS
+    return node.get(key, default)
+
+def _insert(node, shift, key, value):
+    if shift == 0:
+        leaf = dict(node) if node is not None else {}
+        leaf[key] = value
+        return leaf
+    if node is None:
+        node = _EMPTY_NODE
+    i = (key >> shift) & (WIDTH - 1)
+    return node[:i] + (_insert(node[i], shift - BITS, key, value),) \
+        + node[i + 1:]
+
+def _remove(node, shift, key):
+    ''' Return the node without key, None if it becomes empty. '''
+    if shift == 0:
+        leaf = dict(node)
+        del leaf[key]
+        return leaf or None
+    i = (key >> shift) & (WIDTH - 1)
+    child = _remove(node[i], shift - BITS, key)
+    node = node[:i] + (child,) + node[i + 1:]
+    if child is None and node == _EMPTY_NODE:
+        return None
+    return node
+
+def _update(node, shift, items):
+    ''' Return node with the (key, value) items set, or removed for
+    value None; node itself if nothing changes. '''
+    if shift == 0:
+        leaf = dict(node) if node is not None else {}
+        changed = False
+        for (key, value) in items:
+            old = leaf.get(key)
+            if value is None:
+                if old is not None:
+                    del leaf[key]
+                    changed = True
+            elif old is not value and old != value:
+                leaf[key] = value
+                changed = True
+        if not changed:
+            return node
+        return leaf or None
+    groups = {}
+    for item in items:
+        groups.setdefault((item[0] >> shift) & (WIDTH - 1), []).append(item)
+    children = list(node if node is not None else _EMPTY_NODE)
+    changed = False
+    for (i, group) in groups.iteritems():
+        child = _update(children[i], shift - BITS, group)
+        if child is not children[i]:
+            children[i] = child
+            changed = True
+    if not changed:
+        return node
+    children = tuple(children)
+    if children == _EMPTY_NODE:
+        return None
+    return children
+
+def _items(node, shift):
+    if node is None:
+        return
+    if shift == 0:
+        for item in node.iteritems():
+            yield item
+        return
+    for child in node:
+        if child is not None:
+            for item in _items(child, shift - BITS):
+                yield item
+
+def _only(node, action):
+    return node if action is KEEP else None
+
+def _merge(node1, node2, shift, both, only1, only2):
+    if node1 is node2:
+        return node1
+    if node1 is None:
+        return _only(node2, only2)
+    if node2 is None:
+        return _only(node1, only1)
+    if shift == 0:
+        result = {}
+        if only2 is KEEP:
+            result.update(node2)
+        if only1 is KEEP:
+            result.update(node1)
+        for (key, value1) in node1.iteritems():
+            value2 = node2.get(key)
+            if value2 is None:
+                continue
+            value = value1 if value1 is value2 else both(key, value1,
+                                                         value2)
+            if value is None:
+                result.pop(key, None)
+            else:
+                result[key] = value
+        return result or None
+    children = tuple(_merge(child1, child2, shift - BITS,
+                            both, only1, only2)
+                     for (child1, child2) in zip(node1, node2))
+    if children == _EMPTY_NODE:
+        return None
+    return children
+
+def _differences(node1, node2, shift):
+    stack = [(node1, node2, shift)]
+    while stack:
+        (node1, node2, shift) = stack.pop()
+        if node1 is None or node2 is None:
+            for (key, value) in _items(node1 or node2, shift):
+                if node1 is None:
+                    yield (key, None, value)
+                else:
+                    yield (key, value, None)
+        elif shift == 0:
+            for (key, value1) in node1.iteritems():
+                value2 = node2.get(key)
+                if value1 is not value2:
+                    yield (key, value1, value2)
+            for (key, value2) in node2.iteritems():
+                if key not in node1:
+                    yield (key, None, value2)
+        else:
+            for (child1, child2) in zip(node1, node2):
+                if child1 is not child2:
+                    stack.append((child1, child2, shift - BITS))
+
+
+class PersistentMap(object):
+    ''' Immutable map from non-negative integers to values (which
+    must not be None). The update methods return new maps sharing
+    structure with self. '''
+
+    __slots__ = ['_root', '_shift', '_size']
+
+    def __init__(self, root=None, shift=0, size=0):
+        self._root = root
+        self._shift = shift
+        # number of entries, None if not counted yet
+        self._size = size
+
+    def _lifted(self, shift):
+        ''' Root of self as a trie with the given (larger) shift. '''
+        root = self._root
+        if root is not None:
+            for _ in xrange((shift - self._shift) // BITS):
+                root = (root,) + _EMPTY_NODE[1:]
+        return root
+
+    def get(self, key, default=None):
+        if key >> (self._shift + BITS):
+            return default
+        if self._root is None:
+            return default
+        return _lookup(self._root, self._shift, key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        if self._size is None:
+            self._size = sum(1 for _ in self.items())
+        return self._size
+
+    def __iter__(self):
+        for (key, value) in self.items():
+            yield key
+
+    def items(self):
+        return _items(self._root, self._shift)
+
+    def set(self, key, value):
+        old = self.get(key)
+        if old is value or old == value:
+            return self
+        shift = self._shift
+        while key >> (shift + BITS):
+            shift += BITS
+        size = self._size
+        if size is not None and old is None:
+            size += 1
+        return PersistentMap(_insert(self._lifted(shift), shift, key, value),
+                             shift, size)
+
+    def remove(self, key):
+        if self.get(key) is None:
+            return self
+        size = self._size
+        if size is not None:
+            size -= 1
+        return PersistentMap(_remove(self._root, self._shift, key),
+                             self._shift, size)
+
+    def update(self, items):
+        ''' Set the keys of the (key, value) items at once, removing
+        the keys whose value is None. Nodes on paths shared by several
+        keys are copied only once. '''
+        shift = self._shift
+        for (key, value) in items:
+            while value is not None and key >> (shift + BITS):
+                shift += BITS
+        items = [(key, value) for (key, value) in items
+                 if not key >> (shift + BITS)]
+        if not items:
+            return self
+        root = _update(self._lifted(shift), shift, items)
+        if root is self._root and shift == self._shift:
+            return self
+        return PersistentMap(root, shift, None if root is not None else 0)
+
+    def merge(self, other, both, only1=KEEP, only2=KEEP):
+        ''' Merge two maps. Keys occuring in both maps get the value
+        both(key, value1, value2), or are dropped if it returns None;
+        only1 and only2 (KEEP or DROP) decide about the other keys.
+        Parts shared by both maps are kept as they are, so both must
+        satisfy both(key, v, v) == v. '''
+        if self._root is other._root and self._shift == other._shift:
+            return self
+        shift = max(self._shift, other._shift)
+        root = _merge(self._lifted(shift), other._lifted(shift), shift,
+                      both, only1, only2)
+        return PersistentMap(root, shift, None if root is not None else 0)
+
+    def differences(self, other):
+        ''' Iterate (key, value1, value2) for all keys whose values are
+        not identical in both maps, None standing for a missing value.
+        Parts shared by both maps are skipped. '''
+        shift = max(self._shift, other._shift)
+        return _differences(self._lifted(shift), other._lifted(shift),
+                            shift)
@@ -0,0 +1,589 @@
+###########################################
+#
+# sparse_zones.py
+#
+# Sparse zone domain (difference bound
+# matrices in split normal form)
+#
+# (C) 2016, Andreas Gaiser
+###########################################
+
+import numbers
+import domain_factory
+import thresholds
+
+# the special node representing the constant 0
+ZERO = 0
+
+
+class SparseZone(object):
+    ''' A zone in split normal form. Bounds against ZERO are kept
+    separately from the relational edges x - y <= c; a relational
+    edge is only stored if it is strictly tighter than the one
+    implied by the bounds of x and y. Only the edges that exist are
+    stored, as adjacency dicts in both directions. '''
+
+    def __init__(self):
+        self.upper = {}   # x <= upper[x]
+        self.lower = {}   # x >= lower[x]
+        self.succ = {}    # succ[x][y] = c  <=>  x - y <= c
+        self.pred = {}    # pred[y][x] = c  <=>  x - y <= c
+        # True if the zone is in (closed) split normal form
+        self.closed = True
+        # cached closed form and emptiness, None if not computed yet
+        self._closure = None
+        self._empty = False
+
+    def copy(self):
+        ''' Return a copy of the zone. '''
+        result = SparseZone()
+        result.upper = dict(self.upper)
+        result.lower = dict(self.lower)
+        for x in self.succ:
+            result.succ[x] = dict(self.succ[x])
+        for y in self.pred:
+            result.pred[y] = dict(self.pred[y])
+        result.closed = self.closed
+        result._closure = self._closure
+        result._empty = self._empty
+        return result
+
+    # Edge handling
+
+    def _invalidate(self):
+        self.closed = False
+        self._closure = None
+        self._empty = None
+
+    def _set_edge(self, x, c, y):
+        self.succ.setdefault(x, {})[y] = c
+        self.pred.setdefault(y, {})[x] = c
+
+    def _remove_edge(self, x, y):
+        del self.succ[x][y]
+        del self.pred[y][x]
+
+    def _implied(self, x, y):
+        ''' Weight of x - y implied by the bounds of x and y. '''
+        if x in self.upper and y in self.lower:
+            return self.upper[x] - self.lower[y]
+        return None
+
+    def set_weight(self, x, c, y):
+        ''' Add the constraint x - y <= c without restoring the
+        normal form. '''
+        self._invalidate()
+        if x == ZERO:
+            if y not in self.lower or -c > self.lower[y]:
+                self.lower[y] = -c
+        elif y == ZERO:
+            if x not in self.upper or c < self.upper[x]:
+                self.upper[x] = c
+        else:
+            existing = self.succ.get(x, {}).get(y)
+            if existing is None or c < existing:
+                self._set_edge(x, c, y)
+
+    def get_weight(self, x, y):
+        ''' Weight of x - y in a closed zone, None if unbounded. '''
+        if x == y:
+            return 0
+        if x == ZERO:
+            if y in self.lower:
+                return -self.lower[y]
+            return None
+        if y == ZERO:
+            return self.upper.get(x)
+        direct = self.succ.get(x, {}).get(y)
+        implied = self._implied(x, y)
+        if direct is None:
+            return implied
+        if implied is None:
+            return direct
+        return min(direct, implied)
+
+    def constraints(self):
+        ''' Iterate all explicit constraints as (x, c, y) triples,
+        meaning x - y <= c. '''
+        for x in self.upper:
+            yield (x, self.upper[x], ZERO)
+        for y in self.lower:
+            yield (ZERO, -self.lower[y], y)
+        for x in self.succ:
+            for y in self.succ[x]:
+                yield (x, self.succ[x][y], y)
+
+    def edge_count(self):
+        ''' Number of explicit constraints. '''
+        return (len(self.upper) + len(self.lower)
+                + sum(len(targets) for targets in self.succ.itervalues()))
+
+    # Normal form
+
+    def _drop_implied(self, rows, columns):
+        ''' Remove relational edges in the given rows / columns that
+        are no tighter than their bound-implied weight. '''
+        for x in rows:
+            for (y, c) in self.succ.get(x, {}).items():
+                implied = self._implied(x, y)
+                if implied is not None and c >= implied:
+                    self._remove_edge(x, y)
+        for y in columns:
+            for (x, c) in self.pred.get(y, {}).items():
+                implied = self._implied(x, y)
+                if implied is not None and c >= implied:
+                    self._remove_edge(x, y)
+
+    def _close_relations(self):
+        ''' Sparse Floyd-Warshall over the relational edges. Returns
+        False iff a negative cycle is found. '''
+        nodes = set(self.succ) & set(self.pred)
+        for k in nodes:
+            preds = self.pred[k].items()
+            succs = self.succ[k].items()
+            for (i, a) in preds:
+                for (j, b) in succs:
+                    distance = a + b
+                    if i == j:
+                        if distance < 0:
+                            return False
+                        continue
+                    existing = self.succ.get(i, {}).get(j)
+                    if existing is None or distance < existing:
+                        self._set_edge(i, distance, j)
+        return True
+
+    def _close_bounds(self):
+        ''' Tighten the bounds along the (closed) relational edges.
+        Returns False iff some variable has an empty range. '''
+        upper = dict(self.upper)
+        lower = dict(self.lower)
+        for x in self.succ:
+            for (y, c) in self.succ[x].iteritems():
+                if y in self.upper:
+                    bound = c + self.upper[y]
+                    if x not in upper or bound < upper[x]:
+                        upper[x] = bound
+                if x in self.lower:
+                    bound = self.lower[x] - c
+                    if y not in lower or bound > lower[y]:
+                        lower[y] = bound
+        self.upper = upper
+        self.lower = lower
+        for x in upper:
+            if x in lower and upper[x] < lower[x]:
+                return False
+        return True
+
+    def closure(self):
+        ''' Return the zone in split normal form, None if it is
+        empty. The result is cached until the next set_weight. '''
+        if self.closed:
+            return self
+        if self._empty is None:
+            result = self.copy()
+            self._empty = not (result._close_relations()
+                               and result._close_bounds())
+            if not self._empty:
+                result._drop_implied(list(result.succ), list(result.pred))
+                result.closed = True
+                result._empty = False
+                self._closure = result
+        if self._empty:
+            return None
+        return self._closure
+
+    def tighten(self, x, c, y):
+        ''' Add the constraint x - y <= c to a closed zone, closing
+        only the rows and columns affected. Returns False iff the
+        zone becomes empty. '''
+        if x == y:
+            return c >= 0
+        back = self.get_weight(y, x)
+        if back is not None and back + c < 0:
+            return False
+        current = self.get_weight(x, y)
+        if current is not None and current <= c:
+            return True
+        # x and everything with a path to x, y and everything
+        # reachable from y
+        preds = [] if x == ZERO else [(x, 0)] + self.pred.get(x, {}).items()
+        succs = [] if y == ZERO else [(y, 0)] + self.succ.get(y, {}).items()
+        rows = []
+        columns = []
+        if x == ZERO:
+            # lower bound y >= -c
+            for (j, b) in succs:
+                if j not in self.lower or -(c + b) > self.lower[j]:
+                    self.lower[j] = -(c + b)
+                    columns.append(j)
+        elif y == ZERO:
+            # upper bound x <= c
+            for (i, a) in preds:
+                if i not in self.upper or a + c < self.upper[i]:
+                    self.upper[i] = a + c
+                    rows.append(i)
+        else:
+            upper_y = self.upper.get(y)
+            lower_x = self.lower.get(x)
+            if upper_y is not None:
+                for (i, a) in preds:
+                    bound = a + c + upper_y
+                    if i not in self.upper or bound < self.upper[i]:
+                        self.upper[i] = bound
+                        rows.append(i)
+            if lower_x is not None:
+                for (j, b) in succs:
+                    bound = lower_x - c - b
+                    if j not in self.lower or bound > self.lower[j]:
+                        self.lower[j] = bound
+                        columns.append(j)
+            for (i, a) in preds:
+                for (j, b) in succs:
+                    if i == j:
+                        continue
+                    distance = a + c + b
+                    existing = self.get_weight(i, j)
+                    if existing is None or distance < existing:
+                        self._set_edge(i, distance, j)
+        self._drop_implied(rows, columns)
+        self.closed = True
+        self._closure = None
+        self._empty = False
+        return True
+
+    def forget(self, variable):
+        ''' Remove all constraints on variable; keeps the normal
+        form. '''
+        self.upper.pop(variable, None)
+        self.lower.pop(variable, None)
+        for y in self.succ.pop(variable, {}):
+            del self.pred[y][variable]
+        for x in self.pred.pop(variable, {}):
+            del self.succ[x][variable]
+        self._closure = None
+
+    def translate(self, variable, c):
+        ''' Effect variable = variable + c; keeps the normal form. '''
+        if variable in self.upper:
+            self.upper[variable] += c
+        if variable in self.lower:
+            self.lower[variable] += c
+        for y in self.succ.get(variable, {}):
+            self.succ[variable][y] += c
+            self.pred[y][variable] += c
+        for x in self.pred.get(variable, {}):
+            self.pred[variable][x] -= c
+            self.succ[x][variable] -= c
+        self._closure = None
+
+
+class SparseZoneFactory(domain_factory.DomainFactory):
+
+    threshold_widening = True
+
+    def __init__(self, DEFAULT_MAX_VALUE, DEFAULT_MIN_VALUE):
+        self.variables = {}
+        self.DEFAULT_MAX_VALUE = DEFAULT_MAX_VALUE
+        self.DEFAULT_MIN_VALUE = DEFAULT_MIN_VALUE
+        self.constants = []
+        self.variables[ZERO] = (0, 0)
+
+    # Private methods
+
+    def _normalize(self, element):
+        if element is None:
+            return None
+        return element.closure()
+
+    def _is_literal(self, value):
+        return isinstance(value, numbers.Number)
+
+    def _threshold(self, x, weight, y):
+        ''' Widened weight of the unstable constraint x - y <= weight:
+        the nearest constant beyond the bound for variable bounds,
+        None (no constraint) otherwise. '''
+        if y == ZERO and x != ZERO:
+            bound = thresholds.threshold_above(self.constants, weight)
+            if bound is not None and bound <= self.variables[x][1]:
+                return bound
+        elif x == ZERO and y != ZERO:
+            bound = thresholds.threshold_below(self.constants, -weight)
+            if bound is not None and bound >= self.variables[y][0]:
+                return -bound
+        return None
+
+    def _interval(self, element, variable):
+        ''' Get an approximation of the possible values for
+        a variable. '''
+        (left, right) = self.variables[variable]
+        if variable in element.lower:
+            left = element.lower[variable]
+        if variable in element.upper:
+            right = element.upper[variable]
+        return (left, right)
+
+    def _guard(self, element, x, y, c):
+        ''' Effect x - y <= c on element. '''
+        element = self._normalize(element)
+        if element is None:
+            return None
+        current = element.get_weight(x, y)
+        if current is not None and current <= c:
+            return element
+        result = element.copy()
+        if not result.tighten(x, c, y):
+            return None
+        return result
+
+    def _assign_interval(self, element, target_var, interval):
+        result = element.copy()
+        result.forget(target_var)
+        (cl, cr) = interval
+        if cl is not None and not result.tighten(ZERO, -cl, target_var):
+            return None
+        if cr is not None and not result.tighten(target_var, cr, ZERO):
+            return None
+        return result
+
+    def _op_binary_intervals(self, operator, interval1, interval2):
+        ''' Interval of "i1 (+) i2", None if it is empty (division
+        by zero). '''
+        (l1, r1) = interval1
+        (l2, r2) = interval2
+        if operator == '*':
+            return (min(l1*l2, r1*r2, l1*r2, l2*r1),
+                    max(l1*l2, r1*r2, l1*r2, l2*r1))
+        elif operator == '+':
+            return (l1+l2, r1+r2)
+        elif operator == '-':
+            return (l1-r2, r1-l2)
+        elif operator == '%':
+            if r2-l2 == 0 and r2 == 0:
+                return None
+            if r2-l2 == 0 and r1-l1 == 0:
+                return (r1 % r2, r1 % r2)
+            max_el = max(abs(l2), abs(r2))-1
+            if l1 >= 0:
+                return (0, max_el)
+            return (-max_el, max_el)
+        raise ValueError('Unknown operator: %s' % operator)
+
+    # Public methods
+
+    def add_constant(self, constant):
+        thresholds.add_threshold(self.constants, constant)
+
+    # Variable handling
+
+    def add_integer_var(self, variable, min_val, max_val):
+        self.variables[variable] = (min_val, max_val)
+
+    def add_bool_var(self, variable):
+        self.add_integer_var(variable, 0, 1)
+
+    # I/O
+
+    def to_string(self, element):
+        element = self._normalize(element)
+        if element is None:
+            return '<BOT>'
+        constraints = ["%s - %s <= %s" % (x, y, c)
+                       for (x, c, y) in element.constraints()]
+        if len(constraints) == 0:
+            return '<TOP>'
+        return '[%s]' % ', '.join(sorted(constraints))
+
+    # Algebraic operations
+
+    def get_top(self):
+        return SparseZone()
+
+    def get_bot(self):
+        return None
+
+    def is_subseteq(self, element1, element2):
+        s1 = self._normalize(element1)
+        if s1 is None:
+            return True
+        if self._normalize(element2) is None:
+            return False
+        for (x, c, y) in element2.constraints():
+            weight = s1.get_weight(x, y)
+            if weight is None or weight > c:
+                return False
+        return True
+
+    def is_eq(self, element1, element2):
+        return (self.is_subseteq(element1, element2)
+                and self.is_subseteq(element2, element1))
+
+    def union(self, element1, element2):
+        ''' Join of the two zones. Besides the explicit edges of both
+        zones, only pairs (x, y) where the upper bound of x and the
+        lower bound of y differ between the zones can get a relation
+        tighter than the one implied by the joined bounds. '''
+        s1 = self._normalize(element1)
+        s2 = self._normalize(element2)
+        if s1 is None:
+            return s2
+        if s2 is None:
+            return s1
+        result = SparseZone()
+        for x in s1.upper:
+            if x in s2.upper:
+                result.upper[x] = max(s1.upper[x], s2.upper[x])
+        for x in s1.lower:
+            if x in s2.lower:
+                result.lower[x] = min(s1.lower[x], s2.lower[x])
+        changed_upper = [x for x in result.upper
+                         if s1.upper[x] != s2.upper[x]]
+        changed_lower = [y for y in result.lower
+                         if s1.lower[y] != s2.lower[y]]
+        candidates = [(x, y) for x in changed_upper for y in changed_lower]
+        for s in (s1, s2):
+            for x in s.succ:
+                candidates.extend((x, y) for y in s.succ[x])
+        for (x, y) in candidates:
+            if x == y:
+                continue
+            w1 = s1.get_weight(x, y)
+            w2 = s2.get_weight(x, y)
+            if w1 is None or w2 is None:
+                continue
+            weight = max(w1, w2)
+            implied = result._implied(x, y)
+            if implied is None or weight < implied:
+                result._set_edge(x, weight, y)
+        result._close_relations()
+        result._drop_implied(list(result.succ), [])
+        return result
+
+    def intersect(self, element1, element2):
+        s1 = self._normalize(element1)
+        if s1 is None or element2 is None:
+            return None
+        result = s1.copy()
+        for (x, c, y) in element2.constraints():
+            if not result.tighten(x, c, y):
+                return None
+        return result
+
+    def widen(self, element1, element2):
+        if element1 is None:
+            return element2
+        s2 = self._normalize(element2)
+        if s2 is None:
+            return element1
+        # keep the stable constraints of element1, including those
+        # only implied by its bounds but explicit in element2; the
+        # result is deliberately not closed
+        result = SparseZone()
+        candidates = list(element1.constraints())
+        for x in s2.succ:
+            for y in s2.succ[x]:
+                candidates.append((x, element1.get_weight(x, y), y))
+        for (x, c, y) in candidates:
+            if c is None:
+                continue
+            weight = s2.get_weight(x, y)
+            if weight is None:
+                continue
+            if weight <= c:
+                result.set_weight(x, c, y)
+            else:
+                widened = self._threshold(x, weight, y)
+                if widened is not None:
+                    result.set_weight(x, widened, y)
+        return result
+
+    # Semantics of the abstract machine
+
+    def op_load_constant(self, element, target_var, constant):
+        element = self._normalize(element)
+        if element is None:
+            return None
+        return self._assign_interval(element, target_var,
+                                     (constant, constant))
+
+    def op_load_variable(self, element, target_var, source_var):
+        return self.op_binary(element, '+', target_var, source_var, 0)
+
+    def op_binary(self,
+                  element,
+                  operator,
+                  target_var,
+                  op1,
+                  op2):
+        element = self._normalize(element)
+        if element is None:
+            return None
+        if operator == '-' and self._is_literal(op2):
+            return self.op_binary(element, '+', target_var, op1, -op2)
+        if operator == '+' and self._is_literal(op1):
+            (op1, op2) = (op2, op1)
+        # special case: x = y + c
+        if operator == '+' and self._is_literal(op2):
+            if self._is_literal(op1):
+                return self._assign_interval(element, target_var,
+                                             (op1+op2, op1+op2))
+            result = element.copy()
+            if target_var == op1:
+                result.translate(target_var, op2)
+                return result
+            # forget x, then add: x - y <= c AND y - x <= -c
+            result.forget(target_var)
+            if (not result.tighten(target_var, op2, op1)
+                or not result.tighten(op1, -op2, target_var)):
+                return None
+            return result
+        if self._is_literal(op1):
+            i1 = (op1, op1)
+        else:
+            i1 = self._interval(element, op1)
+        if self._is_literal(op2):
+            i2 = (op2, op2)
+        else:
+            i2 = self._interval(element, op2)
+        interval = self._op_binary_intervals(operator, i1, i2)
+        if interval is None:
+            return None
+        return self._assign_interval(element, target_var, interval)
+
+    def cond_binary(self,
+                    element,
+                    operator,
+                    op1,
+                    op2):
+        if element is None:
+            return None
+        if operator == '>':
+            return self.cond_binary(element, '<', op2, op1)
+        elif operator == '>=':
+            return self.cond_binary(element, '<=', op2, op1)
+        elif operator == '==':
+            return self.cond_binary(self.cond_binary(element, '<=', op1, op2),
+                                    '>=', op1, op2)
+        elif operator == '!=':
+            # TODO: more precise handling!
+            return element
+        # x < y <=> x <= y - 1  <=> x - y <= -1
+        offset = -1 if operator == '<' else 0
+        if self._is_literal(op1) and self._is_literal(op2):
+            return element if op1 - op2 <= offset else None
+        elif self._is_literal(op1):
+            # c1 - y <= offset  <=>  0 - y <= offset - c1
+            return self._guard(element, ZERO, op2, offset - op1)
+        elif self._is_literal(op2):
+            # x - c2 <= offset  <=>  x - 0 <= c2 + offset
+            return self._guard(element, op1, ZERO, op2 + offset)
+        else:
+            return self._guard(element, op1, op2, offset)
+
+    def project_var(self, element, variable):
+        element = self._normalize(element)
+        if element is None:
+            return None
+        result = element.copy()
+        result.forget(variable)
+        return result
@@ -0,0 +1,33 @@
+##############################
+#
+# thresholds.py
+#
+# Widening thresholds: sorted
+# lists of constants
+#
+# (C) 2016, Andreas Gaiser
+##############################
+
+import bisect
+
+
+def add_threshold(thresholds, constant):
+    ''' Insert constant into the sorted list thresholds, unless it is
+    already contained. '''
+    i = bisect.bisect_left(thresholds, constant)
+    if i == len(thresholds) or thresholds[i] != constant:
+        thresholds.insert(i, constant)
+
+def threshold_above(thresholds, value):
+    ''' The least threshold >= value, None if there is none. '''
+    i = bisect.bisect_left(thresholds, value)
+    if i == len(thresholds):
+        return None
+    return thresholds[i]
+
+def threshold_below(thresholds, value):
+    ''' The greatest threshold <= value, None if there is none. '''
+    i = bisect.bisect_right(thresholds, value)
+    if i == 0:
+        return None
+    return thresholds[i - 1]
@@ -1,76 +1,346 @@
 ##############################
 #
-# andersen.py 
-#
-# Primitive implementation of
-# Andersen pointer analysis.
+# andersen.py
 #
+# Inclusion-based (Andersen)
+# pointer analysis.
 #
 # (C) 2016, Andreas Gaiser
 ##############################
 
+import collections
+from code_rep.instr import *
+from code_rep.type_system import Pointer
+
+# kinds of constraints
+ADDRESS = 'address'    # x := &y       y in pts(x)
+COPY = 'copy'          # x := y        pts(y) <= pts(x)
+LOAD = 'load'          # x := *y       pts(z) <= pts(x) for z in pts(y)
+STORE = 'store'        # *x := y       pts(y) <= pts(z) for z in pts(x)
+
+
+def locations(module):
+    ''' The abstract locations of module: parameters, local variables
+    and allocation sites (Alloc instructions). '''
+    result = []
+    for method in module.methods():
+        result.extend(method.parameters())
+        result.extend(method.local_variables())
+        result.extend(method.allocations())
+    return result
+
+
+def _bits(mask):
+    ''' The indices of the bits set in mask. '''
+    result = []
+    # sets are mostly small but wide: take the lowest bits one by one
+    # first, converting to a string only for many bits
+    while mask and len(result) < 32:
+        low = mask & -mask
+        result.append(low.bit_length() - 1)
+        mask ^= low
+    if not mask:
+        return result
+    digits = bin(mask)[:1:-1]
+    index = digits.find('1')
+    while index >= 0:
+        result.append(index)
+        index = digits.find('1', index + 1)
+    return result
+
+
+def _is_pointer(v):
+    return isinstance(v.get_type(), Pointer)
+
+
+def constraints(module):
+    ''' The points-to constraints of module as (kind, x, y) triples.
+    An allocation x := new T(n) makes x point to the Alloc
+    instruction; an invocation assigns the arguments to the
+    parameters and the return variable to the target variable. '''
+    result = []
+    for method in module.methods():
+        for block in method.blocks():
+            for instruction in block.instructions():
+                if isinstance(instruction, Address):
+                    result.append((ADDRESS, instruction.target,
+                                   instruction.rhs))
+                elif isinstance(instruction, Alloc):
+                    result.append((ADDRESS, instruction.target, instruction))
+                elif isinstance(instruction, DirectVariableAssignment):
+                    if _is_pointer(instruction.target):
+                        result.append((COPY, instruction.target,
+                                       instruction.source))
+                elif isinstance(instruction, Load):
+                    result.append((LOAD, instruction.target,
+                                   instruction.rhs))
+                elif isinstance(instruction, Store):
+                    if _is_pointer(instruction.rhs):
+                        result.append((STORE, instruction.target,
+                                       instruction.rhs))
+            for successor in method.successors(block):
+                invocation = method.get_edge(block, successor).invocation
+                if invocation is None:
+                    continue
+                invoked = invocation.invoked_method
+                for (arg, parameter) in zip(invocation.arguments,
+                                            invoked.parameters()):
+                    if _is_pointer(parameter):
+                        result.append((COPY, parameter, arg))
+                target = invocation.target_var
+                if target and invoked.return_variable and _is_pointer(target):
+                    result.append((COPY, target, invoked.return_variable))
+    return result
 
 
 class AndersenAnalysis(object):
-    
-    #
-    # Locations:
-    # - allocations ("new ...")
-    # - parameters
-    # - local variables
-    #
-
-    #
-    # PointsTo map:
-    # Locations --> Locations
-    #
-    #
-
-
-    def __init__(self, module):
-        self._module = module
-
-    def _compute_datalog_file(self):
-        #
-        # One relation PointsTo subseteq Locations X Locations
-        #
-        # Collect all locations
-        #
-        result = ''
-        locations = {}
-        inv_locations = {}
-        counter = 0
-        for method in self._module.methods():
-            for param in  method.parameters():
-                locations[counter] = param
-                inv_locations[param] = counter
-                counter += 1
-            for local_var in method.local_variables():
-                locations[counter] = local_var
-                inv_locations[local_var] = counter
-                counter += 1
-            for alloc in method.allocations():
-                locations[counter] = alloc
-                inv_locations[alloc] = counter
-                counter += 1
-
-        for l in locations:
-            print ('>%s' % l)
-
-        result += 'LOC %s\n' % len(locations)
-        result += 'PointsTo(x: LOC, y: LOC) printtuples\n'
-
-        for method in self._module.methods():
-            for block in method.blocks():
-                for instruction in block.instructions():
-                    if isinstance(instruction, Address):
-                        result += ('PointsTo("LOC%s", "LOC%s").\n' %
-                                   (inv_locations[instruction.target],
-                                    inv_locations[instruction.rhs]))
-                    elif isinstance(instruction, DirectAssignment):
-                        if isinstance(instruction.target, Pointer):
-                            result += ('PointsTo("LOC%s", x) :- PointsTo("LOC%s", x).\n'  % (inv_locations[instruction.target],
-                                                                                             inv_locations[instruction.rhs]))
-                    
-                            
-        print result
+    ''' Flow- and context-insensitive inclusion-based points-to
+    analysis of a module, solved in-process.
+
+    Locations are numbered; every node of the constraint graph has a
+    points-to set (an integer, bit i standing for location i), copy
+    edges to the nodes including it and the
+    load / store constraints it is dereferenced in. The worklist
+    propagates only the difference (delta) of a node's points-to set
+    since its last visit. Cycles of copy edges are detected lazily
+    (when an edge propagates nothing because both ends already point
+    to the same locations) and collapsed into one node via
+    union-find. '''
+
+    def __init__(self, module=None):
+        self._locations = []
+        self._ids = {}
+        # union-find over nodes, and per node (valid for roots):
+        self._rep = []
+        self._pts = []
+        self._delta = []
+        self._succ = []
+        self._loads = []
+        self._stores = []
+        self._worklist = collections.deque()
+        self._queued = set()
+        self.collapsed = 0
+        if module is not None:
+            for location in locations(module):
+                self._node(location)
+            for (kind, x, y) in constraints(module):
+                self.add_constraint(kind, x, y)
+
+    # Nodes
+
+    def _node(self, location):
+        try:
+            return self._ids[location]
+        except KeyError:
+            node = len(self._locations)
+            self._ids[location] = node
+            self._locations.append(location)
+            self._rep.append(node)
+            self._pts.append(0)
+            self._delta.append(0)
+            self._succ.append(set())
+            self._loads.append(set())
+            self._stores.append(set())
+            return node
+
+    def _find(self, node):
+        rep = self._rep
+        root = node
+        while rep[root] != root:
+            root = rep[root]
+        # path compression
+        while rep[node] != root:
+            (rep[node], node) = (root, rep[node])
+        return root
+
+    def _enqueue(self, node):
+        if node not in self._queued:
+            self._queued.add(node)
+            self._worklist.append(node)
+
+    def _add_edge(self, source, target):
+        ''' Add the copy edge pts(source) <= pts(target). '''
+        (source, target) = (self._find(source), self._find(target))
+        if source == target or target in self._succ[source]:
+            return
+        self._succ[source].add(target)
+        # (a ^ (a & b) is a minus b without complementing b, which is
+        # expensive for wide integers)
+        new = self._pts[source]
+        new ^= new & self._pts[target]
+        if new:
+            self._pts[target] |= new
+            self._delta[target] |= new
+            self._enqueue(target)
+
+    # Constraints
+
+    def add_constraint(self, kind, x, y):
+        ''' Add a constraint (see ADDRESS, COPY, LOAD and STORE); x and
+        y are locations. '''
+        location = self._node(y)
+        (x, y) = (self._find(self._node(x)), self._find(location))
+        if kind == ADDRESS:
+            # points-to sets hold location ids, not (collapsed) nodes
+            self._pts[x] |= 1 << location
+            self._delta[x] |= 1 << location
+            self._enqueue(x)
+        elif kind == COPY:
+            self._add_edge(y, x)
+        elif kind == LOAD:
+            self._loads[y].add(x)
+            if self._pts[y]:
+                self._delta[y] |= self._pts[y]
+                self._enqueue(y)
+        elif kind == STORE:
+            self._stores[x].add(y)
+            if self._pts[x]:
+                self._delta[x] |= self._pts[x]
+                self._enqueue(x)
+        else:
+            raise ValueError('Unknown constraint: %s' % kind)
+
+    # Cycle elimination
+
+    def _merge(self, nodes):
+        ''' Collapse nodes (roots on a cycle of copy edges) into
+        one. '''
+        root = nodes[0]
+        (pts, common) = (0, -1)
+        for node in nodes:
+            common &= self._pts[node]
+            pts |= self._pts[node]
+        # every member still has to pass on what it did not have
+        delta = pts ^ common
+        for node in nodes:
+            delta |= self._delta[node]
+            if node == root:
+                continue
+            self._rep[node] = root
+            self._succ[root] |= self._succ[node]
+            self._loads[root] |= self._loads[node]
+            self._stores[root] |= self._stores[node]
+            (self._pts[node], self._delta[node]) = (0, 0)
+            (self._succ[node], self._loads[node]) = (set(), set())
+            self._stores[node] = set()
+        for edges in (self._succ, self._loads, self._stores):
+            edges[root] = set(self._find(n) for n in edges[root])
+        self._succ[root].discard(root)
+        self._pts[root] = pts
+        self._delta[root] = delta
+        if delta:
+            self._enqueue(root)
+        self.collapsed += len(nodes) - 1
+
+    def _collapse_cycles(self, start):
+        ''' Collapse the copy cycles reachable from start (Tarjan's
+        algorithm, iteratively). Only nodes pointing to the same
+        locations as start are searched: they all will once the cycle
+        is solved, and the others are most likely not on one. '''
+        start = self._find(start)
+        pts = self._pts[start]
+        index, lowlink = {start: 0}, {start: 0}
+        stack, on_stack = [start], set([start])
+        calls = [(start, iter(list(self._succ[start])))]
+        while calls:
+            (node, successors) = calls[-1]
+            for successor in successors:
+                successor = self._find(successor)
+                if self._pts[successor] != pts:
+                    continue
+                if successor not in index:
+                    index[successor] = lowlink[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    calls.append((successor,
+                                  iter(list(self._succ[successor]))))
+                    break
+                elif successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index[successor])
+            else:
+                calls.pop()
+                if calls:
+                    parent = calls[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1:
+                        self._merge(component)
+
+    # Solving
+
+    def solve(self):
+        ''' Compute the points-to sets. Constraints may be added
+        afterwards and solve() called again. '''
+        find = self._find
+        pts, delta, succ = self._pts, self._delta, self._succ
+        checked = set()
+        while self._worklist:
+            node = self._worklist.popleft()
+            self._queued.discard(node)
+            if find(node) != node or not delta[node]:
+                continue
+            new = delta[node]
+            delta[node] = 0
+            if self._loads[node] or self._stores[node]:
+                # many locations may share a (collapsed) node
+                targets = set(find(location) for location in _bits(new))
+                for x in list(self._loads[node]):
+                    x = find(x)
+                    for target in targets:
+                        if x not in succ[target]:
+                            self._add_edge(target, x)
+                for y in list(self._stores[node]):
+                    y = find(y)
+                    targets_y = succ[y]
+                    for target in targets:
+                        if target not in targets_y:
+                            self._add_edge(y, target)
+            candidates = []
+            for successor in list(succ[node]):
+                successor = find(successor)
+                if successor == node:
+                    continue
+                diff = new ^ (new & pts[successor])
+                if diff:
+                    pts[successor] |= diff
+                    delta[successor] |= diff
+                    self._enqueue(successor)
+                elif ((node, successor) not in checked
+                      and pts[successor] == pts[node]):
+                    checked.add((node, successor))
+                    candidates.append(successor)
+            for candidate in candidates:
+                self._collapse_cycles(candidate)
+        return self
+
+    # Queries
+
+    def points_to(self, location):
+        ''' The locations location may point to. '''
+        if location not in self._ids:
+            return set()
+        node = self._find(self._ids[location])
+        return set(self._locations[i] for i in _bits(self._pts[node]))
+
+    def may_alias(self, location1, location2):
+        ''' Whether the two pointers may point to a common location. '''
+        if location1 not in self._ids or location2 not in self._ids:
+            return False
+        return bool(self._pts[self._find(self._ids[location1])]
+                    & self._pts[self._find(self._ids[location2])])
+
+    def points_to_map(self):
+        ''' Map each location with a non-empty points-to set to it. '''
+        result = {}
+        for location in self._locations:
+            targets = self.points_to(location)
+            if targets:
+                result[location] = targets
+        return result
@@ -1,8 +1,170 @@
 ##############################
 #
-# steensgard.py 
-#
+# steensgard.py
 #
+# Unification-based (Steensgaard)
+# pointer analysis.
 #
 # (C) 2016, Andreas Gaiser
 ##############################
+
+from pointer_analysis.andersen import (ADDRESS, COPY, LOAD, STORE,
+                                      locations, constraints)
+
+
+class SteensgaardAnalysis(object):
+    ''' Flow- and context-insensitive unification-based points-to
+    analysis of a module, over the locations of AndersenAnalysis.
+
+    Locations are partitioned into classes (union-find with path
+    compression and union by rank); every class points to at most one
+    class. An assignment unifies the classes its two sides point to
+    instead of adding an inclusion, so the analysis runs in almost
+    linear time but is coarser: whatever AndersenAnalysis finds
+    pointing to a location, this one does too, and pointers it does
+    not consider aliased are not aliased there either. '''
+
+    def __init__(self, module=None):
+        self._locations = []
+        self._ids = {}
+        self._parent = []
+        self._rank = []
+        # per class (valid for roots): the class pointed to (or None)
+        # and the locations in it
+        self._pointee = []
+        self._members = []
+        if module is not None:
+            for location in locations(module):
+                self._node(location)
+            for (kind, x, y) in constraints(module):
+                self.add_constraint(kind, x, y)
+
+    # Union-find
+
+    def _new_class(self):
+        self._parent.append(len(self._parent))
+        self._rank.append(0)
+        self._pointee.append(None)
+        self._members.append([])
+        return len(self._parent) - 1
+
+    def _node(self, location):
+        try:
+            return self._ids[location]
+        except KeyError:
+            node = self._new_class()
+            self._ids[location] = node
+            self._locations.append(location)
+            self._members[node].append(len(self._locations) - 1)
+            return node
+
+    def _find(self, node):
+        parent = self._parent
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        # path compression
+        while parent[node] != root:
+            (parent[node], node) = (root, parent[node])
+        return root
+
+    def _pointee_of(self, node):
+        ''' The class node points to, created if there is none yet. '''
+        node = self._find(node)
+        pointee = self._pointee[node]
+        if pointee is None:
+            pointee = self._pointee[node] = self._new_class()
+        return self._find(pointee)
+
+    def _join(self, node1, node2):
+        ''' Unify two classes, and (transitively) what they point
+        to. '''
+        pending = [(node1, node2)]
+        while pending:
+            (node1, node2) = pending.pop()
+            (node1, node2) = (self._find(node1), self._find(node2))
+            if node1 == node2:
+                continue
+            # union by rank
+            if self._rank[node1] < self._rank[node2]:
+                (node1, node2) = (node2, node1)
+            elif self._rank[node1] == self._rank[node2]:
+                self._rank[node1] += 1
+            self._parent[node2] = node1
+            if len(self._members[node1]) < len(self._members[node2]):
+                (self._members[node1], self._members[node2]) = \
+                    (self._members[node2], self._members[node1])
+            self._members[node1].extend(self._members[node2])
+            self._members[node2] = []
+            (pointee1, pointee2) = (self._pointee[node1],
+                                    self._pointee[node2])
+            self._pointee[node2] = None
+            if pointee1 is None:
+                self._pointee[node1] = pointee2
+            elif pointee2 is not None:
+                pending.append((pointee1, pointee2))
+
+    # Constraints
+
+    def add_constraint(self, kind, x, y):
+        ''' Add a constraint (see andersen.ADDRESS, COPY, LOAD and
+        STORE); x and y are locations. '''
+        (x, y) = (self._node(x), self._node(y))
+        if kind == ADDRESS:
+            self._join(self._pointee_of(x), y)
+        elif kind == COPY:
+            self._join(self._pointee_of(x), self._pointee_of(y))
+        elif kind == LOAD:
+            self._join(self._pointee_of(x),
+                       self._pointee_of(self._pointee_of(y)))
+        elif kind == STORE:
+            self._join(self._pointee_of(self._pointee_of(x)),
+                       self._pointee_of(y))
+        else:
+            raise ValueError('Unknown constraint: %s' % kind)
+
+    def solve(self):
+        ''' Constraints are solved as they are added; as in
+        AndersenAnalysis, the analysis is returned. '''
+        return self
+
+    # Queries
+
+    def _target(self, location):
+        if location not in self._ids:
+            return None
+        pointee = self._pointee[self._find(self._ids[location])]
+        if pointee is None:
+            return None
+        pointee = self._find(pointee)
+        if not self._members[pointee]:
+            return None
+        return pointee
+
+    def points_to(self, location):
+        ''' The locations location may point to. '''
+        target = self._target(location)
+        if target is None:
+            return set()
+        return set(self._locations[i] for i in self._members[target])
+
+    def may_alias(self, location1, location2):
+        ''' Whether the two pointers may point to a common location. '''
+        target = self._target(location1)
+        return target is not None and target == self._target(location2)
+
+    def same_class(self, location1, location2):
+        ''' Whether the two locations were unified (so that pointers
+        to one may point to the other). '''
+        return (location1 in self._ids and location2 in self._ids
+                and self._find(self._ids[location1])
+                == self._find(self._ids[location2]))
+
+    def points_to_map(self):
+        ''' Map each location with a non-empty points-to set to it. '''
+        result = {}
+        for location in self._locations:
+            targets = self.points_to(location)
+            if targets:
+                result[location] = targets
+        return result
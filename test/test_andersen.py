@@ -0,0 +1,173 @@
+import pytest
+import random
+
+from code_rep.module import Module
+from code_rep.method import Method, BasicBlock
+from code_rep.instr import *
+from code_rep.variable import Variable
+from code_rep.type_system import Integer, Pointer
+from pointer_analysis.andersen import *
+
+
+int_type = Integer(-1024, 1024)
+pointer_type = Pointer(int_type)
+pp_type = Pointer(pointer_type)
+
+
+def create_module():
+    # z := 1; p := &x; q := &x; pp := &p; qq := pp; r := &z; *qq := r
+    module = Module('mod')
+    main = Method('main', module)
+    (x, z) = [main.add_local_variable(Variable(n, int_type)) for n in 'xz']
+    (p, q, r) = [main.add_local_variable(Variable(n, pointer_type))
+                 for n in 'pqr']
+    (pp, qq) = [main.add_local_variable(Variable(n, pp_type))
+                for n in ('pp', 'qq')]
+    block = BasicBlock('b1')
+    main.add_block(block)
+    main.set_edge(main.initial, block)
+    main.set_edge(block, main.final)
+    for instruction in [ConstantAssignment(z, 1),
+                        Address(p, x),
+                        Address(q, x),
+                        Address(pp, p),
+                        DirectVariableAssignment(qq, pp),
+                        Address(r, z),
+                        Store(qq, r)]:
+        block.append_instruction(instruction)
+    return (module, x, z, p, q, r, pp, qq)
+
+def test_module():
+    (module, x, z, p, q, r, pp, qq) = create_module()
+    analysis = AndersenAnalysis(module).solve()
+    assert analysis.points_to(p) == set([x, z])
+    assert analysis.points_to(q) == set([x])
+    assert analysis.points_to(r) == set([z])
+    assert analysis.points_to(pp) == set([p])
+    assert analysis.points_to(qq) == set([p])
+    assert analysis.points_to(x) == set()
+    assert analysis.may_alias(p, q)
+    assert not analysis.may_alias(q, r)
+    assert set(analysis.points_to_map()) == set([p, q, r, pp, qq])
+
+def test_alloc_invocation():
+    # int* id(int* a) { return a; }  s := id(new int(n))
+    module = Module('mod')
+    main = Method('main', module)
+    identity = Method('id', module)
+    a = identity.add_parameter(Variable('a', pointer_type))
+    identity.set_return_variable(a)
+    n = main.add_local_variable(Variable('n', int_type))
+    (t, s) = [main.add_local_variable(Variable(v, pointer_type))
+              for v in 'ts']
+    alloc = Alloc(t, int_type, n)
+    main.initial.append_instruction(alloc)
+    invocation = module.create_invocation(main, identity, [t], s)
+    main.set_edge(main.initial, main.final, None, invocation)
+    identity.set_edge(identity.initial, identity.final)
+    analysis = AndersenAnalysis(module).solve()
+    assert analysis.points_to(t) == set([alloc])
+    assert analysis.points_to(a) == set([alloc])
+    assert analysis.points_to(s) == set([alloc])
+
+def test_cycle():
+    # a := &o; b := a; c := b; a := c; d := *a
+    analysis = AndersenAnalysis()
+    analysis.add_constraint(ADDRESS, 'a', 'o')
+    analysis.add_constraint(ADDRESS, 'o', 'v')
+    analysis.add_constraint(COPY, 'b', 'a')
+    analysis.add_constraint(COPY, 'c', 'b')
+    analysis.add_constraint(COPY, 'a', 'c')
+    analysis.add_constraint(LOAD, 'd', 'a')
+    analysis.solve()
+    assert analysis.collapsed == 2
+    for v in 'abc':
+        assert analysis.points_to(v) == set(['o'])
+    assert analysis.points_to('d') == set(['v'])
+    # solving incrementally
+    analysis.add_constraint(ADDRESS, 'c', 'w')
+    analysis.add_constraint(STORE, 'b', 'd')
+    analysis.solve()
+    assert analysis.points_to('a') == set(['o', 'w'])
+    assert analysis.points_to('w') == set(['v'])
+
+def naive_points_to(constraints):
+    pts = {}
+    changed = True
+    while changed:
+        changed = False
+        for (kind, x, y) in constraints:
+            if kind == ADDRESS:
+                updates = [(x, set([y]))]
+            elif kind == COPY:
+                updates = [(x, pts.get(y, set()))]
+            elif kind == LOAD:
+                updates = [(x, pts.get(z, set())) for z in pts.get(y, ())]
+            else:
+                updates = [(z, pts.get(y, set())) for z in pts.get(x, ())]
+            for (target, values) in updates:
+                if not values <= pts.get(target, set()):
+                    pts.setdefault(target, set()).update(values)
+                    changed = True
+    return pts
+
+def random_constraints(rng, count, size):
+    names = ['v%d' % i for i in xrange(size)]
+    kinds = [ADDRESS, COPY, COPY, LOAD, STORE]
+    return [(rng.choice(kinds), rng.choice(names), rng.choice(names))
+            for _ in xrange(count)]
+
+def test_random():
+    rng = random.Random(23)
+    for _ in xrange(50):
+        constraints = random_constraints(rng, 40, 12)
+        analysis = AndersenAnalysis()
+        for constraint in constraints:
+            analysis.add_constraint(*constraint)
+        analysis.solve()
+        assert analysis.points_to_map() == naive_points_to(constraints)
+
+def module_constraints(rng, size, count):
+    # functions of 30 variables; assignments mostly flow from earlier
+    # to later variables, a few loops and calls (the workload of
+    # bench/bench_andersen.py)
+    constraints = []
+    for _ in xrange(count):
+        x = rng.randrange(size)
+        base = x - x % 30
+        earlier = base + rng.randrange(x - base + 1)
+        y = base + rng.randrange(30)
+        r = rng.random()
+        if r < 0.3:
+            constraints.append((ADDRESS, x, y))
+        elif r < 0.65:
+            constraints.append((COPY, x, earlier))
+        elif r < 0.67:
+            constraints.append((COPY, earlier, x))
+        elif r < 0.675:
+            constraints.append((COPY, base + rng.randrange(3),
+                                rng.randrange(size)))
+        elif r < 0.85:
+            constraints.append((LOAD, x, earlier))
+        else:
+            constraints.append((STORE, x, y))
+    return constraints
+
+def test_large():
+    rng = random.Random(1)
+    size = 3000
+    constraints = module_constraints(rng, size, 3 * size)
+    analysis = AndersenAnalysis()
+    for constraint in constraints:
+        analysis.add_constraint(*constraint)
+    analysis.solve()
+    assert analysis.collapsed > 0
+    # the constraints within a few functions alone give a part of
+    # the points-to sets of the whole module
+    functions = set(rng.sample(xrange(size // 30), 5))
+    part = [(kind, x, y) for (kind, x, y) in constraints
+            if x // 30 in functions and y // 30 in functions]
+    expected = naive_points_to(part)
+    assert sum(len(targets) for targets in expected.itervalues()) > 100
+    for (location, targets) in expected.iteritems():
+        assert targets <= analysis.points_to(location)
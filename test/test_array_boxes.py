@@ -0,0 +1,87 @@
+import pytest
+import random
+import array_boxes
+import boxes
+
+
+def create_factory(factory_class=array_boxes.ArrayBoxDomainFactory):
+    factory = factory_class(-512, 512)
+    factory.add_integer_var('x', -512, 512)
+    factory.add_integer_var('y', -512, 512)
+    factory.add_integer_var('z', -512, 512)
+    return factory
+
+def test_array_boxes_operations():
+    factory = create_factory()
+    e1 = factory.op_load_constant(factory.get_top(), 'x', 3)
+    e1 = factory.op_binary(e1, '+', 'y', 'x', 2)
+    assert factory.to_string(e1) == '[x in [3, 3], y in [5, 5]]'
+    e2 = factory.cond_binary(factory.get_top(), '<', 'x', 10)
+    e2 = factory.cond_binary(e2, '>=', 'x', 0)
+    assert factory.to_string(e2) == '[x in [0, 9]]'
+    assert factory.is_subseteq(e1, e2)
+    assert not factory.is_subseteq(e2, e1)
+    e3 = factory.union(e1, factory.op_load_constant(e1, 'x', 7))
+    assert factory.to_string(e3) == '[x in [3, 7], y in [5, 5]]'
+    assert factory.is_eq(factory.intersect(e3, e2), e3)
+    assert factory.to_string(factory.project_var(e3, 'x')) == '[y in [5, 5]]'
+    assert factory.cond_binary(e3, '>', 'x', 8) is factory.get_bot()
+    e4 = factory.op_binary(e3, '-', 'z', 'y', 'x')
+    assert factory.to_string(e4) == '[x in [3, 7], y in [5, 5], z in [-2, 2]]'
+    assert factory.op_binary(e4, '%', 'z', 'x', 0) is factory.get_bot()
+    with pytest.raises(ValueError):
+        factory.op_binary(e4, '/', 'z', 'x', 2)
+    with pytest.raises(ValueError):
+        factory.cond_binary(e4, '=', 'z', 'x')
+
+def test_array_boxes_widen():
+    factory = create_factory()
+    factory.add_constant(0)
+    factory.add_constant(100)
+    e1 = factory.op_load_constant(factory.get_top(), 'x', 1)
+    e2 = factory.union(e1, factory.op_load_constant(e1, 'x', 2))
+    e3 = factory.widen(e1, e2)
+    assert factory.to_string(e3) == '[x in [1, 100]]'
+    e4 = factory.union(e3, factory.op_load_constant(e1, 'x', -1))
+    assert factory.to_string(factory.widen(e3, e4)) == '[x in [-512, 100]]'
+    assert factory.is_eq(factory.widen(e3, e3), e3)
+
+def test_array_boxes_late_variables():
+    factory = create_factory()
+    e1 = factory.op_load_constant(factory.get_top(), 'x', 3)
+    factory.add_integer_var('w', 0, 10)
+    e2 = factory.op_load_constant(e1, 'w', 4)
+    assert factory.to_string(e2) == '[w in [4, 4], x in [3, 3]]'
+    assert factory.is_subseteq(e2, e1)
+    assert factory.to_string(factory.union(e1, e2)) == '[x in [3, 3]]'
+    # equality and hashing agree with is_eq for elements created
+    # before and after a variable was added
+    e3 = factory.op_load_constant(factory.get_top(), 'x', 3)
+    assert len(e3.lower) > len(e1.lower)
+    assert factory.is_eq(e1, e3)
+    assert e1 == e3 and hash(e1) == hash(e3)
+    assert len(set([e1, e3])) == 1
+    assert e1 != e2
+    assert factory.get_bot() == factory.get_bot()
+    assert factory.get_bot() != e1
+
+def test_array_boxes_same_as_boxes():
+    random.seed(3)
+    array_factory = create_factory()
+    box_factory = create_factory(boxes.BoxDomainFactory)
+    variables = ['x', 'y', 'z']
+    for _ in xrange(200):
+        a = array_factory.get_top()
+        b = box_factory.get_top()
+        for _ in xrange(4):
+            var = random.choice(variables)
+            if random.random() < 0.5:
+                c = random.randint(-20, 20)
+                a = array_factory.op_load_constant(a, var, c)
+                b = box_factory.op_load_constant(b, var, c)
+            else:
+                op = random.choice(['<', '<=', '>', '>='])
+                other = random.choice(variables + [random.randint(-20, 20)])
+                a = array_factory.cond_binary(a, op, var, other)
+                b = box_factory.cond_binary(b, op, var, other)
+            assert array_factory.to_string(a) == box_factory.to_string(b)
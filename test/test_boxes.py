@@ -0,0 +1,153 @@
+import pytest
+import boxes
+
+
+def create_factory():
+    factory = boxes.BoxDomainFactory(-512, 512)
+    factory.add_integer_var('x', -512, 512)
+    factory.add_integer_var('y', -512, 512)
+    factory.add_integer_var('z', -512, 512)
+    return factory
+
+def test_boxes_operations():
+    factory = create_factory()
+    e1 = factory.op_load_constant(factory.get_top(), 'x', 3)
+    e1 = factory.op_binary(e1, '+', 'y', 'x', 2)
+    assert factory.to_string(e1) == '[x in [3, 3], y in [5, 5]]'
+    e2 = factory.cond_binary(factory.get_top(), '<', 'x', 10)
+    e2 = factory.cond_binary(e2, '>=', 'x', 0)
+    assert factory.to_string(e2) == '[x in [0, 9]]'
+    assert factory.is_subseteq(e1, e2)
+    e3 = factory.union(e1, factory.op_load_constant(e1, 'x', 7))
+    assert factory.to_string(e3) == '[x in [3, 7], y in [5, 5]]'
+    assert factory.is_eq(factory.intersect(e3, e2), e3)
+    assert factory.to_string(factory.project_var(e3, 'x')) == '[y in [5, 5]]'
+
+def test_boxes_copy_on_write():
+    factory = create_factory()
+    e1 = factory.op_load_constant(factory.get_top(), 'x', 3)
+    e2 = factory._copy(e1)
+    assert e2.ranges is e1.ranges
+    e3 = factory.op_load_constant(e2, 'y', 4)
+    e2.set_range('z', (1, 2))
+    e1.set_range('x', (0, 0))
+    assert factory.to_string(e1) == '[x in [0, 0]]'
+    assert factory.to_string(e2) == '[x in [3, 3], z in [1, 2]]'
+    assert factory.to_string(e3) == '[x in [3, 3], y in [4, 4]]'
+
+def test_boxes_structural_sharing():
+    factory = create_factory()
+    e1 = factory.get_top()
+    for i in xrange(100):
+        factory.add_integer_var(i, -512, 512)
+        e1 = factory.op_load_constant(e1, i, i)
+    e2 = factory.op_load_constant(e1, 50, -1)
+    assert [(v, i1, i2) for (v, i1, i2) in e1.ranges.differences(e2.ranges)] \
+        == [(factory._variable_ids.get(50), (50, 50), (-1, -1))]
+    e3 = factory.union(e1, e2)
+    assert e3.get_range(50) == (-1, 50)
+    assert e3.get_range(49) is e1.get_range(49)
+    assert factory.is_subseteq(e1, e3)
+    assert not factory.is_subseteq(e3, e1)
+    # a variable restricted in e2 only has full range in e1
+    assert not factory.is_subseteq(factory.get_top(), e1)
+    assert factory.op_load_constant(e1, 3, 3) == e1
+
+def test_boxes_compile_block():
+    import random
+    random.seed(14)
+    factory = create_factory()
+    names = ['a', 'b', 'c', 'd']
+    for name in names:
+        factory.add_integer_var(name, -100, 100)
+    for _ in xrange(200):
+        operations = []
+        for _ in xrange(random.randint(0, 6)):
+            target = random.choice(names)
+            operand = random.choice(names + [0, 1, 2, -3])
+            kind = random.randint(0, 2)
+            if kind == 0:
+                operations.append(('op_load_constant', target,
+                                   random.randint(-100, 100)))
+            elif kind == 1:
+                operations.append(('op_load_variable', target,
+                                   random.choice(names)))
+            else:
+                operations.append(('op_binary',
+                                   random.choice(['+', '-', '*', '%']),
+                                   target, random.choice(names), operand))
+        element = factory.get_top()
+        for name in names:
+            if random.random() < 0.5:
+                l = random.randint(-5, 5)
+                element = factory.cond_binary(element, '<=', l, name)
+                element = factory.cond_binary(element, '<=', name, l + 3)
+        expected = element
+        for operation in operations:
+            expected = getattr(factory, operation[0])(expected,
+                                                      *operation[1:])
+        result = factory.compile_block(operations)(element)
+        assert factory.is_eq(result, expected)
+        assert result == expected
+
+def test_boxes_hash_intern():
+    import random
+    random.seed(15)
+    factory = boxes.BoxDomainFactory(-512, 512, intern=True)
+    names = ['h%d' % i for i in xrange(40)]
+    for name in names:
+        factory.add_integer_var(name, -512, 512)
+    elements = [factory.get_top()]
+    hash(elements[0])
+    for _ in xrange(300):
+        e = random.choice(elements)
+        kind = random.randint(0, 3)
+        if kind == 0:
+            e = factory.op_load_constant(e, random.choice(names),
+                                         random.randint(-3, 3))
+        elif kind == 1:
+            e = factory.union(e, random.choice(elements))
+        elif kind == 2:
+            e = factory.cond_binary(e, '<=', random.choice(names),
+                                    random.randint(-3, 3))
+        else:
+            e = factory.project_var(e, random.choice(names))
+        elements.append(e)
+    for e in elements:
+        if e.ranges is None:
+            continue
+        # the maintained hash is the hash of a fresh element
+        fresh = boxes.BoxesElement(dict(e.range_items()),
+                                   factory._variable_ids)
+        assert hash(e) == hash(fresh)
+        assert e == fresh
+    # equal boxes are represented by the same element
+    for e1 in elements:
+        for e2 in elements:
+            if factory.is_eq(e1, e2):
+                assert e1 is e2
+    e = factory.op_load_constant(factory.get_top(), 'h0', 1)
+    assert factory.op_load_constant(factory.get_top(), 'h0', 1) is e
+    assert factory.cond_binary(e, '!=', 'h0', 1) is factory.get_bot()
+
+def test_boxes_factory_scope():
+    import gc
+    factory1 = boxes.BoxDomainFactory(-512, 512, intern=True)
+    factory2 = create_factory()
+    factory1.add_integer_var('w', 0, 10)
+    factory1.add_integer_var('x', 0, 10)
+    e1 = factory1.op_load_constant(factory1.get_top(), 'x', 3)
+    e2 = factory2.op_load_constant(factory2.get_top(), 'x', 3)
+    # variable ids are not shared by the factories
+    assert factory1._variable_ids.variables == ['x']
+    assert factory2._variable_ids.variables == ['x']
+    assert factory1.to_string(e1) == factory2.to_string(e2)
+    assert e1 != e2
+    # the intern table does not keep elements alive
+    assert factory1.op_load_constant(factory1.get_top(), 'x', 3) is e1
+    for i in xrange(10):
+        factory1.op_load_constant(factory1.get_top(), 'w', i)
+    gc.collect()
+    # only e1 is still in use
+    assert len(factory1._intern_table) == 1
+    assert factory1.op_load_constant(factory1.get_top(), 'x', 3) is e1
@@ -0,0 +1,162 @@
+import pytest
+
+from code_rep.method import Method, BasicBlock
+from code_rep.instr import *
+from code_rep.variable import Variable
+from code_rep.type_system import Integer
+from analysis.dataflow import *
+from analyzers import MethodAnalyzer
+import live_vars
+
+
+def create_method():
+    # x := 0; y := x; z := 5; w := 3; u := 1
+    # while (y < 10) { x := x + 1; y := y + 1; }
+    # if (z < w) ...
+    int_type = Integer(-1024, 1024)
+    (x, y, z, w, u) = [Variable(name, int_type) for name in 'xyzwu']
+    method = Method('main', None)
+    for v in (x, y, z, w, u):
+        method.add_local_variable(v)
+    loop = BasicBlock('loop')
+    body = BasicBlock('body')
+    method.add_blocks(loop, body)
+    method.initial.append_instruction(ConstantAssignment(x, 0))
+    method.initial.append_instruction(DirectVariableAssignment(y, x))
+    method.initial.append_instruction(ConstantAssignment(z, 5))
+    method.initial.append_instruction(ConstantAssignment(w, 3))
+    method.initial.append_instruction(ConstantAssignment(u, 1))
+    body.append_instruction(BinaryOpAssignment(x, '+', x, 1))
+    body.append_instruction(BinaryOpAssignment(y, '+', y, 1))
+    method.set_edge(method.initial, loop)
+    method.set_edge(loop, body, ['<', y, 10])
+    method.set_edge(body, loop)
+    method.set_edge(loop, method.final, ['<', z, w])
+    return (method, loop, body, x, y, z, w, u)
+
+def ids(facts):
+    return sorted(v.id for v in facts)
+
+def test_live_variables():
+    (method, loop, body, x, y, z, w, u) = create_method()
+    solver = BitVectorSolver(method, LiveVariables()).solve()
+    live_in = dict((block, ids(solver.facts(value)))
+                   for (block, value) in solver.in_values.iteritems())
+    live_out = dict((block, ids(solver.facts(value)))
+                    for (block, value) in solver.out_values.iteritems())
+    assert live_in[method.initial] == []
+    assert live_out[method.initial] == ['w', 'x', 'y', 'z']
+    assert live_in[loop] == ['w', 'x', 'y', 'z']
+    assert live_in[body] == ['w', 'x', 'y', 'z']
+    assert live_in[method.final] == []
+
+def test_reaching_definitions():
+    (method, loop, body, x, y, z, w, u) = create_method()
+    solver = BitVectorSolver(method, ReachingDefinitions()).solve()
+    reaching = sorted((block.id, index) for (block, index)
+                      in solver.facts(solver.in_values[loop]))
+    assert reaching == [('__initial', i) for i in xrange(5)] + \
+        [('body', 0), ('body', 1)]
+    reaching = solver.facts(solver.out_values[body])
+    assert (method.initial, 0) not in reaching
+    assert (body, 0) in reaching
+
+def test_available_expressions():
+    # t := a + b; if (...) { a := 1 } else { s := a + b; t := t + 1 }
+    int_type = Integer(-1024, 1024)
+    (a, b, s, t) = [Variable(name, int_type) for name in 'abst']
+    method = Method('main', None)
+    for v in (a, b, s, t):
+        method.add_local_variable(v)
+    (then, other) = (BasicBlock('then'), BasicBlock('else'))
+    method.add_blocks(then, other)
+    method.initial.append_instruction(BinaryOpAssignment(t, '+', a, b))
+    then.append_instruction(ConstantAssignment(a, 1))
+    other.append_instruction(BinaryOpAssignment(s, '+', a, b))
+    other.append_instruction(BinaryOpAssignment(t, '+', t, 1))
+    method.set_edge(method.initial, then, ['<', a, b])
+    method.set_edge(method.initial, other, ['>=', a, b])
+    method.set_edge(then, method.final)
+    method.set_edge(other, method.final)
+    solver = BitVectorSolver(method, AvailableExpressions()).solve()
+    assert solver.facts(solver.out_values[method.initial]) == [('+', a, b)]
+    assert solver.facts(solver.out_values[then]) == []
+    assert solver.facts(solver.out_values[other]) == [('+', a, b)]
+    assert solver.facts(solver.in_values[method.final]) == []
+
+def random_method(rng, size):
+    int_type = Integer(-1024, 1024)
+    variables = [Variable('v%d' % i, int_type) for i in xrange(6)]
+    method = Method('main', None)
+    for v in variables:
+        method.add_local_variable(v)
+    blocks = [BasicBlock('b%d' % i) for i in xrange(size)]
+    method.add_blocks(*blocks)
+    blocks = [method.initial] + blocks + [method.final]
+    for block in blocks[:-1]:
+        for _ in xrange(rng.randint(0, 3)):
+            target = rng.choice(variables)
+            operand = rng.choice(variables + [1])
+            if rng.randint(0, 1):
+                block.append_instruction(
+                    BinaryOpAssignment(target, '+', rng.choice(variables),
+                                       operand))
+            else:
+                block.append_instruction(ConstantAssignment(target, 0))
+    for (i, block) in enumerate(blocks[:-1]):
+        successors = set([blocks[i + 1], rng.choice(blocks[1:])])
+        for successor in successors:
+            method.set_edge(block, successor,
+                            ['<', rng.choice(variables), 0])
+    return method
+
+def test_live_variables_analyzer():
+    # same result as the generic analyzer with the live variables
+    # domain (backwards)
+    import random
+    rng = random.Random(22)
+    for _ in xrange(10):
+        method = random_method(rng, 12)
+        factory = live_vars.LiveVarsDomainFactory()
+        analyzer = MethodAnalyzer(method, factory)
+        analyzer.analyze(factory.get_bot(), factory.get_bot(),
+                         analyze_forward=False)
+        solver = BitVectorSolver(method, LiveVariables()).solve()
+        for block in method.blocks():
+            assert (factory.to_string(analyzer.in_values[block])
+                    == factory.to_string(solver.in_values[block]))
+
+def naive_live_variables(method):
+    ''' Live variables at the start of every block, by round-robin
+    iteration over sets applying every instruction on every visit. '''
+    def variables(values):
+        return set(v for v in values if isinstance(v, Variable))
+    live_in = dict((block, set()) for block in method.blocks())
+    changed = True
+    while changed:
+        changed = False
+        for block in method.blocks():
+            live = set()
+            for successor in method.successors(block):
+                live |= live_in[successor]
+                condition = method.get_edge(block, successor).condition
+                if condition is not None:
+                    live |= variables(condition[1:])
+            for instruction in reversed(block.instructions()):
+                live.discard(instruction.target)
+                if isinstance(instruction, BinaryOpAssignment):
+                    live |= variables([instruction.operand1,
+                                       instruction.operand2])
+            if live != live_in[block]:
+                live_in[block] = live
+                changed = True
+    return live_in
+
+def test_large_method():
+    import random
+    method = random_method(random.Random(7), 1000)
+    solver = BitVectorSolver(method, LiveVariables()).solve()
+    expected = naive_live_variables(method)
+    assert any(expected.itervalues())
+    for block in method.blocks():
+        assert set(solver.facts(solver.in_values[block])) == expected[block]
@@ -0,0 +1,108 @@
+import pytest
+import random
+import time
+
+from analysis.datalog import *
+import andersen
+from pointer_analysis.andersen import AndersenAnalysis
+from test_andersen import create_module
+
+
+def create_program():
+    program = Program()
+    edge = program.relation('Edge', 2)
+    path = program.relation('Path', 2)
+    (x, y, z) = (Var('x'), Var('y'), Var('z'))
+    program.rule(path(x, y), [edge(x, y)])
+    program.rule(path(x, z), [path(x, y), edge(y, z)])
+    return (program, edge, path)
+
+def closure(edges):
+    result = set(edges)
+    while True:
+        new = set((a, d) for (a, b) in result for (c, d) in edges if b == c)
+        if new <= result:
+            return result
+        result |= new
+
+def test_transitive_closure():
+    (program, edge, path) = create_program()
+    edges = [(1, 2), (2, 3), (3, 1), (3, 4)]
+    for e in edges:
+        program.fact(edge(*e))
+    program.solve()
+    assert path.tuples() == closure(edges)
+    x = Var('x')
+    assert sorted(program.query(path(4, x))) == []
+    assert sorted(program.query(path(x, 4))) == [(1, 4), (2, 4), (3, 4)]
+    assert sorted(program.query(path(x, x))) == [(1, 1), (2, 2), (3, 3)]
+
+def test_incremental():
+    (program, edge, path) = create_program()
+    program.fact(edge(1, 2))
+    program.solve()
+    assert len(path) == 1
+    program.fact(edge(2, 3))
+    program.solve()
+    assert path.tuples() == set([(1, 2), (2, 3), (1, 3)])
+    # a rule added later sees the existing tuples
+    (x, y) = (Var('x'), Var('y'))
+    back = program.relation('Back', 2)
+    program.rule(back(y, x), [path(x, y)])
+    program.solve()
+    assert back.tuples() == set([(2, 1), (3, 2), (3, 1)])
+
+def test_constants_and_repeats():
+    program = Program()
+    edge = program.relation('Edge', 2)
+    loop = program.relation('Loop', 1)
+    start = program.relation('FromStart', 1)
+    x = Var('x')
+    for e in [(0, 1), (1, 1), (2, 2), (0, 3)]:
+        program.fact(edge(*e))
+    program.rule(loop(x), [edge(x, x)])
+    program.rule(start(x), [edge(0, x)])
+    program.solve()
+    assert loop.tuples() == set([(1,), (2,)])
+    assert start.tuples() == set([(1,), (3,)])
+
+def test_errors():
+    (program, edge, path) = create_program()
+    (x, y) = (Var('x'), Var('y'))
+    with pytest.raises(ValueError):
+        program.rule(path(x, y), [edge(x, x)])
+    with pytest.raises(ValueError):
+        program.fact(edge(x, 1))
+    with pytest.raises(ValueError):
+        edge(1, 2, 3)
+    with pytest.raises(ValueError):
+        program.relation('Edge', 3)
+
+def test_random():
+    rng = random.Random(25)
+    for _ in xrange(20):
+        (program, edge, path) = create_program()
+        edges = set((rng.randrange(10), rng.randrange(10))
+                    for _ in xrange(15))
+        for e in edges:
+            program.fact(edge(*e))
+        program.solve()
+        assert path.tuples() == closure(edges)
+
+def test_andersen():
+    # the points-to rules give the same result as the Andersen solver
+    (module, x, z, p, q, r, pp, qq) = create_module()
+    result = andersen.AndersenAnalysis(module).datalog_points_to()
+    assert result == AndersenAnalysis(module).solve().points_to_map()
+    assert result[p] == set([x, z])
+
+def test_large():
+    # transitive closure of a chain of 300 nodes (45150 tuples)
+    (program, edge, path) = create_program()
+    for i in xrange(300):
+        program.fact(edge(i, i + 1))
+    start = time.time()
+    rounds = program.solve()
+    assert time.time() - start < 30
+    assert len(path) == 300 * 301 // 2
+    assert rounds == 301
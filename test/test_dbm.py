@@ -90,3 +90,95 @@ def test_dbm_find_shortest_paths():
     assert d2.get_weight(4, 5) is None
 
     
+def test_dbm_tighten():
+
+    import random
+    rnd = random.Random(7)
+    for run in range(0, 20):
+        d = dbm.DBM()
+        for k in range(0, 15):
+            d.set_weight(rnd.randint(0, 6), rnd.randint(0, 20),
+                         rnd.randint(0, 6))
+        closed = d.find_shortest_paths()
+        (x, y, c) = (rnd.randint(0, 6), rnd.randint(0, 6), rnd.randint(-5, 5))
+        reference = closed.copy()
+        reference.set_weight(x, c, y)
+        incremental = closed.copy()
+        consistent = incremental.tighten(x, c, y)
+        assert consistent == (not reference.exists_negative_cycle())
+        if consistent:
+            assert incremental.closed
+            reference = reference.find_shortest_paths()
+            for source in range(0, 7):
+                for target in range(0, 7):
+                    assert (incremental.get_weight(source, target)
+                            == reference.get_weight(source, target))
+
+def test_dbm_copy_on_write():
+
+    d = dbm.DBM()
+    d.set_weight(1, 3, 2)
+    d.set_weight(2, 4, 3)
+    d2 = d.copy()
+    assert d2.outgoings is d.outgoings
+    d2.set_weight(1, 1, 2)
+    d.set_weight(2, 0, 3)
+    d.set_weight(4, 0, 1)
+    assert d.get_weight(1, 2) == 3
+    assert d2.get_weight(1, 2) == 1
+    assert d2.get_weight(2, 3) == 4
+    assert d.get_weight(2, 3) == 0
+    assert d2.get_weight(4, 1) is None
+    assert d.outgoings[3] is d2.outgoings[3]
+
+def test_dbm_hash_eq():
+    d1 = dbm.DBM()
+    d1.set_weight('x', 3, 'y')
+    d1.set_weight('y', 2, 'z')
+    d1.set_weight('x', 5, 'z')
+    d2 = dbm.DBM()
+    d2.set_weight('y', 2, 'z')
+    d2.set_weight('x', 3, 'y')
+    # x - z <= 5 is implied by the other two constraints
+    assert d1 == d2
+    assert hash(d1) == hash(d2)
+    assert not d1 != d2
+    d2.set_weight('x', 1, 'y')
+    assert d1 != d2
+    e1 = dbm.DBM()
+    e1.set_weight('x', -1, 'y')
+    e1.set_weight('y', -1, 'x')
+    e2 = dbm.DBM()
+    e2.set_weight('y', -2, 'x')
+    e2.set_weight('x', 1, 'y')
+    # all empty DBMs are equal
+    assert e1 == e2
+    assert e1.key() is None
+
+def test_dbm_remove_nodes():
+    d = dbm.DBM()
+    d.set_weight('x', 3, 'y')
+    d.set_weight('y', 2, 'z')
+    d.set_weight('z', 1, 'x')
+    c = d.copy()
+    d.remove_nodes(['y', 'w'])
+    assert sorted(d.all_nodes()) == ['x', 'z']
+    assert d.get_weight('x', 'y') is None
+    assert d.get_weight('z', 'x') == 1
+    assert d.incomings['z'] == {}
+    # the copy still has the removed node
+    assert c.get_weight('x', 'y') == 3
+    assert c.get_weight('y', 'z') == 2
+
+def test_dbm_remove_nodes_shared():
+    # removing nodes without outside neighbours must not change
+    # a DBM the storage is shared with
+    d = dbm.DBM()
+    d.set_weight('x', -1, 'y')
+    d.set_weight('y', 5, 'x')
+    c = d.copy()
+    c.remove_nodes(['x', 'y'])
+    assert c.all_nodes() == []
+    assert sorted(d.all_nodes()) == ['x', 'y']
+    assert d.get_weight('x', 'y') == -1
+    assert d.get_weight('y', 'x') == 5
@@ -1,4 +1,5 @@
 import pytest
+import dbm
 import dbms
 
 
@@ -110,3 +111,79 @@ def test_dbms_assign_2():
     print factory.to_string(e1)
     assert factory.is_eq(e1, e3) 
     
+
+def test_dbms_transfer_functions_keep_closure():
+    factory = dbms.DBMFactory(-512, 512)
+    factory.add_integer_var(0, 0, 0)
+    factory.add_integer_var('x', -512, 512)
+    factory.add_integer_var('y', -512, 512)
+    e1 = factory.op_load_constant(factory.get_top(), 'x', 4)
+    assert e1.closed
+    e1 = factory.cond_binary(e1, '<', 'y', 'x')
+    assert e1.closed
+    # y < x = 4 implies y <= 3 without a full closure
+    assert e1.get_weight('y', 0) == 3
+    e1 = factory.op_binary(e1, '+', 'x', 'x', 2)
+    assert e1.closed
+    assert e1.get_weight('y', 'x') == -3
+    assert factory.cond_binary(e1, '>=', 'y', 'x') is None
+
+
+def test_dbms_intern():
+    factory = dbms.DBMFactory(-512, 512, intern=True)
+    factory.add_integer_var(0, 0, 0)
+    factory.add_integer_var('x', -512, 512)
+    factory.add_integer_var('y', -512, 512)
+    e1 = factory.op_load_constant(factory.get_top(), 'x', 4)
+    e1 = factory.op_load_variable(e1, 'y', 'x')
+    e2 = factory.op_load_constant(factory.get_top(), 'y', 4)
+    e2 = factory.op_load_variable(e2, 'x', 'y')
+    assert e1 is e2
+    assert factory.is_eq(e1, e2)
+    assert factory.union(e1, e2) is e1
+    e3 = factory.cond_binary(e1, '<', 'x', 'y')
+    assert e3 is None
+    # the intern table does not keep states alive
+    import gc
+    for i in xrange(10):
+        factory.op_load_constant(factory.get_top(), 'x', i)
+    gc.collect()
+    assert factory._intern_table.values() == [e1]
+    assert factory.op_load_variable(e2, 'x', 'y') is e1
+
+
+def test_dbms_project_vars():
+    factory = dbms.DBMFactory(-512, 512)
+    for v in [0, 'x', 'y', 'z']:
+        factory.add_integer_var(v, -512, 512)
+    e1 = factory.op_load_constant(factory.get_top(), 'x', 4)
+    e1 = factory.op_load_variable(e1, 'y', 'x')
+    e1 = factory.op_binary(e1, '+', 'z', 'y', 1)
+    e2 = factory.project_vars(e1, ['x', 'y'])
+    assert e2.closed
+    assert sorted(e2.all_nodes()) == [0, 'z']
+    assert factory._interval(e2, 'z') == (5, 5)
+    assert factory._interval(e1, 'x') == (4, 4)
+    # eliminating y from a DBM that is not closed keeps x - z <= -1
+    e3 = factory.get_top()
+    e3.set_weight('x', 0, 'y')
+    e3.set_weight('y', -1, 'z')
+    e3.closed = False
+    e3 = factory.project_var(e3, 'y')
+    assert e3.get_weight('x', 'z') == -1
+    assert 'y' not in e3.all_nodes()
+
+def test_dbms_project_vars_keeps_source():
+    factory = dbms.DBMFactory(-512, 512)
+    for v in [0, 'x', 'y']:
+        factory.add_integer_var(v, -512, 512)
+    # x and y are related to each other only
+    e1 = dbm.DBM()
+    e1.set_weight('x', -1, 'y')
+    e1.set_weight('y', 5, 'x')
+    e1.closed = True
+    before = e1.to_string()
+    e2 = factory.project_vars(e1, ['x', 'y'])
+    assert 'x' not in e2.all_nodes()
+    assert e1.to_string() == before
+    assert e1.get_weight('x', 'y') == -1
@@ -0,0 +1,223 @@
+import pytest
+import boxes
+import decision_diagrams
+
+
+def create_factory(cache_size=1 << 16, gc_threshold=1 << 17,
+                   reorder_threshold=None):
+    inner = boxes.BoxDomainFactory(-512, 512)
+    inner.add_integer_var('x', -512, 512)
+    return decision_diagrams.DecisionDiagramFactory(inner, cache_size,
+                                                    gc_threshold,
+                                                    reorder_threshold)
+
+def parity(factory, variables, even, odd):
+    ''' Diagram with leaf even / odd depending on the parity of the
+    number of true variables: 2 nodes per variable, 2^n paths. '''
+    (e, o) = (factory._leaf(even), factory._leaf(odd))
+    for variable in reversed(variables):
+        variable = factory._var_ids[variable]
+        (e, o) = (factory._mk(variable, o, e), factory._mk(variable, e, o))
+    return factory._handle(e)
+
+def test_decision_diagrams_computed_table():
+    factory = create_factory()
+    variables = ['b%d' % i for i in xrange(40)]
+    for variable in variables:
+        factory.add_bool_var(variable)
+    inner = factory.inner_factory
+    zero = inner.op_load_constant(inner.get_top(), 'x', 0)
+    one = inner.op_load_constant(inner.get_top(), 'x', 1)
+    d1 = parity(factory, variables, zero, one)
+    d2 = parity(factory, variables, one, zero)
+    # 2^40 paths, only feasible with the computed table
+    union = factory.union(d1, d2)
+    both = inner.union(zero, one)
+    assert union is factory._handle(factory._leaf(both))
+    assert factory.is_subseteq(d1, union)
+    assert not factory.is_subseteq(union, d1)
+    assert factory.is_eq(factory.intersect(d1, d2), factory.get_bot())
+    e = factory.op_binary(d1, '+', 'x', 'x', 1)
+    assert e is parity(factory, variables, one,
+                       inner.op_load_constant(inner.get_top(), 'x', 2))
+    (hits, misses, ratio) = factory.computed_table.statistics()
+    assert hits > 0 and misses > 0
+
+def test_decision_diagrams_eviction():
+    # results do not depend on the size of the table
+    results = []
+    for cache_size in (1, 1 << 16):
+        factory = create_factory(cache_size)
+        for variable in 'abc':
+            factory.add_bool_var(variable)
+        e = factory.op_load_constant(factory.get_top(), 'a', 1)
+        e = factory.union(e, factory.op_load_constant(e, 'c', 0))
+        e = factory.op_binary(e, '<', 'b', 'x', 3)
+        e = factory.cond_binary(e, '==', 'b', 1)
+        e = factory.union(e, factory.op_load_constant(factory.get_top(),
+                                                      'c', 1))
+        e = factory.op_binary(e, '+', 'x', 'x', 1)
+        assert factory.is_subseteq(factory.cond_binary(e, '==', 'a', 1), e)
+        results.append(factory.to_string(e))
+    assert results[0] == results[1]
+
+def test_decision_diagrams_garbage_collection():
+    factory = create_factory()
+    variables = ['b%d' % i for i in xrange(20)]
+    for variable in variables:
+        factory.add_bool_var(variable)
+    inner = factory.inner_factory
+    zero = inner.op_load_constant(inner.get_top(), 'x', 0)
+    one = inner.op_load_constant(inner.get_top(), 'x', 1)
+    d1 = parity(factory, variables, zero, one)
+    # the other parity diagram is garbage
+    assert factory.collect_garbage() > 0
+    count = factory.node_count()
+    d2 = factory.op_binary(d1, '+', 'x', 'x', 5)
+    count2 = factory.node_count()
+    assert count2 > count
+    # the union is not referenced by an element
+    factory.union(d1, d2)
+    assert factory.node_count() > count2
+    assert factory.collect_garbage() > 0
+    assert factory.node_count() == count2
+    del d2
+    factory.collect_garbage()
+    assert factory.node_count() == count
+    assert factory.is_subseteq(d1, factory.union(d1, d1))
+    # freed nodes are reused
+    size = len(factory._var)
+    d2 = factory.op_binary(d1, '+', 'x', 'x', 5)
+    assert len(factory._var) == size
+    assert factory.node_count() == count2
+    # automatic collection keeps the table small
+    factory = create_factory(gc_threshold=20)
+    for variable in variables:
+        factory.add_bool_var(variable)
+    e = factory.get_top()
+    for i in xrange(60):
+        e2 = factory.op_load_constant(e, variables[(7 * i) % 20], i % 2)
+        e2 = factory.op_binary(e2, '+', 'x', 'x', i % 3)
+        e = factory.union(e, e2)
+        assert factory.node_count() <= factory.gc_threshold
+    assert factory.gc_runs > 0
+    assert factory.reclaimed_nodes > 0
+
+def evaluate(diagram, assignment):
+    while not diagram.is_leaf():
+        if assignment[diagram.get_variable()]:
+            diagram = diagram.get_hi()
+        else:
+            diagram = diagram.get_lo()
+    return diagram
+
+def pairs(factory, n):
+    ''' (a0 and b0) or ... or (a(n-1) and b(n-1)), exponential in the
+    order a0 ... a(n-1) b0 ... b(n-1). '''
+    top = factory.get_top()
+    result = factory.get_bot()
+    for i in xrange(n):
+        conjunction = factory.intersect(
+            factory.cond_binary(top, '==', 'a%d' % i, 1),
+            factory.cond_binary(top, '==', 'b%d' % i, 1))
+        result = factory.union(result, conjunction)
+    return result
+
+def test_decision_diagrams_sifting():
+    import itertools
+    n = 5
+    factory = create_factory()
+    variables = ['a%d' % i for i in xrange(n)] + ['b%d' % i for i in xrange(n)]
+    for variable in variables:
+        factory.add_bool_var(variable)
+    e = pairs(factory, n)
+    e2 = factory.op_binary(e, '+', 'x', 'x', 1)
+    assignments = [dict(zip(variables, values)) for values
+                   in itertools.product([0, 1], repeat=len(variables))]
+    values = [(evaluate(e, a), evaluate(e2, a)) for a in assignments]
+    (before, after) = factory.reorder()
+    assert before == factory.node_count() + (before - after)
+    assert after < before
+    # the elements still represent the same functions
+    assert values == [(evaluate(e, a), evaluate(e2, a)) for a in assignments]
+    # and are canonical in the new order
+    assert pairs(factory, n) is e
+    assert factory.op_binary(e, '+', 'x', 'x', 1) is e2
+    order = sorted(variables, key=lambda v: factory.variables[v])
+    for i in xrange(n):
+        assert abs(order.index('a%d' % i) - order.index('b%d' % i)) == 1
+    # back to the bad order
+    factory.set_variable_order(variables)
+    assert order != variables
+    assert sorted(variables, key=lambda v: factory.variables[v]) == variables
+    assert factory.node_count() == before
+    assert values == [(evaluate(e, a), evaluate(e2, a)) for a in assignments]
+
+def test_decision_diagrams_automatic_reordering():
+    n = 6
+    factory = create_factory(reorder_threshold=40)
+    for prefix in 'ab':
+        for i in xrange(n):
+            factory.add_bool_var('%s%d' % (prefix, i))
+    e = pairs(factory, n)
+    # a pending reordering is done by the next operation
+    e = factory.union(e, e)
+    assert factory.reorderings > 0
+    assert factory.reorder_threshold >= 40
+    assert factory.node_count() < 40
+
+def test_decision_diagrams_deep():
+    import random
+    import sys
+    n = sys.getrecursionlimit() + 500
+    factory = create_factory()
+    variables = ['b%d' % i for i in xrange(n)]
+    for variable in variables:
+        factory.add_bool_var(variable)
+    inner = factory.inner_factory
+    rng = random.Random(0)
+    paths = []
+    for k in xrange(4):
+        path = factory.op_load_constant(factory.get_top(), 'x', k)
+        assignment = {}
+        for variable in reversed(variables):
+            assignment[variable] = rng.randint(0, 1)
+            path = factory.op_load_constant(path, variable,
+                                            assignment[variable])
+        paths.append((path, assignment))
+    e = factory.get_bot()
+    for (path, _) in paths:
+        e = factory.union(e, path)
+    e2 = factory.op_binary(e, '+', 'x', 'x', 1)
+    middle = variables[n // 2]
+    for (k, (path, assignment)) in enumerate(paths):
+        assert factory.is_subseteq(path, e)
+        x = inner.op_load_constant(inner.get_top(), 'x', k)
+        assert inner.is_eq(evaluate(e, assignment).get_value(), x)
+        assert inner.is_eq(evaluate(e2, assignment).get_value(),
+                           inner.op_binary(x, '+', 'x', 'x', 1))
+        # the projection forgets middle, the condition keeps the paths
+        # through middle = 1
+        flipped = dict(assignment)
+        flipped[middle] = 1 - assignment[middle]
+        projected = factory.project_var(e, middle)
+        assert inner.is_eq(evaluate(projected, flipped).get_value(), x)
+        kept = factory.cond_binary(e, '==', middle, 1)
+        assert (evaluate(kept, assignment) is factory.get_bot()) == \
+            (assignment[middle] == 0)
+    assert not factory.is_subseteq(e, paths[0][0])
+
+def test_decision_diagrams_propagate():
+    factory = create_factory()
+    for variable in 'ab':
+        factory.add_bool_var(variable)
+    inner = factory.inner_factory
+    # depends on b only; a = (x < 3) is placed above it
+    e = factory.cond_binary(factory.get_top(), '==', 'b', 1)
+    e = factory.op_binary(e, '<', 'a', 'x', 3)
+    assert evaluate(e, {'a': 1, 'b': 0}) is factory.get_bot()
+    assert evaluate(e, {'a': 0, 'b': 0}) is factory.get_bot()
+    assert inner.is_eq(evaluate(e, {'a': 1, 'b': 1}).get_value(),
+                       inner.cond_binary(inner.get_top(), '<', 'x', 3))
+    assert inner.is_eq(evaluate(e, {'a': 0, 'b': 1}).get_value(),
+                       inner.cond_binary(inner.get_top(), '>=', 'x', 3))
@@ -0,0 +1,153 @@
+import pytest
+
+import dbm
+import dbms
+import dense_dbm
+
+def test_dense_dbm_set_weight_get_weight():
+
+    d = dense_dbm.DenseDBM()
+    d.set_weight(1, 3, 2)
+    assert d.get_weight(1, 2) == 3
+    d.set_weight(2, 4, 2)
+    d.set_weight(1, -99, 2)
+    assert d.get_weight(1, 2) == -99
+    assert d.get_weight(2, 2) == 4
+    d.set_weight(2, None, 2)
+    assert d.get_weight(2, 2) is None
+    d.set_weight(1, None, 2)
+    assert d.get_weight(1, 2) is None
+    assert d.get_weight("", 3) is None
+    for i in range(0, 20):
+        d.set_weight(i, i, i+1)
+    assert d.get_weight(19, 20) == 19
+    assert d.get_weight(1, 2) == 1
+    assert sorted(d.all_nodes()) == range(0, 21)
+
+def test_dense_dbm_copy():
+
+    d = dense_dbm.DenseDBM()
+    d.set_weight(1, 100, 2)
+    d.set_weight(2, 200, 2)
+    d2 = d.copy()
+    assert d.to_string() == d2.to_string()
+    assert d == d2
+    d2.set_weight(1, 5, 2)
+    assert d.get_weight(1, 2) == 100
+    assert d != d2
+
+def test_dense_dbm_exists_negative_cycle():
+
+    d1 = dense_dbm.DenseDBM()
+    d1.set_weight(1, 1, 2)
+    d1.set_weight(2, -2, 1)
+    assert d1.exists_negative_cycle()
+    d2 = dense_dbm.DenseDBM()
+    d2.set_weight(1, -2, 2)
+    d2.set_weight(2, 3, 1)
+    assert not d2.exists_negative_cycle()
+    d3 = dense_dbm.DenseDBM()
+    for i in range(0, 500):
+        d3.set_weight(i, i*((-1)**(i % 2)), i+1)
+    d3.set_weight(500, 100, 50)
+    assert d3.exists_negative_cycle()
+    d3.set_weight(500, 100000000, 50)
+    assert not d3.exists_negative_cycle()
+
+def test_dense_dbm_find_shortest_paths():
+
+    d1 = dense_dbm.DenseDBM()
+    d2 = dbm.DBM()
+    for d in (d1, d2):
+        d.set_weight(1, -2, 3)
+        d.set_weight(3, 2, 4)
+        d.set_weight(4, -1, 2)
+        d.set_weight(2, 4, 1)
+        d.set_weight(2, 3, 3)
+        d.set_weight(5, 10, 5)
+    sp1 = d1.find_shortest_paths()
+    sp2 = d2.find_shortest_paths()
+    for source in range(1, 6):
+        for target in range(1, 6):
+            assert (sp1.get_weight(source, target)
+                    == sp2.get_weight(source, target))
+
+def test_dense_dbms_conditions():
+    factory = dbms.DBMFactory(-512, 512, dense_dbm.DenseDBM)
+    factory.add_integer_var(0, 0, 0)
+    factory.add_integer_var('x', -512, 512)
+    factory.add_integer_var('y', -512, 512)
+    factory.add_integer_var('z', -512, 512)
+    e1 = factory.cond_binary(factory.get_top(), '==', 'x', 'y')
+    e1 = factory.cond_binary(e1, '>', 'z', 'x')
+    e2 = factory.cond_binary(factory.get_top(), '<', 'z', 'x')
+    assert factory.is_eq(factory.intersect(e1, e2), factory.get_bot())
+    e3 = factory.cond_binary(factory.get_top(), '==', 'x', 3)
+    e3 = factory.intersect(e1, e3)
+    assert factory.is_eq(factory.cond_binary(e3, '>', 'y', 3),
+                         factory.get_bot())
+    e4 = factory.op_binary(e3, '+', 'x', 'x', 2)
+    assert factory.is_eq(factory.cond_binary(e4, '<', 'x', 5),
+                         factory.get_bot())
+    assert not factory.is_eq(factory.cond_binary(e4, '==', 'x', 5),
+                             factory.get_bot())
+
+def test_dense_dbm_closure_cache():
+
+    for d in (dbm.DBM(), dense_dbm.DenseDBM()):
+        d.set_weight(1, 3, 2)
+        d.set_weight(2, 4, 3)
+        closed = d.closure()
+        assert closed.closed
+        assert closed.get_weight(1, 3) == 7
+        assert d.closure() is closed
+        assert d.copy().closure() is closed
+        d.set_weight(3, -8, 1)
+        assert d.closure() is None
+        assert d.closure() is None
+        d.set_weight(3, -7, 1)
+        assert d.closure().get_weight(3, 2) == -4
+
+
+def test_dense_dbm_remove_nodes():
+    d = dense_dbm.DenseDBM()
+    d.set_weight('x', 3, 'y')
+    d.set_weight('y', 2, 'z')
+    d.set_weight('z', 1, 'x')
+    c = d.copy()
+    d.remove_nodes(['y'])
+    assert d.all_nodes() == ['x', 'z']
+    assert d.get_weight('z', 'x') == 1
+    assert d.get_weight('x', 'y') is None
+    assert c.get_weight('y', 'z') == 2
+    d.set_weight('x', 7, 'w')
+    assert d.get_weight('x', 'w') == 7
+    assert c.get_weight('x', 'w') is None
+
+
+def test_dense_dbm_blocked_closure():
+    strategy = dense_dbm.BlockedClosure(2, threads=2)
+    factory = dbms.DBMFactory(-512, 512, dense_dbm.DenseDBM,
+                              closure_strategy=strategy)
+    plain = dense_dbm.DenseDBM()
+    blocked = factory.get_top()
+    for i in xrange(7):
+        plain.set_weight(i, i + 1, i + 1)
+        blocked.set_weight(i, i + 1, i + 1)
+    plain.set_weight(7, -20, 0)
+    blocked.set_weight(7, -20, 0)
+    assert (blocked.closure().matrix() == plain.closure().matrix()).all()
+    assert blocked.copy().closure_strategy is blocked.closure_strategy
+    blocked.set_weight(7, -30, 0)
+    assert blocked.closure() is None
+    # the pool is started by the first closure and stopped with the
+    # factory
+    assert strategy._pool is not None
+    factory.close()
+    assert strategy._pool is None
+    factory.close()
+    # plain DBMs keep their own closure
+    factory = dbms.DBMFactory(-512, 512,
+                              closure_strategy=dense_dbm.BlockedClosure(2))
+    assert 'closure_strategy' not in vars(factory.get_top())
+    factory.close()
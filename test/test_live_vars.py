@@ -0,0 +1,74 @@
+import pytest
+import live_vars
+
+
+def create_factory(names):
+    factory = live_vars.LiveVarsDomainFactory()
+    for name in names:
+        factory.add_integer_var(name, -512, 512)
+    return factory
+
+def test_live_vars_operations():
+    factory = create_factory(['x', 'y', 'z'])
+    top = factory.get_top()
+    bot = factory.get_bot()
+    assert factory.to_string(top) == '{x, y, z}'
+    assert factory.to_string(bot) == '{}'
+    # y = x + 1 kills y and uses x
+    e = factory.op_binary(factory.cond_binary(bot, '<', 'z', 3),
+                          '+', 'y', 'x', 1)
+    assert factory.to_string(e) == '{x, z}'
+    assert factory.to_string(factory.op_load_constant(e, 'x', 2)) == '{z}'
+    assert factory.to_string(factory.op_load_variable(e, 'z', 'y')) == \
+        '{x, y}'
+    assert factory.to_string(factory.project_var(bot, 'y')) == '{y}'
+    # inclusion of sets, not the order of the integers
+    only_x = factory.op_load_variable(bot, 'y', 'x')
+    only_y = factory.op_load_variable(bot, 'x', 'y')
+    assert not factory.is_subseteq(only_y, only_x)
+    assert not factory.is_subseteq(only_x, only_y)
+    assert factory.is_subseteq(only_x, e)
+    assert factory.is_eq(factory.union(only_x, only_y),
+                         factory.widen(only_y, only_x))
+    assert factory.intersect(only_x, only_y) == bot
+
+def test_live_vars_wide():
+    names = ['v%d' % i for i in xrange(1000)]
+    factory = create_factory(names)
+    e = factory.get_bot()
+    for i in xrange(0, 1000, 7):
+        e = factory.cond_binary(e, '<', names[i], 0)
+    assert factory.is_subseteq(e, factory.get_top())
+    assert factory.to_string(e).count('v') == len(range(0, 1000, 7))
+    e = factory.op_load_constant(e, 'v994', 0)
+    assert 'v994' not in factory.to_string(e)
+
+def test_live_vars_compile_block():
+    import random
+    random.seed(21)
+    names = ['a', 'b', 'c', 'd']
+    factory = create_factory(names)
+    for _ in xrange(200):
+        operations = []
+        for _ in xrange(random.randint(0, 6)):
+            target = random.choice(names)
+            operand = random.choice(names + [0, 1])
+            kind = random.randint(0, 4)
+            if kind == 0:
+                operations.append(('op_load_constant', target, 1))
+            elif kind == 1:
+                operations.append(('op_load_variable', target,
+                                   random.choice(names)))
+            elif kind == 2:
+                operations.append(('op_binary', '+', target,
+                                   random.choice(names), operand))
+            elif kind == 3:
+                operations.append(('cond_binary', '<', target, operand))
+            else:
+                operations.append(('project_var', target))
+        element = random.randint(0, factory.get_top())
+        expected = element
+        for operation in operations:
+            expected = getattr(factory, operation[0])(expected,
+                                                      *operation[1:])
+        assert factory.compile_block(operations)(element) == expected
@@ -0,0 +1,31 @@
+import pytest
+
+from code_rep.method import Method, BasicBlock
+from code_rep.instr import *
+from code_rep.variable import Variable
+from code_rep.type_system import Integer
+from analysis.ordering import VariableOrdering
+
+
+def test_compute_order():
+    # if (p == r) ...; if (q < z) ...; if (s < z) ...; if (t == s) ...
+    int_type = Integer(-1024, 1024)
+    bool_type = Integer(0, 1)
+    z = Variable('z', int_type)
+    (p, q, r, s, t) = [Variable(name, bool_type) for name in 'pqrst']
+    method = Method('main', None)
+    for v in (z, p, q, r, s, t):
+        method.add_local_variable(v)
+    blocks = [BasicBlock('b%d' % i) for i in xrange(4)]
+    method.add_blocks(*blocks)
+    method.set_edge(method.initial, blocks[0], ['==', p, r])
+    method.set_edge(blocks[0], blocks[1], ['<', q, z])
+    method.set_edge(blocks[1], blocks[2], ['<', s, z])
+    method.set_edge(blocks[2], blocks[3], ['==', t, s])
+    method.set_edge(blocks[3], method.final)
+    order = [v.id for v in VariableOrdering.compute_order(method)]
+    assert sorted(order) == ['p', 'q', 'r', 's', 't']
+    # variables sharing conditions (or operands) are neighbours
+    assert abs(order.index('p') - order.index('r')) == 1
+    assert abs(order.index('q') - order.index('s')) == 1
+    assert abs(order.index('t') - order.index('s')) == 1
@@ -0,0 +1,72 @@
+import pytest
+
+from code_rep.method import Method, BasicBlock
+from code_rep.instr import *
+from code_rep.variable import Variable
+from code_rep.type_system import Integer
+from analysis.packing import VariablePacking
+import packed_dbms
+
+
+def create_method():
+    # x := 0; y := x; z := 5; w := 3;
+    # while (y < 10) { x := x + 1; y := y + 1; }
+    # if (z < w) ...
+    int_type = Integer(-1024, 1024)
+    (x, y, z, w, u) = [Variable(name, int_type) for name in 'xyzwu']
+    method = Method('main', None)
+    for v in (x, y, z, w, u):
+        method.add_local_variable(v)
+    loop = BasicBlock('loop')
+    body = BasicBlock('body')
+    method.add_blocks(loop, body)
+    method.initial.append_instruction(ConstantAssignment(x, 0))
+    method.initial.append_instruction(DirectVariableAssignment(y, x))
+    method.initial.append_instruction(ConstantAssignment(z, 5))
+    method.initial.append_instruction(ConstantAssignment(w, 3))
+    method.initial.append_instruction(ConstantAssignment(u, 1))
+    body.append_instruction(BinaryOpAssignment(x, '+', x, 1))
+    body.append_instruction(BinaryOpAssignment(y, '+', y, 1))
+    method.set_edge(method.initial, loop)
+    method.set_edge(loop, body, ['<', y, 10])
+    method.set_edge(body, loop)
+    method.set_edge(loop, method.final, ['<', z, w])
+    return (method, x, y, z, w, u)
+
+def test_compute_packs():
+    (method, x, y, z, w, u) = create_method()
+    packs = VariablePacking.compute_packs(method)
+    packs = sorted(sorted(v.id for v in pack) for pack in packs)
+    assert packs == [['w', 'z'], ['x', 'y']]
+
+def test_packed_dbms():
+    (method, x, y, z, w, u) = create_method()
+    factory = packed_dbms.PackedDBMFactory(
+        1024, -1024, VariablePacking.compute_packs(method))
+    for v in (x, y, z, w, u):
+        factory.add_integer_var(v, -1024, 1024)
+    e = factory.op_load_constant(factory.get_top(), x, 0)
+    e = factory.op_load_variable(e, y, x)
+    e = factory.op_load_constant(e, u, 1)
+    e = factory.op_binary(e, '+', x, x, 1)
+    e = factory.op_binary(e, '+', y, y, 1)
+    # the relation x == y is kept inside the pack
+    assert factory.is_eq(factory.cond_binary(e, '<', x, y),
+                         factory.get_bot())
+    # unpacked variables are handled by intervals
+    assert factory._interval(e, u) == (1, 1)
+    e2 = factory.op_binary(e, '+', u, u, 1)
+    assert factory.is_subseteq(e2, factory.cond_binary(e2, '==', u, 2))
+    # operations spanning several packs use intervals
+    e3 = factory.op_binary(e2, '+', z, x, u)
+    assert factory._interval(e3, z) == (3, 3)
+    e4 = factory.cond_binary(e3, '<', u, x)
+    assert factory.is_eq(e4, factory.get_bot())
+    e5 = factory.union(e, e3)
+    assert factory.is_subseteq(e, e5)
+    assert factory.is_subseteq(e3, e5)
+    assert factory.is_eq(factory.cond_binary(e5, '!=', x, y), e5)
+    # a packed variable that was not added has the default bounds
+    factory = packed_dbms.PackedDBMFactory(
+        1024, -1024, VariablePacking.compute_packs(method))
+    assert factory._interval(factory.get_top(), x) == (-1024, 1024)
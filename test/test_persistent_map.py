@@ -0,0 +1,91 @@
+import pytest
+import random
+import persistent_map
+
+
+def random_map(keys, base=None):
+    result = base if base is not None else persistent_map.PersistentMap()
+    reference = dict(result.items())
+    for _ in xrange(random.randint(0, 30)):
+        key = random.choice(keys)
+        if random.random() < 0.25:
+            result = result.remove(key)
+            reference.pop(key, None)
+        else:
+            value = random.randint(0, 5)
+            result = result.set(key, value)
+            reference[key] = value
+    return (result, reference)
+
+def test_persistent_map_updates():
+    random.seed(1)
+    for _ in xrange(200):
+        (m, reference) = random_map(range(64) + [1000, 40000])
+        assert dict(m.items()) == reference
+        assert len(m) == len(reference)
+        assert sorted(m) == sorted(reference)
+        for key in range(64) + [1000, 40000, 10 ** 6]:
+            assert (key in m) == (key in reference)
+            assert m.get(key) == reference.get(key)
+
+def test_persistent_map_batch_update():
+    random.seed(2)
+    keys = range(64) + [1000, 40000]
+    for _ in xrange(200):
+        (m, reference) = random_map(keys)
+        items = [(random.choice(keys + [10 ** 6]),
+                  random.choice([None, 0, 1, 2]))
+                 for _ in xrange(random.randint(0, 8))]
+        result = m.update(items)
+        for (key, value) in items:
+            if value is None:
+                reference.pop(key, None)
+            else:
+                reference[key] = value
+        assert dict(result.items()) == reference
+        assert len(result) == len(reference)
+    m = random_map(keys)[0]
+    assert m.update([(key, m.get(key)) for key in keys]) is m
+
+def test_persistent_map_sharing():
+    m = persistent_map.PersistentMap()
+    for key in xrange(100):
+        m = m.set(key, key)
+    assert m.set(5, 5) is m
+    m2 = m.set(5, 6)
+    assert m2.get(5) == 6 and m.get(5) == 5
+    assert list(m2.differences(m)) == [(5, 6, 5)]
+    assert m.merge(m, lambda k, v1, v2: None) is m
+    # only the leaf holding key 5 is compared
+    calls = []
+    m.merge(m2, lambda k, v1, v2: calls.append(k) or v1)
+    assert calls == [5]
+
+def test_persistent_map_merge():
+    random.seed(2)
+    both = lambda k, v1, v2: None if v1 + v2 == 5 else max(v1, v2)
+    KEEP = persistent_map.KEEP
+    DROP = persistent_map.DROP
+    for _ in xrange(300):
+        keys = random.sample(xrange(3000), 20)
+        (m1, r1) = random_map(keys)
+        (m2, r2) = random_map(keys, m1 if random.random() < 0.5 else None)
+        for only1 in (KEEP, DROP):
+            for only2 in (KEEP, DROP):
+                expected = {}
+                for key in set(r1) | set(r2):
+                    if key in r1 and key in r2:
+                        value = both(key, r1[key], r2[key])
+                        if value is not None:
+                            expected[key] = value
+                    elif key in r1 and only1 is KEEP:
+                        expected[key] = r1[key]
+                    elif key in r2 and only2 is KEEP:
+                        expected[key] = r2[key]
+                merged = m1.merge(m2, both, only1, only2)
+                assert dict(merged.items()) == expected
+                assert len(merged) == len(expected)
+        differing = set(key for (key, v1, v2) in m1.differences(m2)
+                        if v1 != v2)
+        assert differing == set(key for key in set(r1) | set(r2)
+                                if r1.get(key) != r2.get(key))
@@ -0,0 +1,124 @@
+import pytest
+import random
+
+import dbms
+import dense_dbm
+import sparse_zones
+
+
+def create_factories(variables):
+    factories = (sparse_zones.SparseZoneFactory(512, -512),
+                 dbms.DBMFactory(512, -512, dense_dbm.DenseDBM))
+    for factory in factories:
+        factory.add_integer_var(0, 0, 0)
+        for v in variables:
+            factory.add_integer_var(v, -512, 512)
+    return factories
+
+def test_sparse_zones_conditions_intersect_1():
+    (factory, _) = create_factories(['x', 'y', 'z'])
+    # e1: x = y && z > x
+    e1 = factory.cond_binary(factory.get_top(), '==', 'x', 'y')
+    e1 = factory.cond_binary(e1, '>', 'z', 'x')
+    # e2: z < x
+    e2 = factory.cond_binary(factory.get_top(), '<', 'z', 'x')
+    assert factory.is_eq(factory.intersect(e1, e2), factory.get_bot())
+    e3 = factory.cond_binary(factory.get_top(), '==', 'z', 3)
+    assert not factory.is_eq(factory.intersect(e1, e3), factory.get_bot())
+    e4 = factory.cond_binary(factory.get_top(), '==', 'x', 3)
+    e4 = factory.intersect(e1, e4)
+    # y should also be 3 now.
+    assert factory.is_eq(factory.cond_binary(e4, '>', 'y', 3),
+                         factory.get_bot())
+    assert factory.is_eq(factory.cond_binary(e4, '<', 'y', 3),
+                         factory.get_bot())
+    # only the five bounds, x - z <= -1 etc. are implied
+    assert e4.edge_count() == 5
+
+def test_sparse_zones_assign():
+    (factory, _) = create_factories(['x', 'y'])
+    e1 = factory.op_load_constant(factory.get_top(), 'x', 6)
+    e2 = factory.op_load_constant(factory.get_top(), 'x', 8)
+    e3 = factory.op_binary(e1, '+', 'x', 'x', 2)
+    assert factory.is_eq(e3, e2)
+    e3 = factory.op_binary(e3, '-', 'x', 'x', 1)
+    e3 = factory.op_binary(e3, '+', 'x', 'x', -1)
+    assert factory.is_eq(e1, e3)
+    e4 = factory.op_load_variable(factory.get_top(), 'y', 'x')
+    e4 = factory.cond_binary(e4, '<=', 'x', 5)
+    assert (factory.to_string(e4)
+            == '[x - 0 <= 5, x - y <= 0, y - 0 <= 5, y - x <= 0]')
+    assert factory.is_eq(factory.cond_binary(e4, '>', 'y', 5),
+                         factory.get_bot())
+    assert factory.is_eq(factory.op_binary(e1, '%', 'y', 'x', 0),
+                         factory.get_bot())
+    with pytest.raises(ValueError):
+        factory.op_binary(e1, '/', 'y', 'x', 2)
+
+def test_sparse_zones_widen():
+    (factory, _) = create_factories(['x', 'y'])
+    e1 = factory.op_load_constant(factory.get_top(), 'x', 0)
+    e1 = factory.op_load_variable(e1, 'y', 'x')
+    e2 = factory.op_binary(e1, '+', 'x', 'x', 1)
+    e2 = factory.op_binary(e2, '+', 'y', 'y', 1)
+    e3 = factory.widen(e1, factory.union(e1, e2))
+    # x == y and x >= 0 are stable, x <= 0 is not
+    assert (factory.to_string(e3)
+            == '[0 - x <= 0, 0 - y <= 0, x - y <= 0, y - x <= 0]')
+    assert factory.is_subseteq(e2, e3)
+    assert not factory.is_subseteq(e3, e2)
+
+def test_sparse_zones_random_against_dbms():
+    rnd = random.Random(11)
+    variables = ['a', 'b', 'c', 'd', 'e']
+    for run in range(0, 40):
+        (sparse, dense) = create_factories(variables)
+        e_sparse = sparse.get_top()
+        e_dense = dense.get_top()
+        for step in range(0, 12):
+            x = rnd.choice(variables)
+            y = rnd.choice(variables + [rnd.randint(-10, 10)])
+            kind = rnd.randint(0, 3)
+            if kind == 0:
+                operator = rnd.choice(['<', '<=', '>', '>=', '=='])
+                args = (operator, x, y)
+                method = 'cond_binary'
+            elif kind == 1:
+                args = (x, rnd.randint(-10, 10))
+                method = 'op_load_constant'
+            elif kind == 2:
+                args = ('+', x, rnd.choice(variables), rnd.randint(-3, 3))
+                method = 'op_binary'
+            else:
+                args = (x,)
+                method = 'project_var'
+            e_sparse = getattr(sparse, method)(e_sparse, *args)
+            e_dense = getattr(dense, method)(e_dense, *args)
+            assert ((sparse._normalize(e_sparse) is None)
+                    == (dense._normalize(e_dense) is None))
+            if e_dense is None:
+                break
+            s_dense = dense._normalize(e_dense)
+            for v1 in [0] + variables:
+                for v2 in [0] + variables:
+                    if v1 != v2:
+                        assert (e_sparse.get_weight(v1, v2)
+                                == s_dense.get_weight(v1, v2))
+
+def test_sparse_zones_union_is_upper_bound():
+    rnd = random.Random(5)
+    variables = ['a', 'b', 'c', 'd']
+    (factory, _) = create_factories(variables)
+    for run in range(0, 40):
+        elements = []
+        for k in range(0, 2):
+            e = factory.get_top()
+            for step in range(0, 5):
+                e = factory.cond_binary(e, rnd.choice(['<', '<=', '==']),
+                                        rnd.choice(variables),
+                                        rnd.choice(variables + [rnd.randint(-5, 5)]))
+            elements.append(e)
+        joined = factory.union(elements[0], elements[1])
+        assert factory.is_subseteq(elements[0], joined)
+        assert factory.is_subseteq(elements[1], joined)
+        assert joined is None or joined.closed
@@ -0,0 +1,61 @@
+import pytest
+import random
+import time
+
+from pointer_analysis.andersen import *
+from pointer_analysis.steensgard import SteensgaardAnalysis
+from test_andersen import create_module, random_constraints
+
+
+def test_module():
+    (module, x, z, p, q, r, pp, qq) = create_module()
+    analysis = SteensgaardAnalysis(module).solve()
+    # *qq := r unifies x and z (Andersen: q -> x only)
+    assert analysis.same_class(x, z)
+    for v in (p, q, r):
+        assert analysis.points_to(v) == set([x, z])
+    assert analysis.points_to(pp) == set([p])
+    assert analysis.points_to(qq) == set([p])
+    assert analysis.points_to(x) == set()
+    assert analysis.may_alias(q, r)
+    assert not analysis.may_alias(p, pp)
+
+def test_chain():
+    # a := &b; b := &c; d := *a; e := &f
+    analysis = SteensgaardAnalysis()
+    analysis.add_constraint(ADDRESS, 'a', 'b')
+    analysis.add_constraint(ADDRESS, 'b', 'c')
+    analysis.add_constraint(LOAD, 'd', 'a')
+    analysis.add_constraint(ADDRESS, 'e', 'f')
+    assert analysis.points_to('d') == set(['c'])
+    assert analysis.may_alias('b', 'd')
+    assert not analysis.may_alias('a', 'e')
+    assert not analysis.may_alias('a', 'unknown')
+    # unify the pointees of a and e
+    analysis.add_constraint(COPY, 'a', 'e')
+    assert analysis.points_to('a') == set(['b', 'f'])
+    assert analysis.points_to('e') == set(['b', 'f'])
+    assert analysis.points_to('f') == set(['c'])
+
+def test_random():
+    # coarser than Andersen: every points-to set contains Andersen's
+    rng = random.Random(24)
+    for _ in xrange(50):
+        constraints = random_constraints(rng, 40, 12)
+        (andersen, steensgaard) = (AndersenAnalysis(), SteensgaardAnalysis())
+        for constraint in constraints:
+            andersen.add_constraint(*constraint)
+            steensgaard.add_constraint(*constraint)
+        andersen.solve()
+        for (location, targets) in andersen.points_to_map().iteritems():
+            assert targets <= steensgaard.points_to(location)
+
+def test_large():
+    rng = random.Random(1)
+    analysis = SteensgaardAnalysis()
+    kinds = [ADDRESS, COPY, COPY, LOAD, STORE]
+    start = time.time()
+    for _ in xrange(100000):
+        analysis.add_constraint(rng.choice(kinds), rng.randrange(30000),
+                                rng.randrange(30000))
+    assert time.time() - start < 30
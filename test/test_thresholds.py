@@ -0,0 +1,107 @@
+import pytest
+
+from code_rep.method import Method, BasicBlock
+from code_rep.instr import *
+from code_rep.variable import Variable
+from code_rep.type_system import Integer
+from analysis.widening_thresholds import WideningThresholds
+from analyzers import MethodAnalyzer
+import thresholds
+import boxes
+import dbms
+
+
+def test_threshold_lists():
+    constants = []
+    for c in [5, -3, 100, 5, 0]:
+        thresholds.add_threshold(constants, c)
+    assert constants == [-3, 0, 5, 100]
+    assert thresholds.threshold_above(constants, 1) == 5
+    assert thresholds.threshold_above(constants, 5) == 5
+    assert thresholds.threshold_above(constants, 101) is None
+    assert thresholds.threshold_below(constants, 4) == 0
+    assert thresholds.threshold_below(constants, -3) == -3
+    assert thresholds.threshold_below(constants, -4) is None
+
+def create_loop():
+    # x := 0; while (x < 10) { x := x + 1; }
+    int_type = Integer(-1024, 1024)
+    x = Variable('x', int_type)
+    method = Method('main', None)
+    method.add_local_variable(x)
+    loop = BasicBlock('loop')
+    body = BasicBlock('body')
+    method.add_blocks(loop, body)
+    method.initial.append_instruction(ConstantAssignment(x, 0))
+    body.append_instruction(BinaryOpAssignment(x, '+', x, 1))
+    method.set_edge(method.initial, loop)
+    method.set_edge(loop, body, ['<', x, 10])
+    method.set_edge(body, loop)
+    method.set_edge(loop, method.final, ['>=', x, 10])
+    return (method, x, loop)
+
+def test_compute_thresholds():
+    (method, x, loop) = create_loop()
+    assert (WideningThresholds.compute_thresholds(method)
+            == [0, 9, 10, 11])
+
+def test_analyzer_widens_to_thresholds():
+    (method, x, loop) = create_loop()
+    factory = boxes.BoxDomainFactory(-1024, 1024)
+    analyzer = MethodAnalyzer(method, factory)
+    analyzer.analyze(factory.get_top(), factory.get_bot())
+    # widened at once: [0, 0], [0, 9] (threshold), [0, 10], stable,
+    # then checked once more by the enclosing component
+    assert analyzer.rounds[loop] == 5
+    assert factory.to_string(analyzer.out_values[loop]) == \
+        '[%s in [0, 10]]' % x
+    assert factory.to_string(analyzer.get_final_out_value()) == \
+        '[%s in [10, 10]]' % x
+    # with the former widening delay of 5, it needs 9 rounds
+    analyzer.analyze(factory.get_top(), factory.get_bot(),
+                     iterations_without_widening=5)
+    assert analyzer.rounds[loop] == 9
+    assert factory.to_string(analyzer.out_values[loop]) == \
+        '[%s in [0, 10]]' % x
+
+def test_boxes_widen_thresholds():
+    factory = boxes.BoxDomainFactory(-1024, 1024)
+    factory.add_integer_var('x', -1024, 1024)
+    for c in [0, 9, 10, 11]:
+        factory.add_constant(c)
+    e1 = factory.op_load_constant(factory.get_top(), 'x', 0)
+    e2 = factory.union(e1, factory.op_load_constant(e1, 'x', 1))
+    w = factory.widen(e1, e2)
+    assert factory.is_eq(w, factory.cond_binary(
+        factory.cond_binary(factory.get_top(), '>=', 'x', 0),
+        '<=', 'x', 9))
+    # beyond all thresholds: the bound of the variable
+    e3 = factory.union(e1, factory.op_load_constant(e1, 'x', 12))
+    w = factory.widen(e1, e3)
+    assert factory.is_eq(w, factory.cond_binary(factory.get_top(),
+                                                '>=', 'x', 0))
+    # bounds beyond the range of the variable are widened to it
+    e4 = factory.op_binary(w, '+', 'x', 'x', 1)
+    assert factory.is_eq(factory.widen(w, factory.union(w, e4)), w)
+    # stable bounds are kept
+    w = factory.widen(e2, e2)
+    assert factory.is_eq(w, e2)
+
+def test_dbms_widen_thresholds():
+    factory = dbms.DBMFactory(1024, -1024)
+    factory.add_integer_var(0, 0, 0)
+    factory.add_integer_var('x', -1024, 1024)
+    factory.add_integer_var('y', -1024, 1024)
+    for c in [0, 9, 10, 11]:
+        factory.add_constant(c)
+    e1 = factory.op_load_constant(factory.get_top(), 'x', 0)
+    e1 = factory.op_load_variable(e1, 'y', 'x')
+    e2 = factory.op_binary(e1, '+', 'x', 'x', 1)
+    e2 = factory.op_binary(e2, '+', 'y', 'y', 1)
+    w = factory.widen(e1, factory.union(e1, e2))
+    # the upper bounds go to the threshold 9, x == y is stable
+    expected = factory.cond_binary(
+        factory.cond_binary(factory.cond_binary(factory.get_top(), '>=', 'x', 0),
+                            '<=', 'x', 9),
+        '==', 'x', 'y')
+    assert factory.is_eq(w, expected)